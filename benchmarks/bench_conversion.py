@@ -0,0 +1,97 @@
+"""
+Micro-benchmark de conversión tensor <-> imagen (coste por megapíxel).
+
+Compara la implementación compartida de `nodes/common/imaging.py` con la versión
+que cada nodo tenía duplicada (escaneo max(), astype y copias float intermedias).
+
+Uso:
+    python benchmarks/bench_conversion.py [--sizes 1 4 16] [--batch 4] [--repeat 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from nodes.common import imaging  # noqa: E402
+
+
+def legacy_tensor_to_pil(tensor):
+    """Versión anterior duplicada en los nodos (referencia)"""
+    if len(tensor.shape) == 4:
+        tensor = tensor[0]
+    np_image = tensor.cpu().numpy()
+    if np_image.max() <= 1.0:
+        np_image = np_image * 255.0
+    return Image.fromarray(np_image.astype(np.uint8), "RGB")
+
+
+def legacy_pil_to_tensor(pil_image):
+    """Versión anterior duplicada en los nodos (referencia)"""
+    np_image = np.array(pil_image).astype(np.float32) / 255.0
+    return torch.from_numpy(np_image)[None,]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes, batch, repeat):
+    results = []
+    for megapixels in sizes:
+        side = int((megapixels * 1_000_000) ** 0.5)
+        frames = torch.rand(batch, side, side, 3)
+        pil_image = imaging.tensor_to_pil(frames)
+        mp = side * side / 1_000_000
+
+        cases = {
+            "tensor_to_pil/legacy": lambda: [legacy_tensor_to_pil(frames[i]) for i in range(batch)],
+            "tensor_to_pil/shared": lambda: [imaging.tensor_to_pil(frames[i]) for i in range(batch)],
+            "tensor_to_pils/shared": lambda: imaging.tensor_to_pils(frames),
+            "pil_to_tensor/legacy": lambda: [legacy_pil_to_tensor(pil_image) for _ in range(batch)],
+            "pil_to_tensor/shared": lambda: [imaging.pil_to_tensor(pil_image) for _ in range(batch)],
+        }
+        for name, fn in cases.items():
+            seconds = best_of(fn, repeat)
+            results.append({
+                "case": name,
+                "megapixels": round(mp, 2),
+                "batch": batch,
+                "total_ms": round(seconds * 1000, 2),
+                "ms_per_megapixel": round(seconds * 1000 / (mp * batch), 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Megapíxeles por frame")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Salida JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.batch, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'case':<24}{'MP':>6}{'batch':>7}{'total ms':>11}{'ms/MP':>9}")
+    for r in results:
+        print(f"{r['case']:<24}{r['megapixels']:>6}{r['batch']:>7}{r['total_ms']:>11}{r['ms_per_megapixel']:>9}")
+
+
+if __name__ == "__main__":
+    main()
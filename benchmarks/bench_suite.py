@@ -0,0 +1,202 @@
+"""
+Suite de benchmarks de arranque en frío y ejecuciones en caliente (salida JSON).
+
+Secciones:
+- imports: tiempo de importación del paquete y de cada archivo de nodo (`-X importtime`,
+  con torch/numpy/PIL ya cargados como en ComfyUI).
+- first_call: coste de `initialize_client` en la primera ejecución (importa el SDK y crea
+  el cliente) frente a la segunda (cliente del registro del proceso).
+- conversion: tensor_to_pil / pil_to_tensor / base64 a 1, 4 y 16 MP.
+- warm_calls: primera llamada y mediana de las siguientes de cada nodo contra el servidor
+  simulado (`mock_providers.py`, latencia 0): mide el overhead propio del nodo.
+
+Uso:
+    python benchmarks/bench_suite.py [--sections imports first_call conversion warm_calls]
+                                     [--sizes 1 4 16] [--iterations 10] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+import import_budget  # noqa: E402
+import load_driver  # noqa: E402
+import mock_providers  # noqa: E402
+
+NODE_MODULES = ["CL_ImageFidelity", "CL_VirtualTryOn", "CL_GeminiFlash", "CL_OpenAIChat"]
+SECTIONS = ["imports", "first_call", "conversion", "warm_calls"]
+BENCH_API_KEY = load_driver.BENCH_API_KEY
+
+
+def package_version() -> str:
+    with open(os.path.join(PACKAGE_DIR, "__init__.py"), encoding="utf-8") as f:
+        match = re.search(r'__version__\s*=\s*"([^"]+)"', f.read())
+    return match.group(1) if match else "unknown"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def best_of(fn, repeat):
+    return min(timed(fn)[0] for _ in range(repeat))
+
+
+def run_imports():
+    package_name = os.path.basename(PACKAGE_DIR)
+    preloaded = {name for name, _, _ in import_budget.measure()}
+    rows = {name: (own, cumulative) for name, own, cumulative in import_budget.measure(package_name)
+            if name not in preloaded}
+    nodes = {}
+    for module in NODE_MODULES:
+        own, cumulative = rows.get(f"{package_name}.nodes.{module}", (0, 0))
+        nodes[module] = {"self_ms": round(own / 1000, 2), "cumulative_ms": round(cumulative / 1000, 2)}
+    return {
+        "package_ms": round(rows[package_name][1] / 1000, 2),
+        "nodes": nodes,
+        "sdk_modules_imported": [m for m in import_budget.FORBIDDEN_MODULES if m in rows],
+    }
+
+
+def run_first_call():
+    """Debe ejecutarse antes que cualquier sección que cargue los SDKs"""
+    from nodes.CL_GeminiFlash import CL_GeminiFlash
+    from nodes.CL_ImageFidelity import CL_ImageFidelity
+    from nodes.CL_OpenAIChat import CL_OpenAIChat
+    from nodes.CL_VirtualTryOn import CL_VirtualTryOn
+    from nodes.common.sdk import is_available
+
+    cases = {
+        "CL_OpenAIChat": ("openai", lambda: CL_OpenAIChat().initialize_client(BENCH_API_KEY)),
+        "CL_ImageFidelity": ("openai", lambda: CL_ImageFidelity().initialize_client(BENCH_API_KEY)),
+        "CL_GeminiFlash": ("google.generativeai", lambda: CL_GeminiFlash().initialize_client(BENCH_API_KEY)),
+        "CL_VirtualTryOn": ("requests", lambda: CL_VirtualTryOn().get_session(BENCH_API_KEY)),
+    }
+    results = {}
+    for node, (sdk, fn) in cases.items():
+        if not is_available(sdk):
+            results[node] = {"skipped": f"{sdk} no está instalado"}
+            continue
+        sdk_loaded = sdk in sys.modules
+        first_ms, _ = timed(fn)
+        second_ms, _ = timed(fn)
+        results[node] = {"sdk": sdk, "sdk_already_loaded": sdk_loaded,
+                         "first_ms": round(first_ms, 2), "second_ms": round(second_ms, 3)}
+    return results
+
+
+def run_conversion(sizes, repeat):
+    from nodes.common import imaging
+    from nodes.common.encoding import encode_image
+
+    results = []
+    for megapixels in sizes:
+        side = int((megapixels * 1_000_000) ** 0.5)
+        frame = torch.rand(1, side, side, 3)
+        pil_image = imaging.tensor_to_pil(frame)
+        cases = {
+            "tensor_to_pil": lambda: imaging.tensor_to_pil(frame),
+            "pil_to_tensor": lambda: imaging.pil_to_tensor(pil_image),
+            "base64/png": lambda: encode_image(pil_image, "png").base64(),
+            "base64/jpeg_q95": lambda: encode_image(pil_image, "jpeg_q95").base64(),
+        }
+        for name, fn in cases.items():
+            ms = best_of(fn, repeat)
+            results.append({"case": name, "megapixels": round(side * side / 1_000_000, 2),
+                            "ms": round(ms, 2), "ms_per_megapixel": round(ms / megapixels, 3)})
+    return results
+
+
+def run_warm_calls(iterations):
+    server, url = mock_providers.start_server(latency=0.0)
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["CL_YOURMIRROR_BASE_URL"] = url
+    frame = torch.from_numpy(np.random.rand(1, 512, 512, 3).astype(np.float32))
+    # Mismas llamadas que load_driver, en serie (la caché está desactivada por defecto)
+    calls = load_driver.node_calls(frame)
+    cases = {name: calls[key] for key, name in (("chat", "CL_OpenAIChat"), ("fidelity", "CL_ImageFidelity"),
+                                                 ("tryon", "CL_VirtualTryOn"))}
+    results = {}
+    try:
+        for node, (fn, text_index) in cases.items():
+            errors = []
+
+            def call():
+                ms, output = timed(fn)
+                error = load_driver.output_error(output, text_index)
+                if error:
+                    errors.append(error)
+                return ms
+
+            first_ms = call()
+            warm = [call() for _ in range(iterations)]
+            results[node] = {"first_ms": round(first_ms, 2), "warm_median_ms": round(statistics.median(warm), 2),
+                             "warm_min_ms": round(min(warm), 2), "iterations": iterations,
+                             "errors": len(errors)}
+            if errors:
+                # Una llamada fallida no mide el camino completo: se informa en lugar de ocultarlo
+                results[node]["last_error"] = errors[-1]
+    finally:
+        server.shutdown()
+    results["mock_requests"] = dict(server.RequestHandlerClass.state.counters)
+    return results
+
+
+def run(sections, sizes, iterations, repeat):
+    report = {
+        "package_version": package_version(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+    }
+    # first_call va antes que warm_calls: mide la importación del SDK en frío
+    for section in SECTIONS:
+        if section not in sections:
+            continue
+        if section == "imports":
+            report["imports"] = run_imports()
+        elif section == "first_call":
+            report["first_call"] = run_first_call()
+        elif section == "conversion":
+            report["conversion"] = run_conversion(sizes, repeat)
+        elif section == "warm_calls":
+            report["warm_calls"] = run_warm_calls(iterations)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Megapíxeles por frame")
+    parser.add_argument("--iterations", type=int, default=10, help="Llamadas en caliente por nodo")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por conversión (mejor tiempo)")
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CL_RETRY_MAX_ATTEMPTS", "1")
+    report = run(args.sections, args.sizes, args.iterations, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Presupuesto de tiempo de importación del paquete (arranque en frío de ComfyUI).
+
+Importa el paquete en un intérprete nuevo con `python -X importtime`, con torch, numpy
+y PIL ya cargados (ComfyUI los importa antes que los custom nodes), y comprueba que:
+- el tiempo acumulado del paquete no supera el presupuesto;
+- ningún SDK de proveedor se importa al registrar los nodos.
+
+Sale con código 1 si se incumple alguna de las dos condiciones.
+
+Uso:
+    python benchmarks/import_budget.py [--budget-ms 150] [--top 10] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que sólo deben importarse en la primera ejecución de un nodo
+FORBIDDEN_MODULES = ["openai", "google.generativeai", "grpc", "langdetect", "requests", "urllib3", "httpx"]
+
+PRELOADED = "import torch, numpy, PIL.Image"
+
+
+def parse_importtime(stderr: str):
+    """[(módulo, propio_us, acumulado_us)] de la salida de -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Cabecera
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def measure(package_name: str = ""):
+    code = f"{PRELOADED}\nimport {package_name}" if package_name else PRELOADED
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(PACKAGE_DIR), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"La importación falló:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def run(budget_ms: float, top: int):
+    package_name = os.path.basename(PACKAGE_DIR)
+    preloaded = {name for name, _, _ in measure()}
+    # Sólo cuenta lo que el paquete añade a un intérprete con ComfyUI ya cargado
+    rows = [row for row in measure(package_name) if row[0] not in preloaded]
+    total_us = next(cumulative for name, _, cumulative in rows if name == package_name)
+    imported = {name for name, _, _ in rows}
+    leaked = [m for m in FORBIDDEN_MODULES if m in imported]
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        "package": package_name,
+        "total_ms": round(total_us / 1000, 2),
+        "budget_ms": budget_ms,
+        "within_budget": total_us / 1000 <= budget_ms,
+        "forbidden_imported": leaked,
+        "slowest_self_ms": [{"module": name, "self_ms": round(own / 1000, 2)} for name, own, _ in slowest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Tiempo máximo de importación del paquete")
+    parser.add_argument("--top", type=int, default=10, help="Módulos más lentos a mostrar")
+    parser.add_argument("--json", action="store_true", help="Salida JSON")
+    args = parser.parse_args()
+
+    report = run(args.budget_ms, args.top)
+    ok = report["within_budget"] and not report["forbidden_imported"]
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['package']}: {report['total_ms']} ms (presupuesto {report['budget_ms']} ms)")
+        for row in report["slowest_self_ms"]:
+            print(f"  {row['self_ms']:>8} ms  {row['module']}")
+        if report["forbidden_imported"]:
+            print(f"SDKs importados al registrar los nodos: {', '.join(report['forbidden_imported'])}")
+        print("OK" if ok else "FALLO")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Driver de carga: ejecuta la función principal de cada nodo contra el servidor simulado.
+
+Lanza `--requests` ejecuciones por nodo con `--concurrency` hilos (una instancia de nodo
+por ejecución, como ramas paralelas de un workflow) y reporta p50/p95/p99, throughput y
+errores. Arranca `mock_providers.py` en el mismo proceso con el perfil de latencia y
+fallos indicado, o usa uno externo con `--url`.
+
+Uso:
+    python benchmarks/load_driver.py [--nodes chat fidelity gemini tryon] [--requests 50]
+                                     [--concurrency 8] [--latency 0.5 --latency-dist lognormal]
+                                     [--error-rate 0.05] [--json] [--output load.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+import mock_providers  # noqa: E402
+
+BENCH_API_KEY = "sk-bench-0000000000000000"
+NODES = ["chat", "fidelity", "gemini", "tryon"]
+# SDK que necesita cada nodo (se omite si no está instalado)
+NODE_SDKS = {"chat": "openai", "fidelity": "openai", "gemini": "google.generativeai", "tryon": "requests"}
+
+
+def node_calls(frame):
+    """{nodo: (función sin argumentos, índice de la salida de texto donde el nodo informa errores)}"""
+    from nodes.CL_GeminiFlash import CL_GeminiFlash
+    from nodes.CL_ImageFidelity import CL_ImageFidelity
+    from nodes.CL_OpenAIChat import CL_OpenAIChat
+    from nodes.CL_VirtualTryOn import CL_VirtualTryOn
+
+    def unique(prompt):
+        # Prompt distinto por ejecución: ninguna caché puede servir la respuesta
+        return f"{prompt} #{uuid.uuid4().hex[:8]}"
+
+    return {
+        "chat": (lambda: CL_OpenAIChat().process_with_vision(
+            BENCH_API_KEY, unique("A red dress on a mannequin"), "gpt-4o-mini", 200, "Describe", frame
+        ), 0),
+        "fidelity": (lambda: CL_ImageFidelity().generate_fashion_image(
+            BENCH_API_KEY, unique("Keep the garment"), frame, "high", "low", "auto", "png", "auto", "custom",
+            "images_api"
+        ), 1),
+        "gemini": (lambda: CL_GeminiFlash().generate_with_gemini(
+            BENCH_API_KEY, unique("Studio shot of the garment"), "edit", "gemini-2.5-flash-image-preview", frame
+        ), 1),
+        "tryon": (lambda: CL_VirtualTryOn().generate_tryon(BENCH_API_KEY, frame, frame, "top", "normal"), 1),
+    }
+
+
+def output_error(output, text_index):
+    """Texto de error informado en la salida (o None); las salidas OUTPUT_IS_LIST son listas"""
+    value = output[text_index]
+    for text in value if isinstance(value, list) else [value]:
+        if str(text).startswith("Error"):
+            return str(text)[:200]
+    return None
+
+
+def run_call(fn, text_index):
+    """(segundos, error o None) de una ejecución"""
+    start = time.perf_counter()
+    try:
+        error = output_error(fn(), text_index)
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)[:200]}"
+    return time.perf_counter() - start, error
+
+
+def percentile(sorted_values, q):
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_node(fn, text_index, requests_count, concurrency):
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def task(_):
+        seconds, error = run_call(fn, text_index)
+        with lock:
+            (errors if error else latencies).append(error or seconds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, range(requests_count)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 1) if value is not None else None  # noqa: E731
+    result = {
+        "requests": requests_count, "concurrency": concurrency, "ok": len(latencies), "errors": len(errors),
+        "p50_ms": ms(percentile(latencies, 50)), "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)), "max_ms": ms(latencies[-1] if latencies else None),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None, "wall_s": round(wall, 2),
+    }
+    if errors:
+        result["sample_errors"] = sorted(set(errors))[:3]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", nargs="+", choices=NODES, default=NODES)
+    parser.add_argument("--requests", type=int, default=50, help="Ejecuciones por nodo")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--frame-size", type=int, default=512, help="Lado de las imágenes de entrada")
+    parser.add_argument("--url", help="Servidor simulado externo (por defecto se arranca uno)")
+    parser.add_argument("--json", action="store_true", help="Salida JSON")
+    parser.add_argument("--output", help="Archivo JSON de salida")
+    mock_providers.add_profile_arguments(parser)
+    parser.set_defaults(latency=0.5)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = mock_providers.start_server(latency=args.latency, **mock_providers.profile_from_args(args))
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["CL_YOURMIRROR_BASE_URL"] = url
+    os.environ["CL_GEMINI_BASE_URL"] = url
+
+    from nodes.common.sdk import is_available
+
+    frame = torch.from_numpy(np.random.rand(1, args.frame_size, args.frame_size, 3).astype(np.float32))
+    calls = node_calls(frame)
+    report = {"profile": {"latency": args.latency, **mock_providers.profile_from_args(args)}, "nodes": {}}
+    try:
+        for node in args.nodes:
+            if not is_available(NODE_SDKS[node]):
+                report["nodes"][node] = {"skipped": f"{NODE_SDKS[node]} no está instalado"}
+                continue
+            fn, text_index = calls[node]
+            report["nodes"][node] = run_node(fn, text_index, args.requests, args.concurrency)
+    finally:
+        if server is not None:
+            report["server"] = dict(server.RequestHandlerClass.state.counters)
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'node':<10}{'ok':>5}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>8}")
+    for node, r in report["nodes"].items():
+        if "skipped" in r:
+            print(f"{node:<10}  {r['skipped']}")
+            continue
+        print(f"{node:<10}{r['ok']:>5}{r['errors']:>5}{str(r['p50_ms']):>10}{str(r['p95_ms']):>10}"
+              f"{str(r['p99_ms']):>10}{str(r['throughput_rps']):>8}")
+        for error in r.get("sample_errors", []):
+            print(f"    {error}")
+
+
+if __name__ == "__main__":
+    main()
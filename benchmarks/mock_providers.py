@@ -0,0 +1,439 @@
+"""
+Servidor HTTP local que imita a los proveedores para pruebas y benchmarks sin red.
+
+Endpoints de YourMirror (CL_YOURMIRROR_BASE_URL=http://127.0.0.1:8765):
+- POST /generate: respuesta síncrona
+- POST /gradio_api/call/generate -> {"event_id": ...} (cola)
+- GET  /gradio_api/call/generate/<event_id>: stream SSE con heartbeats y "event: complete"
+- GET  /results/<id>.png: imagen resultado
+
+Endpoints de OpenAI (OPENAI_BASE_URL=http://127.0.0.1:8765/v1):
+- POST /v1/chat/completions (también `stream=True` por SSE), /v1/responses, /v1/images/edits
+- Batch API: POST /v1/files, POST /v1/batches, GET /v1/batches/<id>, GET /v1/files/<id>/content
+  Cada lote se completa tras la latencia con respuestas sintéticas.
+
+Endpoint de Gemini por REST (CL_GEMINI_BASE_URL=http://127.0.0.1:8765):
+- POST /v1beta/models/<modelo>:generateContent
+
+Cada solicitud de generación espera una latencia muestreada de `--latency-dist` (fixed,
+uniform, normal, lognormal, exponential; media `--latency`, dispersión `--jitter`), y puede
+fallar con 429 + Retry-After (`--error-rate`) o colgarse `--timeout-delay` segundos y cerrar
+la conexión sin responder (`--timeout-rate`). `--seed` hace reproducible la secuencia.
+Toda respuesta lleva `X-Mock-Request-Bytes` con el tamaño del cuerpo recibido.
+
+Uso:
+    python benchmarks/mock_providers.py [--port 8765] [--latency 2.0] [--latency-dist lognormal]
+                                        [--jitter 0.3] [--error-rate 0.05] [--timeout-rate 0.01] [--seed 1]
+"""
+
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from PIL import Image
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "normal", "lognormal", "exponential"]
+
+_GEMINI_PATH = re.compile(r"^/v1beta/models/([^/:]+):generateContent")
+_CHAT_TEXT = ("A model wears a tailored red dress with clean lines, soft studio light and a neutral "
+              "background, photographed in sharp detail for a fashion catalogue. ")
+
+
+class MockState:
+    """Estado compartido del servidor: trabajos en cola, contadores y perfil de latencia/fallos"""
+
+    def __init__(self, latency: float, result_size=(768, 1024), distribution: str = "fixed", jitter: float = 0.0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, timeout_delay: float = 10.0,
+                 retry_after: float = 1.0, token_latency: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.result_size = result_size
+        self.distribution = distribution
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.retry_after = retry_after
+        self.token_latency = token_latency
+        self.random = random.Random(seed)
+        self.jobs = {}
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.counters = {"generate": 0, "queue_submit": 0, "queue_stream": 0, "results": 0,
+                         "batch_files": 0, "batches": 0, "openai": 0, "gemini": 0,
+                         "injected_429": 0, "injected_timeouts": 0, "bytes_received": 0}
+        self._result_png = None
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += amount
+
+    def sample_latency(self) -> float:
+        """Latencia de una solicitud según la distribución configurada (media `latency`)"""
+        with self.lock:
+            rng = self.random
+            if self.latency <= 0:
+                return 0.0
+            if self.distribution == "uniform":
+                value = rng.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter))
+            elif self.distribution == "normal":
+                value = rng.gauss(self.latency, self.latency * self.jitter)
+            elif self.distribution == "lognormal":
+                # `jitter` es sigma; mu se ajusta para que la media sea `latency`
+                sigma = self.jitter
+                value = rng.lognormvariate(math.log(self.latency) - sigma * sigma / 2, sigma)
+            elif self.distribution == "exponential":
+                value = rng.expovariate(1.0 / self.latency)
+            else:
+                value = self.latency
+        return max(0.0, value)
+
+    def sample_fault(self) -> Optional[str]:
+        """None, "429" o "timeout" según las tasas de inyección"""
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.error_rate:
+            self.count("injected_429")
+            return "429"
+        if roll < self.error_rate + self.timeout_rate:
+            self.count("injected_timeouts")
+            return "timeout"
+        return None
+
+    def result_png(self) -> bytes:
+        if self._result_png is None:
+            buffer = io.BytesIO()
+            Image.new("RGB", self.result_size, (200, 120, 80)).save(buffer, format="PNG")
+            self._result_png = buffer.getvalue()
+        return self._result_png
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo van en escrituras separadas: sin esto Nagle + delayed ACK suman ~40 ms
+    disable_nagle_algorithm = True
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._request_bytes = len(body)
+        self.state.count("bytes_received", len(body))
+        return body
+
+    def _read_json(self):
+        return json.loads(self._read_body() or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Mock-Request-Bytes", str(getattr(self, "_request_bytes", 0)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+    def _result_url(self) -> str:
+        return f"http://{self.headers.get('Host')}/results/{uuid.uuid4().hex}.png"
+
+    def _simulate(self, error_body) -> bool:
+        """Aplica la latencia o el fallo inyectado; False si ya se respondió (o se colgó)"""
+        fault = self.state.sample_fault()
+        if fault == "429":
+            retry_after = f"{self.state.retry_after:g}"
+            self._send_json(429, error_body, headers={"Retry-After": retry_after,
+                                                      "x-ratelimit-reset-requests": f"{retry_after}s"})
+            return False
+        if fault == "timeout":
+            # Servidor colgado: el cliente ve su timeout o una conexión cerrada sin respuesta
+            time.sleep(self.state.timeout_delay)
+            self.close_connection = True
+            return False
+        time.sleep(self.state.sample_latency())
+        return True
+
+    def do_POST(self):
+        self._request_bytes = 0
+        openai_error = {"error": {"message": "Rate limit reached (mock)", "type": "requests",
+                                  "code": "rate_limit_exceeded"}}
+        gemini = _GEMINI_PATH.match(self.path)
+        if self.path in ("/v1/chat/completions", "/v1/responses"):
+            self.state.count("openai")
+            body = self._read_json()
+            if not self._simulate(openai_error):
+                return
+            if self.path == "/v1/chat/completions" and body.get("stream"):
+                self._stream_chat(body)
+            else:
+                self._send_json(200, self._batch_body(self.path, body))
+        elif self.path == "/v1/images/edits":
+            self.state.count("openai")
+            self._read_body()
+            if not self._simulate(openai_error):
+                return
+            self._send_json(200, {"created": int(time.time()), "data": [
+                {"b64_json": base64.b64encode(self.state.result_png()).decode("ascii"),
+                 "revised_prompt": "Mock edit result"}
+            ], "usage": {"input_tokens": 50, "output_tokens": 1056, "total_tokens": 1106}})
+        elif gemini:
+            self.state.count("gemini")
+            self._read_body()
+            if not self._simulate({"error": {"code": 429, "message": "Resource has been exhausted (mock)",
+                                             "status": "RESOURCE_EXHAUSTED"}}):
+                return
+            self._send_json(200, self._gemini_body(gemini.group(1)))
+        elif self.path == "/v1/files":
+            self._create_file()
+        elif self.path == "/v1/batches":
+            self._create_batch()
+        elif self.path == "/generate":
+            self.state.count("generate")
+            self._read_json()
+            if not self._simulate({"error": "Rate limit exceeded (mock)"}):
+                return
+            self._send_json(200, {"data": [self._result_url()]})
+        elif self.path == "/gradio_api/call/generate":
+            self.state.count("queue_submit")
+            self._read_json()
+            if not self._simulate({"error": "Rate limit exceeded (mock)"}):
+                return
+            event_id = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.jobs[event_id] = time.monotonic() + self.state.latency
+            self._send_json(200, {"event_id": event_id})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_GET(self):
+        self._request_bytes = 0
+        if self.path.startswith("/v1/batches/"):
+            self._get_batch(self.path.rsplit("/", 1)[-1])
+        elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            data = self.state.files.get(self.path.split("/")[3])
+            if data is None:
+                self._send_json(404, {"error": {"message": "No such file"}})
+            else:
+                self._send(200, data, "application/octet-stream")
+        elif self.path.startswith("/gradio_api/call/generate/"):
+            self.state.count("queue_stream")
+            self._stream_job(self.path.rsplit("/", 1)[-1])
+        elif self.path.startswith("/results/"):
+            self.state.count("results")
+            self._send(200, self.state.result_png(), "image/png")
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    # --- Chat Completions en streaming (SSE con transfer-encoding chunked) -----
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_chat(self, body):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        max_tokens = min(int(body.get("max_tokens") or 64), 4096)
+        words = (_CHAT_TEXT * (max_tokens // 20 + 1)).split()[:max_tokens]
+
+        def event(delta, finish_reason=None, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": body.get("model"),
+                     "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            if usage:
+                chunk["usage"] = usage
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Mock-Request-Bytes", str(self._request_bytes))
+        self.end_headers()
+        sent = 0
+        try:
+            self._write_chunk(event({"role": "assistant", "content": ""}))
+            for i, word in enumerate(words):
+                time.sleep(self.state.token_latency)
+                self._write_chunk(event({"content": word if i == 0 else " " + word}))
+                sent += 1
+            self._write_chunk(event({}, finish_reason="length"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._write_chunk(event(None, usage={"prompt_tokens": 50, "completion_tokens": sent,
+                                                     "total_tokens": 50 + sent}))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó el stream (p. ej. al llegar a max_characters)
+            self.close_connection = True
+
+    def _stream_job(self, event_id: str):
+        with self.state.lock:
+            ready_at = self.state.jobs.get(event_id)
+        if ready_at is None:
+            self._send_json(404, {"error": "Unknown event_id"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        while time.monotonic() < ready_at:
+            self.wfile.write(b"event: heartbeat\ndata: null\n\n")
+            self.wfile.flush()
+            time.sleep(min(0.5, max(0.0, ready_at - time.monotonic())))
+        result = json.dumps([{"url": self._result_url(), "meta": {"_type": "gradio.FileData"}}])
+        self.wfile.write(f"event: complete\ndata: {result}\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+    # --- Batch API de OpenAI ---------------------------------------------------
+
+    def _create_file(self):
+        self.state.count("batch_files")
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        data = b""
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                data = part.get_payload(decode=True)
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.state.lock:
+            self.state.files[file_id] = data
+        self._send_json(200, {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                              "filename": "input.jsonl", "purpose": "batch", "status": "processed"})
+
+    def _create_batch(self):
+        self.state.count("batches")
+        request = self._read_json()
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+            "metadata": request.get("metadata"),
+        }
+        with self.state.lock:
+            self.state.batches[batch_id] = (batch, time.monotonic() + self.state.latency)
+        self._send_json(200, batch)
+
+    def _get_batch(self, batch_id: str):
+        with self.state.lock:
+            entry = self.state.batches.get(batch_id)
+        if entry is None:
+            self._send_json(404, {"error": {"message": "No such batch"}})
+            return
+        batch, ready_at = entry
+        if batch["status"] == "in_progress" and time.monotonic() >= ready_at:
+            lines = []
+            for line in self.state.files[batch["input_file_id"]].splitlines():
+                if line.strip():
+                    request = json.loads(line)
+                    body = self._batch_body(request["url"], request["body"])
+                    lines.append(json.dumps({
+                        "id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": body},
+                        "error": None,
+                    }))
+            output_id = f"file-{uuid.uuid4().hex[:24]}"
+            with self.state.lock:
+                self.state.files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+                batch.update(status="completed", output_file_id=output_id, completed_at=int(time.time()))
+        self._send_json(200, batch)
+
+    def _batch_body(self, url: str, body):
+        usage = {"input_tokens": 50, "output_tokens": 50, "prompt_tokens": 50, "completion_tokens": 50,
+                 "total_tokens": 100}
+        if url == "/v1/chat/completions":
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "A mock batch response in English."}}],
+                "usage": usage,
+            }
+        return {
+            "id": f"resp_{uuid.uuid4().hex[:12]}", "object": "response", "model": body.get("model"),
+            "output": [{"type": "image_generation_call", "id": f"ig_{uuid.uuid4().hex[:12]}", "status": "completed",
+                        "revised_prompt": "Mock batch result",
+                        "result": base64.b64encode(self.state.result_png()).decode("ascii")}],
+            "usage": usage,
+        }
+
+    def _gemini_body(self, model: str):
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [
+                    {"text": "Mock Gemini image"},
+                    {"inlineData": {"mimeType": "image/png",
+                                    "data": base64.b64encode(self.state.result_png()).decode("ascii")}},
+                ]},
+                "finishReason": "STOP", "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 1290, "totalTokenCount": 1590},
+            "modelVersion": model,
+        }
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency: float = 2.0, **profile):
+    """Arranca el servidor en un hilo; devuelve (servidor, url base). `profile`: ver MockState"""
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(latency, **profile)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-providers", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Opciones de latencia y fallos (compartidas con load_driver.py)"""
+    parser.add_argument("--latency", type=float, default=2.0, help="Latencia media por solicitud (s)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.3,
+                        help="Dispersión relativa (uniform/normal) o sigma (lognormal)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de solicitudes con 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de los 429 (s)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fracción de solicitudes colgadas")
+    parser.add_argument("--timeout-delay", type=float, default=10.0, help="Segundos colgada antes de cerrar")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Segundos por token en streaming")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla de latencias y fallos")
+
+
+def profile_from_args(args) -> dict:
+    return {"distribution": args.latency_dist, "jitter": args.jitter, "error_rate": args.error_rate,
+            "retry_after": args.retry_after, "timeout_rate": args.timeout_rate,
+            "timeout_delay": args.timeout_delay, "token_latency": args.token_latency, "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_server(args.host, args.port, args.latency, **profile_from_args(args))
+    print(f"Mock providers en {url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(server.RequestHandlerClass.state.counters, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,21 +13,26 @@ Usage: Search for "CL_GeminiFlash" or "chelogarcho" in ComfyUI
 import os
 import io
 import base64
+import time
 import torch
-import numpy as np
 from PIL import Image
 from typing import Optional, Tuple, List, Dict, Any
 
-# Lazy-import: no fallar en import del módulo para que el nodo sea visible en ComfyUI
-try:
-    import google.generativeai as genai  # type: ignore
-    from google.generativeai.types import HarmCategory, HarmBlockThreshold  # type: ignore
-    _HAS_GENAI = True
-except Exception:
-    genai = None  # type: ignore
-    HarmCategory = None  # type: ignore
-    HarmBlockThreshold = None  # type: ignore
-    _HAS_GENAI = False
+from .common import imaging
+from .common.clients import get_client
+from .common.concurrency import map_bounded
+from .common.encoding import UPLOAD_CODECS, UploadStats, encode_image
+from .common.fingerprint import request_fingerprint
+from .common.imaging import MIXED_SIZE_POLICIES, downscale_for_upload, frame_count, select_frame, stack_images
+from .common.ledger import execution_cost, format_cost, record_call
+from .common.rate_limit import IMAGE_OUTPUT_TOKENS, TOKENS_PER_IMAGE, Pacer, RateLimitStats, estimate_tokens, get_limiter
+from .common.response_cache import CACHE_MODES, ResponseCache, get_response_cache
+from .common.retry import call_with_retry
+from .common.sdk import is_available, require
+from .common.singleflight import coalesce
+from .common.telemetry import span, traced
+
+GEMINI_IMAGE_MODEL = 'gemini-2.5-flash-image-preview'
 
 
 class CL_GeminiFlash:
@@ -48,17 +53,38 @@ class CL_GeminiFlash:
             raise ValueError("Google API Key is required. Please enter your API key in the node.")
         
         try:
-            if not _HAS_GENAI:
-                raise ImportError(
-                    "google-generativeai no está instalado. Instala con: pip install google-generativeai>=0.8.0"
-                )
-            genai.configure(api_key=api_key.strip())  # type: ignore
-            self.client = genai.GenerativeModel('gemini-2.5-flash-image-preview')  # type: ignore
-            print("✅ Cliente Gemini Flash Image inicializado correctamente")
+            # google-generativeai (con grpc/protobuf) se importa en la primera ejecución
+            require("google.generativeai", "google-generativeai>=0.8.0")
+            key = api_key.strip()
+            # CL_GEMINI_BASE_URL apunta a un servidor compatible (p. ej. benchmarks/mock_providers.py)
+            base_url = os.environ.get("CL_GEMINI_BASE_URL")
+            self.client = get_client("gemini", key, lambda: self._build_model(key, base_url),
+                                     base_url=base_url, variant=GEMINI_IMAGE_MODEL)
             return True
         except Exception as e:
             raise ValueError(f"Error inicializando cliente Gemini: {e}")
     
+    @staticmethod
+    def _build_model(api_key: str, base_url: Optional[str] = None):
+        """Construye el GenerativeModel ligado a su propio cliente"""
+        genai = require("google.generativeai", "google-generativeai>=0.8.0")
+        if base_url:
+            # Endpoint alternativo: sólo por REST (el transporte gRPC necesita TLS)
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": base_url})
+        else:
+            genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(GEMINI_IMAGE_MODEL)
+        # genai.configure es global: ligar ya el cliente evita que otro nodo con
+        # una api_key distinta lo reemplace antes de la primera llamada
+        try:
+            from google.generativeai import client as genai_client  # type: ignore
+            if getattr(model, "_client", None) is None:
+                model._client = genai_client.get_default_generative_client()
+        except Exception:
+            pass
+        print("✅ Cliente Gemini Flash Image inicializado correctamente")
+        return model
+
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -88,6 +114,17 @@ class CL_GeminiFlash:
                 "reference_image": ("IMAGE",),
                 "secondary_image": ("IMAGE",),
                 "mask_image": ("IMAGE",),
+                "batch_mode": (["off", "per_frame", "per_prompt_line"], {"default": "off"}),
+                "max_in_flight": ("INT", {"default": 4, "min": 1, "max": 32}),
+                "cache_mode": (CACHE_MODES, {"default": "off"}),
+                "upload_codec": (UPLOAD_CODECS, {"default": "png"}),
+                "max_upload_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "mixed_size_policy": (MIXED_SIZE_POLICIES, {"default": "resize"}),
+                "rpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000}),
+                "tpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000000}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
     
@@ -98,41 +135,12 @@ class CL_GeminiFlash:
     DESCRIPTION = "Generate and edit images using Gemini 2.5 Flash Image"
     
     def tensor_to_pil(self, tensor: torch.Tensor) -> Image.Image:
-        """Convierte tensor de ComfyUI a PIL Image"""
-        if tensor.dim() == 4:
-            tensor = tensor.squeeze(0)  # Remover dimensión batch
-        
-        # Convertir de tensor [H, W, C] a numpy
-        np_image = tensor.cpu().numpy()
-        
-        # Asegurar valores en rango [0, 255]
-        if np_image.max() <= 1.0:
-            np_image = np_image * 255.0
-        
-        np_image = np_image.astype(np.uint8)
-        
-        # Convertir a PIL Image
-        if np_image.shape[2] == 3:  # RGB
-            return Image.fromarray(np_image, 'RGB')
-        elif np_image.shape[2] == 4:  # RGBA
-            return Image.fromarray(np_image, 'RGBA')
-        else:
-            # Manejar escala de grises
-            return Image.fromarray(np_image[:,:,0], 'L')
+        """Convierte tensor de ComfyUI a PIL Image (primer frame del batch)"""
+        return imaging.tensor_to_pil(tensor)
     
     def pil_to_tensor(self, pil_image: Image.Image) -> torch.Tensor:
-        """Convierte PIL Image a tensor de ComfyUI"""
-        # Asegurar formato RGB
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
-        # Convertir a numpy array
-        np_image = np.array(pil_image).astype(np.float32) / 255.0
-        
-        # Convertir a tensor con dimensión batch [1, H, W, C]
-        tensor = torch.from_numpy(np_image)[None,]
-        
-        return tensor
+        """Convierte PIL Image a tensor de ComfyUI [1, H, W, C]"""
+        return imaging.pil_to_tensor(pil_image)
     
     def get_optimized_prompt(self, mode: str, custom_prompt: str) -> str:
         """Obtiene prompts optimizados según el modo seleccionado"""
@@ -149,8 +157,9 @@ class CL_GeminiFlash:
         return mode_prompts.get(mode, custom_prompt)
     
     def prepare_contents(self, prompt: str, primary_image=None, reference_image=None, 
-                        secondary_image=None, mask_image=None) -> List[Any]:
-        """Prepara el contenido para la API de Gemini"""
+                        secondary_image=None, mask_image=None, upload_codec: str = "png",
+                        upload_stats: Optional[UploadStats] = None, max_upload_side: int = 0) -> List[Any]:
+        """Prepara el contenido para la API de Gemini (imágenes ya codificadas como blobs)"""
         contents = [prompt]
         
         # Agregar imágenes en orden de prioridad
@@ -161,8 +170,13 @@ class CL_GeminiFlash:
         for image_tensor in images_to_process:
             if image_tensor is not None:
                 try:
+                    # Reducir sobre el tensor a la resolución efectiva de Gemini antes de codificar
+                    image_tensor = downscale_for_upload(image_tensor, "gemini", max_upload_side)
                     pil_image = self.tensor_to_pil(image_tensor)
-                    contents.append(pil_image)
+                    encoded = encode_image(pil_image, upload_codec)
+                    if upload_stats is not None:
+                        upload_stats.record(encoded)
+                    contents.append({"mime_type": encoded.mime_type, "data": encoded.data})
                 except Exception as e:
                     print(f"⚠️ Error procesando imagen: {e}")
                     continue
@@ -187,7 +201,9 @@ class CL_GeminiFlash:
                         # Extraer imagen
                         elif hasattr(part, 'inline_data') and part.inline_data:
                             image_data = part.inline_data.data
-                            generated_image = Image.open(io.BytesIO(image_data))
+                            with span("decode"):
+                                generated_image = Image.open(io.BytesIO(image_data))
+                                generated_image.load()
             
             # Limpiar texto
             text_response = text_response.strip()
@@ -200,7 +216,71 @@ class CL_GeminiFlash:
         
         return generated_image, text_response
     
-    def generate_with_gemini(self, api_key: str, prompt: str, mode: str, model: str, primary_image=None, reference_image=None, secondary_image=None, mask_image=None) -> Tuple:
+    def get_safety_settings(self) -> Optional[Dict[Any, Any]]:
+        """Parámetros de seguridad más permisivos"""
+        if is_available("google.generativeai"):
+            from google.generativeai.types import HarmCategory, HarmBlockThreshold  # type: ignore
+            return {
+                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+            }
+        return None
+    
+    def generate_single(self, contents: List[Any], safety_settings,
+                        pacer: Optional[Pacer] = None) -> Tuple[Optional[Image.Image], str]:
+        """
+        Realiza una única llamada a Gemini y devuelve (imagen, texto)
+        `pacer` espera el cupo compartido antes de cada intento, reintentos incluidos
+        """
+        start = time.perf_counter()
+        # Generación facturada: sólo se reintenta si el servidor rechazó la petición
+        response = call_with_retry(
+            lambda: self.client.generate_content(
+                contents=contents,
+                safety_settings=safety_settings,
+                generation_config={
+                    'temperature': 0.7,
+                    'top_p': 0.9,
+                    'top_k': 40,
+                    'max_output_tokens': 2048,
+                }
+            ),
+            idempotent=False, label="Gemini generate_content", before_attempt=pacer
+        )
+        latency = time.perf_counter() - start - (pacer.wait_seconds if pacer is not None else 0.0)
+        usage = getattr(response, "usage_metadata", None)
+        if pacer is not None:
+            # Ajusta la cubeta TPM con el consumo real
+            pacer.settle(getattr(usage, "total_token_count", None))
+        generated_image, text_response = self.process_response(response)
+        record_call("gemini", GEMINI_IMAGE_MODEL, usage=usage, images_in=len(contents) - 1,
+                    images_out=int(generated_image is not None), latency=latency)
+        return generated_image, text_response
+    
+    def build_batch_items(self, batch_mode: str, final_prompt: str, mode: str, prompt: str,
+                          images: List[Any]) -> List[Tuple[str, List[Any]]]:
+        """Divide la ejecución en items (prompt, frames) según el modo batch"""
+        if batch_mode == "per_prompt_line":
+            prompts = [self.get_optimized_prompt(mode, line.strip())
+                       for line in prompt.splitlines() if line.strip()] or [final_prompt]
+            count = len(prompts)
+        elif batch_mode == "per_frame":
+            count = max([frame_count(img) for img in images] + [1])
+            prompts = [final_prompt] * count
+        else:
+            # Modo clásico: una sola llamada con el primer frame de cada entrada
+            return [(final_prompt, [select_frame(img, 0) for img in images])]
+        
+        return [(prompts[i], [select_frame(img, i) for img in images]) for i in range(count)]
+    
+    @traced("CL_GeminiFlash", debug_output=2)
+    def generate_with_gemini(self, api_key: str, prompt: str, mode: str, model: str, primary_image=None, reference_image=None, secondary_image=None, mask_image=None,
+                             batch_mode: str = "off", max_in_flight: int = 4, cache_mode: str = "off",
+                             upload_codec: str = "png", max_upload_side: int = 0,
+                             mixed_size_policy: str = "resize", rpm_limit: int = 0, tpm_limit: int = 0,
+                             unique_id: Optional[str] = None) -> Tuple:
         """Función principal para generar/editar imágenes con Gemini"""
         debug_info = []
         
@@ -224,57 +304,101 @@ class CL_GeminiFlash:
             debug_info.append(f"Modelo: {model}")
             debug_info.append(f"Prompt optimizado: {final_prompt[:100]}...")
             
-            # Preparar contenido
-            contents = self.prepare_contents(
-                final_prompt, 
-                primary_image, 
-                reference_image, 
-                secondary_image, 
-                mask_image
-            )
+            # Un item por frame o por línea de prompt según batch_mode
+            images = [primary_image, reference_image, secondary_image, mask_image]
+            items = self.build_batch_items(batch_mode, final_prompt, mode, prompt, images)
+            debug_info.append(f"Batch: {batch_mode} | Items: {len(items)} | Máx. en vuelo: {max_in_flight}")
             
-            image_count = len([c for c in contents if isinstance(c, Image.Image)])
+            image_count = len([img for img in items[0][1] if img is not None])
             debug_info.append(f"Imágenes de entrada: {image_count}")
             
-            # Configurar parámetros de seguridad más permisivos
-            safety_settings = None
-            if _HAS_GENAI and HarmCategory is not None and HarmBlockThreshold is not None:
-                safety_settings = {
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                }
+            safety_settings = self.get_safety_settings()
             
-            # Realizar llamada a la API
-            print("🚀 Enviando solicitud a Gemini 2.5 Flash Image...")
-            response = self.client.generate_content(
-                contents=contents,
-                safety_settings=safety_settings,
-                generation_config={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'max_output_tokens': 2048,
-                }
-            )
+            # Caché por contenido: una entrada por item
+            cache = get_response_cache() if cache_mode != "off" else None
+            cache_hits, coalesced = [], []
+            upload_stats = UploadStats()
+            # Cupo RPM/TPM compartido por todas las ramas que usan la misma api_key
+            limiter = get_limiter("gemini", model, api_key, rpm_limit, tpm_limit)
+            rate_stats = RateLimitStats()
+            
+            def run_item(item):
+                item_prompt, item_images = item
+                try:
+                    # El códec de subida cambia la imagen que recibe el modelo (jpeg/webp con pérdida)
+                    params = {"max_upload_side": max_upload_side, "upload_codec": upload_codec}
+                    if cache is not None:
+                        # Clave exacta (hash de todos los píxeles): sólo hace falta con caché
+                        cache_key = ResponseCache.make_key("CL_GeminiFlash", model, item_prompt, params, item_images)
+                        cached = cache.get(cache_key)
+                        if cached is not None:
+                            cache_hits.append(item_prompt)
+                            return cached.images, cached.texts.get("text_response", "")
+                    
+                    def send():
+                        # Preparar contenido
+                        contents = self.prepare_contents(item_prompt, *item_images,
+                                                         upload_codec=upload_codec, upload_stats=upload_stats,
+                                                         max_upload_side=max_upload_side)
+                        pacer = Pacer(limiter, estimate_tokens(item_prompt, len(contents) - 1, TOKENS_PER_IMAGE["gemini"],
+                                                               IMAGE_OUTPUT_TOKENS["gemini"]), rate_stats)
+                        return self.generate_single(contents, safety_settings, pacer)
+                    
+                    # Las solicitudes idénticas en vuelo (otras ramas o items repetidos) comparten una llamada
+                    flight_key = request_fingerprint("CL_GeminiFlash", model, item_prompt, params, item_images)
+                    (generated_image, text_response), shared = coalesce((flight_key, api_key), send)
+                    if shared:
+                        coalesced.append(item_prompt)
+                    if cache is not None and cache_mode == "read_write" and generated_image is not None:
+                        cache.put(cache_key, generated_image, {"text_response": text_response})
+                    return generated_image, text_response
+                except Exception as e:
+                    return e
             
-            # Procesar respuesta
-            generated_image, text_response = self.process_response(response)
+            # Realizar llamadas a la API con un máximo de solicitudes en vuelo
+            print(f"🚀 Enviando {len(items)} solicitud(es) a Gemini 2.5 Flash Image...")
+            results = map_bounded(run_item, items, max_in_flight)
+            if cache is not None:
+                debug_info.append(f"Caché ({cache_mode}): {len(cache_hits)}/{len(items)} aciertos")
+            if coalesced:
+                debug_info.append(f"Agrupadas: {len(coalesced)}/{len(items)} solicitudes compartieron una llamada en vuelo")
+            if limiter is not None:
+                debug_info.append(rate_stats.summary())
             
-            if generated_image:
-                result_tensor = self.pil_to_tensor(generated_image)
-                debug_info.append(f"Imagen generada: {generated_image.size}")
-                debug_info.append("✅ Éxito: Generación completada")
+            errors = [r for r in results if isinstance(r, Exception)]
+            if len(errors) == len(results):
+                raise errors[0]
+            
+            # Imágenes PIL (o tensores de la caché) que se decodifican en un batch preasignado
+            frames, texts, generated_count = [], [], 0
+            for result in results:
+                generated, text_response = (None, f"Error: {result}") if isinstance(result, Exception) else result
+                if generated is not None:
+                    frames.append(generated)
+                    generated_count += 1
+                else:
+                    # Si no hay imagen, crear una imagen placeholder
+                    frames.append(Image.new('RGB', (512, 512), color=(100, 100, 100)))
+                    text_response = text_response or "No se pudo generar imagen"
+                texts.append(text_response)
+            
+            result_tensor = stack_images(frames, mixed_size_policy)
+            if len(texts) == 1:
+                text_response = texts[0]
+            else:
+                text_response = "\n".join(f"[{i}] {text}" for i, text in enumerate(texts))
+            
+            if generated_count:
+                debug_info.append(f"Imagen generada: {tuple(result_tensor.shape[2:0:-1])}")
+                debug_info.append(f"✅ Éxito: {generated_count}/{len(items)} generaciones completadas")
             else:
-                # Si no hay imagen, crear una imagen placeholder
-                placeholder = Image.new('RGB', (512, 512), color=(100, 100, 100))
-                result_tensor = self.pil_to_tensor(placeholder)
                 debug_info.append("⚠️ No se generó imagen, usando placeholder")
-                text_response = text_response or "No se pudo generar imagen"
             
-            # Agregar información de costo
-            debug_info.append("💰 Costo estimado: ~$0.039 por imagen")
+            debug_info.append(upload_stats.summary())
+            
+            # Costo de las llamadas registradas en el ledger (los aciertos de caché no se facturan)
+            billed_count = max(generated_count - len(cache_hits) - len(coalesced), 0)
+            debug_info.append(f"💰 Costo: {format_cost(execution_cost())} ({billed_count} imagen(es) facturada(s))")
             debug_info.append("🔒 Imagen incluye marca SynthID invisible")
             
             debug_str = " | ".join(debug_info)
@@ -13,8 +13,7 @@ Usage: Search for "CL_ImageFidelity" or "chelogarcho" in ComfyUI
 import os
 import io
 import base64
-import torch
-import numpy as np
+import time
 from PIL import Image, ImageOps
 # `folder_paths` sólo existe dentro de ComfyUI; no debe romper importaciones fuera
 try:
@@ -22,13 +21,22 @@ try:
 except Exception:
     folder_paths = None  # type: ignore
 
-# Lazy-import de OpenAI para que el nodo sea visible aunque falte la dependencia
-try:
-    from openai import OpenAI  # type: ignore
-    _HAS_OPENAI = True
-except Exception:
-    OpenAI = None  # type: ignore
-    _HAS_OPENAI = False
+from .common import imaging
+from .common.batch import EXECUTION_MODES, BatchPending, as_response, get_batch_manager
+from .common.clients import get_client
+from .common.concurrency import map_bounded
+from .common.encoding import UPLOAD_CODECS, UploadStats, encode_image
+from .common.fingerprint import fingerprint_inputs, request_fingerprint
+from .common.imaging import (
+    MIXED_SIZE_POLICIES, downscale_for_upload, frame_count, resolve_max_side, select_frame, stack_images
+)
+from .common.ledger import compute_cost, execution_cost, format_cost, record_call
+from .common.rate_limit import IMAGE_OUTPUT_TOKENS, TOKENS_PER_IMAGE, Pacer, RateLimitStats, estimate_tokens, get_limiter
+from .common.response_cache import CACHE_MODES, ResponseCache, get_response_cache
+from .common.retry import call_with_retry
+from .common.sdk import require
+from .common.singleflight import coalesce
+from .common.telemetry import span, traced
 
 
 class CL_ImageFidelity:
@@ -49,9 +57,16 @@ class CL_ImageFidelity:
             raise ValueError("OpenAI API Key is required. Please enter your API key in the node.")
         
         try:
-            if not _HAS_OPENAI:
-                raise ImportError("openai no está instalado. Instala con: pip install openai>=1.12.0")
-            self.client = OpenAI(api_key=api_key.strip())  # type: ignore
+            # The SDK is imported on first execution, not when the node is registered
+            OpenAI = require("openai", "openai>=1.12.0").OpenAI
+            # Reutiliza el cliente del proceso para conservar conexiones TLS/keep-alive.
+            # Los reintentos los gestiona common.retry (el SDK no reintenta por su cuenta)
+            key = api_key.strip()
+            base_url = os.environ.get("OPENAI_BASE_URL")
+            self.client = get_client(
+                "openai", key, lambda: OpenAI(api_key=key, max_retries=0),
+                base_url=base_url
+            )
             return True
         except Exception as e:
             raise ValueError(f"Error initializing OpenAI client: {e}")
@@ -91,9 +106,32 @@ class CL_ImageFidelity:
             "optional": {
                 "reference_image": ("IMAGE",),
                 "mask_image": ("IMAGE",),
+                "max_concurrency": ("INT", {"default": 4, "min": 1, "max": 32}),
+                "cache_mode": (CACHE_MODES, {"default": "off"}),
+                "upload_codec": (UPLOAD_CODECS, {"default": "png"}),
+                "max_upload_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "mixed_size_policy": (MIXED_SIZE_POLICIES, {"default": "resize"}),
+                "rpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000}),
+                "tpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000000}),
+                "execution_mode": (EXECUTION_MODES, {"default": "sync"}),
+                "batch_flush_size": ("INT", {"default": 50, "min": 1, "max": 50000}),
+                "batch_flush_minutes": ("INT", {"default": 30, "min": 0, "max": 1440}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """Force a re-run while this node's frames are still in a batch"""
+        # Only widget values and UNIQUE_ID arrive here, never linked images, so the keys the node
+        # registered are checked instead (per-image dedup is the response cache's job in the node)
+        if (kwargs.get("execution_mode") == "batch"
+                and get_batch_manager().has_pending("CL_ImageFidelity", kwargs.get("unique_id"))):
+            return float("nan")
+        return fingerprint_inputs(**kwargs)
+    
     # Return types for ComfyUI
     RETURN_TYPES = ("IMAGE", "STRING", "STRING")
     RETURN_NAMES = ("image", "revised_prompt", "debug_info")
@@ -101,53 +139,27 @@ class CL_ImageFidelity:
     CATEGORY = "chelogarcho/Image Processing"
     
     def tensor_to_pil(self, tensor):
-        """Convert ComfyUI tensor to PIL Image"""
-        # Handle batch dimension
-        if len(tensor.shape) == 4:
-            tensor = tensor[0]
-        
-        # Convert from tensor format [H, W, C] to numpy
-        np_image = tensor.cpu().numpy()
-        
-        # Ensure values are in [0, 255] range
-        if np_image.max() <= 1.0:
-            np_image = np_image * 255.0
-        
-        np_image = np_image.astype(np.uint8)
-        
-        # Convert to PIL Image
-        if np_image.shape[2] == 3:  # RGB
-            pil_image = Image.fromarray(np_image, 'RGB')
-        elif np_image.shape[2] == 4:  # RGBA
-            pil_image = Image.fromarray(np_image, 'RGBA')
-        else:
-            # Handle grayscale or other formats
-            pil_image = Image.fromarray(np_image[:,:,0], 'L')
-        
-        return pil_image
+        """Convert ComfyUI tensor to PIL Image (first frame of a batch)"""
+        return imaging.tensor_to_pil(tensor)
     
     def pil_to_tensor(self, pil_image):
-        """Convert PIL Image to ComfyUI tensor"""
-        # Ensure RGB format
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
-        # Convert to numpy array
-        np_image = np.array(pil_image).astype(np.float32) / 255.0
-        
-        # Convert to tensor with batch dimension [1, H, W, C]
-        tensor = torch.from_numpy(np_image)[None,]
-        
-        return tensor
+        """Convert PIL Image to ComfyUI tensor [1, H, W, C]"""
+        return imaging.pil_to_tensor(pil_image)
     
-    def pil_to_base64(self, pil_image, format="PNG"):
-        """Convert PIL Image to base64 string"""
-        buffer = io.BytesIO()
-        pil_image.save(buffer, format=format)
-        buffer.seek(0)
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    @staticmethod
+    def request_params(input_fidelity, quality, size, output_format, background, use_responses_api,
+                       max_upload_side, upload_codec):
+        """Options that change the result: part of every frame's request key"""
+        # Lossy upload codecs change the image the model actually receives
+        return {
+            "input_fidelity": input_fidelity, "quality": quality, "size": size,
+            "output_format": output_format, "background": background,
+            "use_responses_api": use_responses_api, "max_upload_side": max_upload_side,
+            "upload_codec": upload_codec,
+        }
     
-    def get_fashion_prompt(self, preset, custom_prompt):
+    @staticmethod
+    def get_fashion_prompt(preset, custom_prompt):
         """Get optimized prompts for fashion use cases"""
         fashion_prompts = {
             "outfit_variation": "Change the outfit while preserving the model's pose, facial features, and body proportions. Maintain fabric textures and realistic lighting.",
@@ -165,20 +177,26 @@ class CL_ImageFidelity:
             base_prompt = fashion_prompts.get(preset, custom_prompt)
             return f"{base_prompt}. {custom_prompt}" if custom_prompt.strip() else base_prompt
     
+    def encode_upload(self, pil_image, upload_codec="png", upload_stats=None):
+        """Encode an outbound image with the selected codec and record its size"""
+        encoded = encode_image(pil_image, upload_codec)
+        if upload_stats is not None:
+            upload_stats.record(encoded)
+        return encoded
+    
     def edit_with_images_api(self, client, primary_image, mask_image, prompt, 
-                           input_fidelity, quality, size, output_format, background):
+                           input_fidelity, quality, size, output_format, background,
+                           upload_codec="png", upload_stats=None, pacer=None):
         """Edit using OpenAI Images API - for single image editing"""
         try:
-            # Convert primary image to buffer
+            # Encode primary image in memory with the selected codec
             primary_pil = self.tensor_to_pil(primary_image)
-            image_buffer = io.BytesIO()
-            primary_pil.save(image_buffer, format="PNG")
-            image_buffer.seek(0)
+            encoded = self.encode_upload(primary_pil, upload_codec, upload_stats)
             
             # Prepare API parameters
             params = {
                 "model": "gpt-image-1",
-                "image": image_buffer,
+                "image": (f"image.{encoded.extension}", encoded.data, encoded.mime_type),
                 "prompt": prompt,
                 "size": size,
                 "quality": quality,
@@ -197,77 +215,106 @@ class CL_ImageFidelity:
             if background != "auto":
                 params["background"] = background
             
-            # Add mask if provided
+            # Add mask if provided (masks must stay PNG to keep their alpha channel)
             if mask_image is not None:
                 mask_pil = self.tensor_to_pil(mask_image)
-                mask_buffer = io.BytesIO()
-                mask_pil.save(mask_buffer, format="PNG")
-                mask_buffer.seek(0)
-                params["mask"] = mask_buffer
+                mask_encoded = self.encode_upload(mask_pil, "png", upload_stats)
+                params["mask"] = ("mask.png", mask_encoded.data, mask_encoded.mime_type)
             
-            # Make API call
-            response = client.images.edit(**params)
+            # Make API call (billed generation: only retried when the request was rejected)
+            start = time.perf_counter()
+            response = call_with_retry(
+                lambda: client.images.edit(**params), idempotent=False, label="OpenAI images.edit",
+                before_attempt=pacer
+            )
+            waited = pacer.wait_seconds if pacer is not None else 0.0
+            record_call("openai", "gpt-image-1", usage=getattr(response, "usage", None),
+                        images_in=1 + (mask_image is not None), images_out=1,
+                        latency=time.perf_counter() - start - waited)
             
             return response, "images_api"
             
         except Exception as e:
             raise Exception(f"Images API error: {str(e)}")
     
-    def edit_with_responses_api(self, client, primary_image, reference_image, prompt,
-                              input_fidelity, quality, size, output_format, background):
-        """Edit using OpenAI Responses API - for multi-image scenarios"""
-        try:
-            # Prepare content array
-            content = [
-                {"type": "input_text", "text": prompt}
-            ]
-            
-            # Add primary image
-            primary_pil = self.tensor_to_pil(primary_image)
-            primary_base64 = self.pil_to_base64(primary_pil, "PNG")
+    def build_responses_request(self, primary_image, reference_image, prompt,
+                                input_fidelity, quality, size, output_format, background,
+                                upload_codec="png", upload_stats=None):
+        """Build the Responses API request body (shared by sync and batch modes)"""
+        # Prepare content array
+        content = [
+            {"type": "input_text", "text": prompt}
+        ]
+        
+        # Add primary image
+        primary_pil = self.tensor_to_pil(primary_image)
+        content.append({
+            "type": "input_image",
+            "image_url": self.encode_upload(primary_pil, upload_codec, upload_stats).data_url()
+        })
+        
+        # Add reference image if provided
+        if reference_image is not None:
+            ref_pil = self.tensor_to_pil(reference_image)
             content.append({
                 "type": "input_image",
-                "image_url": f"data:image/png;base64,{primary_base64}"
+                "image_url": self.encode_upload(ref_pil, upload_codec, upload_stats).data_url()
             })
+        
+        # Prepare tool parameters
+        tool_params = {"type": "image_generation"}
+        
+        if input_fidelity == "high":
+            tool_params["input_fidelity"] = "high"
+        if quality != "auto":
+            tool_params["quality"] = quality
+        if size != "auto":
+            tool_params["size"] = size
+        if output_format != "auto":
+            tool_params["output_format"] = output_format
+        if background != "auto":
+            tool_params["background"] = background
+        
+        return {
+            "model": "gpt-4.1",
+            "input": [{
+                "role": "user",
+                "content": content
+            }],
+            "tools": [tool_params]
+        }
+    
+    def edit_with_responses_api(self, client, primary_image, reference_image, prompt,
+                              input_fidelity, quality, size, output_format, background,
+                              upload_codec="png", upload_stats=None, pacer=None):
+        """Edit using OpenAI Responses API - for multi-image scenarios"""
+        try:
+            request = self.build_responses_request(
+                primary_image, reference_image, prompt, input_fidelity, quality, size,
+                output_format, background, upload_codec, upload_stats
+            )
             
-            # Add reference image if provided
-            if reference_image is not None:
-                ref_pil = self.tensor_to_pil(reference_image)
-                ref_base64 = self.pil_to_base64(ref_pil, "PNG")
-                content.append({
-                    "type": "input_image",
-                    "image_url": f"data:image/png;base64,{ref_base64}"
-                })
-            
-            # Prepare tool parameters
-            tool_params = {"type": "image_generation"}
-            
-            if input_fidelity == "high":
-                tool_params["input_fidelity"] = "high"
-            if quality != "auto":
-                tool_params["quality"] = quality
-            if size != "auto":
-                tool_params["size"] = size
-            if output_format != "auto":
-                tool_params["output_format"] = output_format
-            if background != "auto":
-                tool_params["background"] = background
-            
-            # Make API call
-            response = client.responses.create(
-                model="gpt-4.1",
-                input=[{
-                    "role": "user",
-                    "content": content
-                }],
-                tools=[tool_params]
+            # Make API call (billed generation: only retried when the request was rejected)
+            start = time.perf_counter()
+            response = call_with_retry(
+                lambda: client.responses.create(**request),
+                idempotent=False, label="OpenAI responses.create", before_attempt=pacer
             )
+            waited = pacer.wait_seconds if pacer is not None else 0.0
+            record_call("openai", request["model"], usage=getattr(response, "usage", None),
+                        images_in=1 + (reference_image is not None), images_out=1,
+                        latency=time.perf_counter() - start - waited, extra_cost=self.image_tool_cost(quality))
             
             return response, "responses_api"
             
         except Exception as e:
             raise Exception(f"Responses API error: {str(e)}")
     
+    def image_tool_cost(self, quality):
+        """Estimated cost of the image_generation tool (billed as gpt-image-1 output tokens, not in usage)"""
+        output_tokens = IMAGE_OUTPUT_TOKENS.get(f"openai_image_{quality}", IMAGE_OUTPUT_TOKENS["openai_image_high"])
+        return compute_cost("gpt-image-1", 0, output_tokens) or 0.0
+    
     def process_images_api_response(self, response):
         """Process response from Images API"""
         if hasattr(response, 'data') and len(response.data) > 0:
@@ -313,9 +360,71 @@ class CL_ImageFidelity:
         else:
             raise Exception("No output received from Responses API")
     
+    def generate_single(self, client, primary_frame, reference_frame, mask_frame, final_prompt,
+                        input_fidelity, quality, size, output_format, background, use_responses_api,
+                        upload_codec="png", upload_stats=None, pacer=None):
+        """
+        Run one edit request for a single frame and return (decoded image, revised_prompt, api_used).
+        `pacer` waits for the shared rate limit before every attempt, retries included
+        """
+        if use_responses_api:
+            response, api_used = self.edit_with_responses_api(
+                client, primary_frame, reference_frame, final_prompt,
+                input_fidelity, quality, size, output_format, background,
+                upload_codec, upload_stats, pacer
+            )
+            image_base64, revised_prompt = self.process_responses_api_response(response)
+        else:
+            response, api_used = self.edit_with_images_api(
+                client, primary_frame, mask_frame, final_prompt,
+                input_fidelity, quality, size, output_format, background,
+                upload_codec, upload_stats, pacer
+            )
+            image_base64, revised_prompt = self.process_images_api_response(response)
+        
+        if pacer is not None:
+            # Correct the shared TPM bucket with the reported usage
+            pacer.settle(getattr(getattr(response, "usage", None), "total_tokens", None))
+        
+        return self.decode_result(image_base64), revised_prompt, api_used
+    
+    @span("decode")
+    def decode_result(self, image_base64):
+        """Decode a base64 result; pixels are written straight into the output batch later"""
+        image_bytes = base64.b64decode(image_base64)
+        result_image = Image.open(io.BytesIO(image_bytes))
+        result_image.load()
+        return result_image
+    
+    def run_batch_frame(self, client, api_key, custom_id, build_request, batch_results, quality="auto"):
+        """Queue one frame in the Batch API; return (image, revised_prompt, api_used) once its job is done"""
+        manager = get_batch_manager()
+        if manager.lookup(custom_id) is None:
+            # Images are only encoded when the request is actually queued
+            manager.enqueue("CL_ImageFidelity", api_key, "/v1/responses", custom_id, build_request())
+        result = manager.lookup(custom_id)
+        batch_results.append(result)
+        if result.status == "completed":
+            response = as_response(result.body)
+            image_base64, revised_prompt = self.process_responses_api_response(response)
+            # Re-runs read the result back from results/ without billing it again
+            if manager.mark_delivered(custom_id):
+                record_call("openai", getattr(response, "model", None) or "gpt-4.1",
+                            usage=getattr(response, "usage", None), images_out=1, mode="batch",
+                            extra_cost=self.image_tool_cost(quality))
+            return self.decode_result(image_base64), revised_prompt, "batch_responses_api"
+        if result.status == "failed":
+            manager.mark_delivered(custom_id)
+            raise Exception(f"Batch request failed: {result.error}")
+        raise BatchPending(f"{result.status}" + (f" in {result.batch_id}" if result.batch_id else ""))
+    
+    @traced("CL_ImageFidelity", debug_output=2)
     def generate_fashion_image(self, api_key, prompt, primary_image, input_fidelity, quality, size,
                            output_format, background, fashion_preset, api_method,
-                           reference_image=None, mask_image=None):
+                           reference_image=None, mask_image=None, max_concurrency=4, cache_mode="off",
+                           upload_codec="png", max_upload_side=0, mixed_size_policy="resize",
+                           rpm_limit=0, tpm_limit=0, execution_mode="sync", batch_flush_size=50,
+                           batch_flush_minutes=30, unique_id=None):
         debug_info = []
         
         # Initialize OpenAI client
@@ -332,41 +441,143 @@ class CL_ImageFidelity:
             debug_info.append(f"Fashion preset: {fashion_preset}")
             debug_info.append(f"Final prompt: {final_prompt[:100]}...")
             
-            # Decide which API to use
+            # Decide which API to use (the Batch API only accepts JSON bodies: Responses API)
             use_responses_api = (api_method == "responses_api" or 
-                               reference_image is not None)
+                               reference_image is not None or execution_mode == "batch")
+            debug_info.append("Using Responses API" if use_responses_api else "Using Images API")
+            if execution_mode == "batch":
+                if mask_image is not None:
+                    debug_info.append("Batch mode: mask_image is ignored (Responses API)")
+                batch_manager = get_batch_manager()
+                batch_manager.poll(client, api_key)
+                batch_results = []
             
-            if use_responses_api:
-                debug_info.append("Using Responses API")
-                response, api_used = self.edit_with_responses_api(
-                    client, primary_image, reference_image, final_prompt,
-                    input_fidelity, quality, size, output_format, background
-                )
-                image_base64, revised_prompt = self.process_responses_api_response(response)
-            else:
-                debug_info.append("Using Images API")
-                response, api_used = self.edit_with_images_api(
-                    client, primary_image, mask_image, final_prompt,
-                    input_fidelity, quality, size, output_format, background
-                )
-                image_base64, revised_prompt = self.process_images_api_response(response)
+            # Fan out every frame of the batch as an independent request
+            batch_size = frame_count(primary_image)
+            debug_info.append(f"Batch size: {batch_size} | Max concurrency: {max_concurrency}")
+            debug_info.append(f"Max upload side: {resolve_max_side('openai_image', max_upload_side)[0] or 'original'}")
             
-            debug_info.append(f"API used: {api_used}")
-            debug_info.append(f"Input fidelity: {input_fidelity}")
+            # Content-addressed cache: one entry per frame
+            cache = get_response_cache() if cache_mode != "off" else None
+            cache_model = "gpt-4.1" if use_responses_api else "gpt-image-1"
+            cache_params = self.request_params(input_fidelity, quality, size, output_format, background,
+                                               use_responses_api, max_upload_side, upload_codec)
+            cache_hits, coalesced = [], []
+            frame_keys = [None] * batch_size
+            upload_stats = UploadStats()
+            # Client-side pacing shared by every branch using the same key and model
+            limiter = get_limiter("openai", cache_model, api_key, rpm_limit, tpm_limit)
+            rate_stats = RateLimitStats()
+            output_tokens = IMAGE_OUTPUT_TOKENS.get(f"openai_image_{quality}", IMAGE_OUTPUT_TOKENS["openai_image_high"])
             
-            # Decode and convert image
-            image_bytes = base64.b64decode(image_base64)
-            result_image = Image.open(io.BytesIO(image_bytes))
+            def run_frame(index):
+                try:
+                    frames = [select_frame(img, index) for img in (primary_image, reference_image, mask_image)]
+                    # The exact content key (every pixel hashed) is only needed by the cache and
+                    # as the request's custom_id inside a batch
+                    cache_key = None
+                    if cache is not None or execution_mode == "batch":
+                        cache_key = frame_keys[index] = ResponseCache.make_key(
+                            "CL_ImageFidelity", cache_model, final_prompt, cache_params, frames
+                        )
+                    if cache is not None:
+                        cached = cache.get(cache_key)
+                        if cached is not None and cached.images is not None:
+                            cache_hits.append(index)
+                            return cached.images, cached.texts.get("revised_prompt", ""), cached.texts.get("api_used", "cache")
+                    
+                    # Downscale on-tensor to the provider's effective resolution before encoding
+                    frames = [downscale_for_upload(f, "openai_image", max_upload_side) for f in frames]
+                    if execution_mode == "batch":
+                        result = self.run_batch_frame(client, api_key, cache_key, lambda: self.build_responses_request(
+                            frames[0], frames[1], final_prompt, input_fidelity, quality, size,
+                            output_format, background, upload_codec, upload_stats
+                        ), batch_results, quality)
+                        if cache is not None and cache_mode == "read_write":
+                            cache.put(cache_key, result[0], {"revised_prompt": result[1], "api_used": result[2]})
+                        return result
+                    
+                    def send():
+                        input_images = sum(f is not None for f in frames)
+                        pacer = Pacer(limiter, estimate_tokens(final_prompt, input_images,
+                                                               TOKENS_PER_IMAGE["openai_image"], output_tokens),
+                                      rate_stats)
+                        return self.generate_single(
+                            client, frames[0], frames[1], frames[2],
+                            final_prompt, input_fidelity, quality, size, output_format, background,
+                            use_responses_api, upload_codec, upload_stats, pacer
+                        )
+                    
+                    # Identical requests in flight (other branches or repeated frames) share one billed
+                    # call; the cheap fingerprint of the downscaled frames is enough to tell them apart
+                    flight_key = request_fingerprint("CL_ImageFidelity", cache_model, final_prompt, cache_params, frames)
+                    result, shared = coalesce((flight_key, api_key), send)
+                    if shared:
+                        coalesced.append(index)
+                    if cache is not None and cache_mode == "read_write":
+                        cache.put(cache_key, result[0], {"revised_prompt": result[1], "api_used": result[2]})
+                    return result
+                except Exception as e:
+                    return e
             
-            # Convert back to ComfyUI tensor
-            result_tensor = self.pil_to_tensor(result_image)
+            results = map_bounded(run_frame, range(batch_size), max_concurrency)
+            if cache is not None:
+                debug_info.append(f"Cache ({cache_mode}): {len(cache_hits)}/{batch_size} hits")
+            if coalesced:
+                debug_info.append(f"Coalesced: {len(coalesced)}/{batch_size} frames shared an in-flight request")
+            if execution_mode == "batch":
+                # This run's keys, looked up by UNIQUE_ID from IS_CHANGED
+                batch_manager.track("CL_ImageFidelity", unique_id, [key for key in frame_keys if key])
+                batch_manager.flush(client, api_key, "/v1/responses", batch_flush_size, batch_flush_minutes * 60)
+                # Report the state after flushing (spooled requests may have just been submitted)
+                batch_results = [batch_manager.lookup(r.custom_id) or r for r in batch_results]
+                debug_info.append(batch_manager.summary(batch_results))
+                pending = [r for r in results if isinstance(r, BatchPending)]
+                if pending:
+                    # Nothing goes downstream until every frame is back: a partial batch would
+                    # pass input frames off as results. Finished frames stay in results/ until then
+                    raise BatchPending(f"Batch pending: {len(pending)}/{batch_size} frames, re-run the workflow "
+                                       f"once the batch completes | {' | '.join(debug_info)}")
+            if limiter is not None:
+                debug_info.append(rate_stats.summary())
             
-            debug_info.append("Success: Image generated successfully")
+            errors = [(i, r) for i, r in enumerate(results) if isinstance(r, Exception)]
+            if len(errors) == batch_size:
+                raise errors[0][1]
+            
+            # Failed frames keep the original input frame so the batch stays aligned
+            frames, revised_prompts, api_used = [], [], None
+            for index, result in enumerate(results):
+                if isinstance(result, Exception):
+                    debug_info.append(f"Frame {index} failed: {str(result)}")
+                    frames.append(select_frame(primary_image, index))
+                    revised_prompts.append(f"Error: {str(result)}")
+                else:
+                    frames.append(result[0])
+                    revised_prompts.append(result[1])
+                    api_used = result[2]
+            
+            # Decode every result into one preallocated output batch
+            result_tensor = stack_images(frames, mixed_size_policy)
+            revised_prompt = revised_prompts[0] if batch_size == 1 else "\n".join(revised_prompts)
+            
+            debug_info.append(f"API used: {api_used}")
+            debug_info.append(f"Input fidelity: {input_fidelity}")
+            debug_info.append(upload_stats.summary())
+            # Calls recorded in the cost ledger (cache hits are not billed)
+            debug_info.append(f"Cost: {format_cost(execution_cost())}")
+            
+            if errors:
+                debug_info.append(f"Partial success: {batch_size - len(errors)}/{batch_size} frames generated")
+            else:
+                debug_info.append("Success: Image generated successfully")
             debug_str = " | ".join(debug_info)
             
             # Return successful result
             return (result_tensor, revised_prompt, debug_str)
                 
+        except BatchPending:
+            raise
         except Exception as e:
             error_msg = f"Error in fashion image generation: {str(e)}"
             debug_info.append(error_msg)
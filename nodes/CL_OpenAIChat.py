@@ -12,31 +12,34 @@ Usage: Search for "CL_OpenAIChat" or "chelogarcho" in ComfyUI
 
 import os
 import json
-import base64
-import io
-import requests
+import threading
+import time
 from typing import Dict, Any, Optional, List
-import torch
-import numpy as np
 from PIL import Image
 
-# Lazy-imports para que el nodo sea visible aunque falten dependencias
-try:
-    import openai  # type: ignore
-    from openai import OpenAI  # type: ignore
-    _HAS_OPENAI = True
-except Exception:
-    openai = None  # type: ignore
-    OpenAI = None  # type: ignore
-    _HAS_OPENAI = False
+from .common import imaging
+from .common.batch import EXECUTION_MODES, BatchPending, as_response, get_batch_manager
+from .common.clients import get_client
+from .common.concurrency import map_bounded
+from .common.encoding import UPLOAD_CODECS, EncodedImage, UploadStats, encode_image
+from .common.fingerprint import fingerprint_inputs, request_fingerprint, tensor_fingerprint
+from .common.imaging import downscale_for_upload
+from .common.language import detect_language
+from .common.ledger import format_cost, record_call
+from .common.rate_limit import CHARS_PER_TOKEN, TOKENS_PER_IMAGE, Pacer, RateLimitStats, estimate_tokens, get_limiter
+from .common.response_cache import CACHE_MODES, ResponseCache, get_response_cache
+from .common.retry import call_with_retry
+from .common.sdk import require
+from .common.singleflight import coalesce
+from .common.telemetry import span, traced
 
-try:
-    from langdetect import detect, LangDetectException  # type: ignore
-    _HAS_LANGDETECT = True
-except Exception:
-    detect = None  # type: ignore
-    LangDetectException = Exception  # type: ignore
-    _HAS_LANGDETECT = False
+# Tope de tokens en streaming: una red de seguridad holgada (el español, el código y los
+# números rinden menos de 4 caracteres por token). El corte real se hace en el cliente
+STREAM_CHARS_PER_TOKEN = 2
+STREAM_TOKEN_MARGIN = 32
+
+# Varios prompts en una ejecución: uno por línea o una lista JSON de strings
+PROMPT_BATCH_MODES = ["off", "per_prompt_line", "json_list"]
 
 
 class CL_OpenAIChat:
@@ -57,9 +60,15 @@ class CL_OpenAIChat:
             raise ValueError("OpenAI API Key is required. Please enter your API key in the node.")
         
         try:
-            if not _HAS_OPENAI:
-                raise ImportError("openai no está instalado. Instala con: pip install openai>=1.0.0")
-            self.client = OpenAI(api_key=api_key.strip())  # type: ignore
+            # El SDK se importa en la primera ejecución, no al registrar el nodo
+            OpenAI = require("openai", "openai>=1.0.0").OpenAI
+            # Reutiliza el cliente del proceso para conservar conexiones TLS/keep-alive.
+            # Los reintentos los gestiona common.retry (el SDK no reintenta por su cuenta)
+            key = api_key.strip()
+            self.client = get_client(
+                "openai", key, lambda: OpenAI(api_key=key, max_retries=0),
+                base_url=os.environ.get("OPENAI_BASE_URL")
+            )
             return True
         except Exception as e:
             raise ValueError(f"Error inicializando cliente OpenAI: {e}")
@@ -82,128 +91,422 @@ class CL_OpenAIChat:
                 "image_1": ("IMAGE",),
                 "image_2": ("IMAGE",),
                 "image_3": ("IMAGE",),
+                "cache_mode": (CACHE_MODES, {"default": "off"}),
+                "upload_codec": (UPLOAD_CODECS, {"default": "png"}),
+                "detail": (["auto", "low", "high"], {"default": "auto"}),
+                "max_upload_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "rpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000}),
+                "tpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000000}),
+                "execution_mode": (EXECUTION_MODES, {"default": "sync"}),
+                "batch_flush_size": ("INT", {"default": 50, "min": 1, "max": 50000}),
+                "batch_flush_minutes": ("INT", {"default": 30, "min": 0, "max": 1440}),
+                "streaming": ("BOOLEAN", {"default": False}),
+                "check_response_language": ("BOOLEAN", {"default": True}),
+                "batch_mode": (PROMPT_BATCH_MODES, {"default": "off"}),
+                "max_in_flight": ("INT", {"default": 4, "min": 1, "max": 32}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
     
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response_text",)
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """Fuerza la reejecución mientras este nodo tenga solicitudes en un lote"""
+        # Sólo llegan los widgets y UNIQUE_ID: las imágenes enlazadas nunca pasan por aquí, así
+        # que se consultan las claves que registró el nodo (la deduplicación por imagen la hace
+        # la caché de respuestas dentro del nodo)
+        if (kwargs.get("execution_mode") == "batch"
+                and get_batch_manager().has_pending("CL_OpenAIChat", kwargs.get("unique_id"))):
+            return float("nan")
+        return fingerprint_inputs(**kwargs)
+    
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("response_text", "debug_info")
+    # Una respuesta por prompt (lista de un elemento con batch_mode = off)
+    OUTPUT_IS_LIST = (True, False)
     FUNCTION = "process_with_vision"
     CATEGORY = "chelogarcho/AI Chat"
     
-    def image_to_base64(self, image_tensor) -> str:
+    def tensor_to_pil(self, image_tensor) -> Image.Image:
+        """
+        Convierte tensor de imagen de ComfyUI a PIL Image RGB
         """
-        Convierte tensor de imagen de ComfyUI a base64 para OpenAI API
+        image = imaging.tensor_to_pil(image_tensor)
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    
+    def encode_image_tensor(self, image_tensor, upload_codec: str = "png",
+                            upload_stats: Optional[UploadStats] = None) -> Optional[EncodedImage]:
+        """
+        Codifica un tensor de imagen de ComfyUI para OpenAI API con el códec elegido
         """
         try:
-            # Convertir tensor a numpy array
-            if isinstance(image_tensor, torch.Tensor):
-                image_array = image_tensor.cpu().numpy()
-            else:
-                image_array = image_tensor
-            
-            # Normalizar valores de 0-1 a 0-255
-            if image_array.max() <= 1.0:
-                image_array = (image_array * 255).astype(np.uint8)
-            
-            # Asegurar formato correcto (H, W, C)
-            if len(image_array.shape) == 4:
-                image_array = image_array[0]  # Remove batch dimension
-            
-            if len(image_array.shape) == 3 and image_array.shape[0] in [1, 3, 4]:
-                image_array = np.transpose(image_array, (1, 2, 0))
-            
-            # Convertir a PIL Image
-            if image_array.shape[2] == 1:  # Grayscale
-                image = Image.fromarray(image_array[:, :, 0], mode='L').convert('RGB')
-            elif image_array.shape[2] == 3:  # RGB
-                image = Image.fromarray(image_array, mode='RGB')
-            elif image_array.shape[2] == 4:  # RGBA
-                image = Image.fromarray(image_array, mode='RGBA').convert('RGB')
-            else:
-                raise ValueError(f"Formato de imagen no soportado: {image_array.shape}")
-            
-            # Convertir a base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            
-            return img_str
-            
+            encoded = encode_image(self.tensor_to_pil(image_tensor), upload_codec)
+            if upload_stats is not None:
+                upload_stats.record(encoded)
+            return encoded
         except Exception as e:
             print(f"Error convirtiendo imagen a base64: {str(e)}")
-            return ""
+            return None
+    
+    def image_to_base64(self, image_tensor) -> str:
+        """
+        Convierte tensor de imagen de ComfyUI a base64 (PNG) para OpenAI API
+        """
+        encoded = self.encode_image_tensor(image_tensor)
+        return encoded.base64() if encoded is not None else ""
     
     def detect_language(self, text: str) -> str:
         """
-        Detecta el idioma del texto de entrada
+        Detecta el idioma del texto de entrada (memoizado; langdetect se carga en el primer uso)
+        """
+        return detect_language(text)
+    
+    def image_content(self, images: List[Any], upload_codec: str, detail: str, max_upload_side: int,
+                      upload_stats: UploadStats) -> List[Dict[str, Any]]:
+        """
+        Partes image_url del mensaje: cada imagen se reduce a la resolución efectiva del
+        modelo de visión y se codifica con el códec elegido
+        """
+        # Los modelos de visión reducen internamente: no tiene sentido subir más píxeles
+        vision_provider = "openai_vision_low" if detail == "low" else "openai_vision_high"
+        content = []
+        for i, image in enumerate(img for img in images if img is not None):
+            try:
+                image = downscale_for_upload(image, vision_provider, max_upload_side)
+                encoded = self.encode_image_tensor(image, upload_codec, upload_stats)
+                if encoded is not None:
+                    image_url = {"url": encoded.data_url()}
+                    if detail != "auto":
+                        image_url["detail"] = detail
+                    content.append({
+                        "type": "image_url",
+                        "image_url": image_url
+                    })
+                    print(f"Imagen {i+1} agregada correctamente")
+            except Exception as e:
+                print(f"Error procesando imagen {i+1}: {str(e)}")
+        return content
+    
+    def stream_completion(self, request: Dict[str, Any], max_characters: int, debug_info: List[str],
+                          pacer: Optional[Pacer] = None):
+        """
+        Consume la respuesta en streaming y corta en cuanto se supera max_characters
+        Devuelve un objeto con la forma de la respuesta del SDK (usage es None si se cortó)
         """
+        start = time.perf_counter()
+        stream = call_with_retry(
+            lambda: self.client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request
+            ),
+            idempotent=True, label="OpenAI chat", log=debug_info.append, before_attempt=pacer
+        )
+        parts = []
+        length = 0
+        first_token = None
+        usage = None
+        stopped = False
         try:
-            if not _HAS_LANGDETECT:
-                return "en"
-            if not text or len(text.strip()) < 3:
-                return "en"  # Default a inglés si texto muy corto
-            
-            detected = detect(text)
-            return detected
-        except LangDetectException:
-            return "en"  # Default a inglés si no se puede detectar
-        except Exception:
-            return "en"
+            with span("request"):
+                for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(delta)
+                    length += len(delta)
+                    # Con un carácter de más ya se sabe dónde cae el corte por palabra
+                    if length > max_characters:
+                        stopped = True
+                        break
+        finally:
+            # Cerrar la conexión detiene la generación (y la facturación) en el servidor
+            stream.close()
+        
+        # La espera del limitador no cuenta como latencia del proveedor
+        start += pacer.wait_seconds if pacer is not None else 0.0
+        end = time.perf_counter()
+        ttft = f"{(first_token - start) * 1000:.0f} ms" if first_token is not None else "-"
+        debug_info.append(f"Stream: TTFT {ttft}, total {(end - start) * 1000:.0f} ms"
+                          + (", cortado en max_characters" if stopped else ""))
+        return as_response({
+            "choices": [{"message": {"content": "".join(parts)}}],
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+            } if usage is not None else None,
+        })
+    
+    def run_batch(self, api_key: str, custom_id: str, build_request, flush_size: int,
+                  flush_minutes: int, debug_info: List[str]):
+        """
+        Encola la solicitud en la Batch API y devuelve (respuesta, primera entrega) si el
+        lote ya terminó (None mientras siga pendiente)
+        """
+        manager = get_batch_manager()
+        endpoint = "/v1/chat/completions"
+        if manager.lookup(custom_id) is None:
+            manager.enqueue("CL_OpenAIChat", api_key, endpoint, custom_id, build_request())
+        manager.flush(self.client, api_key, endpoint, flush_size, flush_minutes * 60)
+        
+        result = manager.lookup(custom_id)
+        debug_info.append(manager.summary([result]))
+        if result.status == "completed":
+            # Las reejecuciones vuelven a leer el resultado de results/ sin volver a facturarlo
+            first_delivery = manager.mark_delivered(custom_id)
+            return as_response(result.body), first_delivery
+        if result.status == "failed":
+            manager.mark_delivered(custom_id)
+            raise Exception(f"Batch request failed: {result.error}")
+        return None
     
+    @staticmethod
+    def request_params(system_prompt: str, max_characters: int, detail: str, max_upload_side: int,
+                       upload_codec: str, streaming: bool = False) -> Dict[str, Any]:
+        """Opciones que cambian la respuesta: forman parte de la clave de la solicitud"""
+        # El códec de subida cambia la imagen que recibe el modelo (jpeg/webp con pérdida)
+        params = {"system_prompt": system_prompt, "max_characters": max_characters,
+                  "detail": detail, "max_upload_side": max_upload_side, "upload_codec": upload_codec}
+        if streaming:
+            params["streaming"] = True
+        return params
+    
+    @staticmethod
+    def split_prompts(user_prompt: str, batch_mode: str) -> List[str]:
+        """Divide user_prompt según batch_mode (ValueError si la lista JSON no es válida)"""
+        if batch_mode == "per_prompt_line":
+            return [line.strip() for line in user_prompt.splitlines() if line.strip()] or [user_prompt]
+        if batch_mode == "json_list":
+            try:
+                prompts = json.loads(user_prompt)
+            except ValueError as e:
+                raise ValueError(f"user_prompt no es JSON válido: {e}") from e
+            if not isinstance(prompts, list) or not prompts or not all(isinstance(p, str) for p in prompts):
+                raise ValueError("user_prompt debe ser una lista JSON de strings no vacía")
+            return prompts
+        return [user_prompt]
+    
+    @traced("CL_OpenAIChat", debug_output=1)
     def process_with_vision(self, api_key: str, user_prompt: str, model: str, max_characters: int, 
                            system_prompt: str, image_1=None, image_2=None, 
-                           image_3=None) -> tuple:
+                           image_3=None, cache_mode: str = "off", upload_codec: str = "png",
+                           detail: str = "auto", max_upload_side: int = 0,
+                           rpm_limit: int = 0, tpm_limit: int = 0, execution_mode: str = "sync",
+                           batch_flush_size: int = 50, batch_flush_minutes: int = 30,
+                           streaming: bool = False, check_response_language: bool = True,
+                           batch_mode: str = "off", max_in_flight: int = 4,
+                           unique_id: Optional[str] = None) -> tuple:
+        """
+        Procesa uno o varios prompts (batch_mode) con las mismas imágenes y opciones.
+        Los prompts se envían en paralelo (como máximo max_in_flight) y las respuestas
+        se devuelven como lista en el orden de entrada.
+        """
+        try:
+            prompts = self.split_prompts(user_prompt, batch_mode)
+        except ValueError as e:
+            return ([f"Error: {e}"], f"Batch: {batch_mode}")
+        
+        # Las imágenes son las mismas en todos los prompts: se hashean una sola vez y se
+        # codifican una sola vez, cuando el primer prompt que las necesita arma su solicitud.
+        # El hash exacto de todos los píxeles sólo lo necesitan la caché y los lotes; para
+        # agrupar llamadas en vuelo basta la huella barata
+        images = [image_1, image_2, image_3]
+        needs_digest = cache_mode != "off" or execution_mode == "batch"
+        image_digests = ResponseCache.image_digests(images) if needs_digest else None
+        image_fingerprints = [tensor_fingerprint(image) for image in images]
+        images_in = sum(img is not None for img in images)
+        upload_stats = UploadStats()
+        parts_lock = threading.Lock()
+        prepared: List[List[Dict[str, Any]]] = []
+        
+        def image_parts() -> List[Dict[str, Any]]:
+            with parts_lock:
+                if not prepared:
+                    prepared.append(self.image_content(images, upload_codec, detail, max_upload_side,
+                                                       upload_stats))
+                return prepared[0]
+        
+        if execution_mode == "batch":
+            # Una sola consulta de los trabajos en curso por ejecución, no una por prompt
+            if not self.initialize_client(api_key):
+                return (["Error: No se pudo inicializar el cliente OpenAI con la API key."], "")
+            try:
+                get_batch_manager().poll(self.client, api_key)
+            except Exception as e:
+                return ([f"Error consultando lotes: {str(e)}"], f"Batch: {execution_mode}")
+        
+        def run_prompt(prompt):
+            try:
+                return self.process_prompt(
+                    api_key, prompt, model, max_characters, system_prompt, image_parts, image_digests,
+                    image_fingerprints, images_in, upload_stats, cache_mode, upload_codec, detail, max_upload_side,
+                    rpm_limit, tpm_limit, execution_mode, batch_flush_size, batch_flush_minutes, streaming,
+                    check_response_language
+                ), False
+            except BatchPending as e:
+                return (None, str(e)), True
+        
+        # Cada prompt es una solicitud independiente: la latencia total se acerca a la del más lento
+        results = map_bounded(run_prompt, prompts, max_in_flight)
+        if execution_mode == "batch":
+            # Claves de esta ejecución: IS_CHANGED las consulta por UNIQUE_ID
+            params = self.request_params(system_prompt, max_characters, detail, max_upload_side, upload_codec)
+            get_batch_manager().track("CL_OpenAIChat", unique_id, [
+                ResponseCache.make_key("CL_OpenAIChat", model, prompt, params, None, image_digests)
+                for prompt in prompts
+            ])
+        pending = sum(is_pending for _, is_pending in results)
+        if batch_mode == "off":
+            debug_info = results[0][0][1]
+        else:
+            debug_lines = [f"Batch: {batch_mode} | Prompts: {len(prompts)} | Máx. en vuelo: {max_in_flight}"]
+            debug_lines += [f"[{i}] {debug}" for i, ((_, debug), _) in enumerate(results)]
+            debug_info = "\n".join(debug_lines)
+        if pending:
+            # Se detiene la ejecución: una lista vacía no bloquea los nodos siguientes (ComfyUI
+            # los llamaría sin entradas) y un texto provisional llegaría como si fuera la respuesta
+            raise BatchPending(f"Batch pending: {pending}/{len(prompts)} prompts, vuelve a ejecutar el workflow "
+                               f"cuando el lote termine\n{debug_info}")
+        return ([text for (text, _), _ in results], debug_info)
+    
+    def process_prompt(self, api_key: str, user_prompt: str, model: str, max_characters: int,
+                       system_prompt: str, image_parts, image_digests: Optional[List[str]],
+                       image_fingerprints: List[str], images_in: int, upload_stats: UploadStats,
+                       cache_mode: str = "off", upload_codec: str = "png", detail: str = "auto",
+                       max_upload_side: int = 0, rpm_limit: int = 0, tpm_limit: int = 0, execution_mode: str = "sync",
+                       batch_flush_size: int = 50, batch_flush_minutes: int = 30,
+                       streaming: bool = False, check_response_language: bool = True) -> tuple:
         """
         Procesa texto + imágenes con OpenAI Chat Completions API
-        Devuelve respuesta mejorada siempre en inglés
+        `image_parts` devuelve las partes image_url ya codificadas (compartidas entre prompts)
+        Devuelve (respuesta mejorada siempre en inglés, debug)
         """
+        debug_info = []
         try:
             # Inicializar cliente OpenAI con la API key del nodo
             if not self.initialize_client(api_key):
-                return ("Error: No se pudo inicializar el cliente OpenAI con la API key.",)
+                return ("Error: No se pudo inicializar el cliente OpenAI con la API key.", "")
             
-            # Detectar idioma del prompt del usuario
-            detected_lang = self.detect_language(user_prompt)
-            print(f"Idioma detectado: {detected_lang}")
+            # Consultar la caché por contenido antes de llamar a la API
+            cache = get_response_cache() if cache_mode != "off" else None
+            streaming = streaming and execution_mode != "batch"
+            # La clave exacta identifica la solicitud en la caché y dentro de un lote (custom_id);
+            # sólo se calcula si hay digests (caché activa o modo batch)
+            params = self.request_params(system_prompt, max_characters, detail, max_upload_side, upload_codec,
+                                         streaming)
+            cache_key = None
+            if image_digests is not None:
+                cache_key = ResponseCache.make_key("CL_OpenAIChat", model, user_prompt, params, None, image_digests)
+            if cache is not None:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    print("Respuesta recuperada de la caché")
+                    debug_info.append(f"Caché ({cache_mode}): acierto")
+                    return (cached.texts.get("response_text", ""), " | ".join(debug_info))
+                debug_info.append(f"Caché ({cache_mode}): fallo")
             
-            # Preparar contenido con imágenes
-            content = []
+            vision_provider = "openai_vision_low" if detail == "low" else "openai_vision_high"
             
-            # Agregar texto del sistema
-            content.append({
-                "type": "text",
-                "text": f"{system_prompt}\n\nUser request (detected language: {detected_lang}): {user_prompt}\n\nPlease respond in English with a maximum of {max_characters} characters."
-            })
+            if streaming:
+                # El cliente cierra el stream al pasar max_characters (eso corta la facturación):
+                # el tope del servidor no debe cortar antes, a mitad de palabra y sin "..."
+                max_tokens = max_characters // STREAM_CHARS_PER_TOKEN + STREAM_TOKEN_MARGIN
+            else:
+                max_tokens = max_characters * 2  # Aproximadamente 2 tokens por carácter
             
-            # Agregar imágenes si están disponibles
-            images = [img for img in [image_1, image_2, image_3] if img is not None]
+            def build_request():
+                """Prepara contenido e imágenes (en modo batch sólo si la solicitud se encola)"""
+                # Detectar idioma del prompt del usuario
+                detected_lang = self.detect_language(user_prompt)
+                print(f"Idioma detectado: {detected_lang}")
             
-            for i, image in enumerate(images):
-                try:
-                    base64_image = self.image_to_base64(image)
-                    if base64_image:
-                        content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            }
-                        })
-                        print(f"Imagen {i+1} agregada correctamente")
-                except Exception as e:
-                    print(f"Error procesando imagen {i+1}: {str(e)}")
+                # Preparar contenido con imágenes
+                content = []
             
-            # Realizar llamada a OpenAI Chat Completions API
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ],
-                max_tokens=max_characters * 2,  # Aproximadamente 2 tokens por carácter
-                temperature=0.7
-            )
+                # Agregar texto del sistema
+                content.append({
+                    "type": "text",
+                    "text": f"{system_prompt}\n\nUser request (detected language: {detected_lang}): {user_prompt}\n\nPlease respond in English with a maximum of {max_characters} characters."
+                })
+            
+                # Agregar imágenes si están disponibles
+                content.extend(image_parts())
+                debug_info.append(upload_stats.summary())
+            
+                return {
+                    "model": model,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": content
+                        }
+                    ],
+                    "max_tokens": max_tokens,
+                    "temperature": 0.7
+                }
+            
+            if execution_mode == "batch":
+                delivery = self.run_batch(api_key, cache_key, build_request, batch_flush_size,
+                                          batch_flush_minutes, debug_info)
+                if delivery is None:
+                    raise BatchPending(" | ".join(debug_info))
+                response, first_delivery = delivery
+                cost = 0.0
+                if first_delivery:
+                    # En modo batch no hay latencia representativa (horas)
+                    cost = record_call("openai", model, usage=getattr(response, "usage", None),
+                                       images_in=images_in, mode="batch")
+            else:
+                def send():
+                    """Prepara, espera el cupo y envía la solicitud; devuelve (respuesta, coste)"""
+                    request = build_request()
+                    prompt_text = request["messages"][0]["content"][0]["text"]
+                    # Espera el cupo RPM/TPM compartido por la api_key en lugar de provocar un 429,
+                    # antes de cada intento (los reintentos tras un 429 o un 5xx también esperan)
+                    limiter = get_limiter("openai", model, api_key, rpm_limit, tpm_limit)
+                    rate_stats = RateLimitStats()
+                    pacer = Pacer(limiter, estimate_tokens(prompt_text, upload_stats.images,
+                                                           TOKENS_PER_IMAGE[vision_provider], max_tokens), rate_stats)
+                    
+                    call_start = time.perf_counter()
+                    estimated_tokens = None
+                    # Realizar llamada a OpenAI Chat Completions API (sin efectos secundarios: idempotente)
+                    if streaming:
+                        response = self.stream_completion(request, max_characters, debug_info, pacer)
+                        # Un stream cortado no informa del usage: se estima para el ledger
+                        estimated_tokens = (
+                            estimate_tokens(prompt_text, upload_stats.images, TOKENS_PER_IMAGE[vision_provider]),
+                            len(response.choices[0].message.content) // CHARS_PER_TOKEN,
+                        )
+                    else:
+                        response = call_with_retry(
+                            lambda: self.client.chat.completions.create(**request),
+                            idempotent=True, label="OpenAI chat", log=debug_info.append, before_attempt=pacer
+                        )
+                    latency = time.perf_counter() - call_start - pacer.wait_seconds
+                    if limiter is not None:
+                        debug_info.append(rate_stats.summary())
+                    
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        pacer.settle(usage.total_tokens)
+                    cost = record_call("openai", model, usage=usage, images_in=images_in, latency=latency,
+                                       mode="stream" if streaming else "sync", estimated_tokens=estimated_tokens)
+                    return response, cost
+                
+                # Las ramas que piden lo mismo a la vez comparten una sola llamada (y su coste)
+                flight_key = request_fingerprint("CL_OpenAIChat", model, user_prompt, params, None,
+                                                 image_fingerprints)
+                (response, cost), shared = coalesce((flight_key, api_key), send)
+                if shared:
+                    cost = 0.0
+                    debug_info.append("Solicitud compartida con una llamada idéntica en vuelo")
             
             # Extraer respuesta
             ai_response = response.choices[0].message.content.strip()
@@ -213,7 +516,7 @@ class CL_OpenAIChat:
                 ai_response = ai_response[:max_characters].rsplit(' ', 1)[0] + "..."
             
             # Verificar que la respuesta esté en inglés (detección básica)
-            response_lang = self.detect_language(ai_response)
+            response_lang = self.detect_language(ai_response) if check_response_language else "en"
             if response_lang != "en":
                 print(f"Advertencia: Respuesta detectada en {response_lang}, forzando inglés")
                 # Si no está en inglés, agregar instrucción adicional
@@ -221,20 +524,31 @@ class CL_OpenAIChat:
                 if len(ai_response) > max_characters:
                     ai_response = ai_response[:max_characters].rsplit(' ', 1)[0] + "..."
             
-            # Información de uso
-            usage_info = f"Tokens: {response.usage.total_tokens} | Caracteres: {len(ai_response)}/{max_characters}"
+            usage = getattr(response, "usage", None)
+            
+            # Información de uso (un stream cortado no informa de los tokens)
+            tokens = usage.total_tokens if usage is not None else "n/a"
+            usage_info = f"Tokens: {tokens} | Caracteres: {len(ai_response)}/{max_characters} | Costo: {format_cost(cost)}"
             print(f"Procesamiento exitoso - {usage_info}")
+            debug_info.append(usage_info)
+            
+            if cache is not None and cache_mode == "read_write":
+                cache.put(cache_key, None, {"response_text": ai_response})
             
-            return (ai_response,)
+            return (ai_response, " | ".join(debug_info))
             
-        except openai.AuthenticationError:
-            return ("Error: Clave API inválida",)
-        except openai.RateLimitError:
-            return ("Error: Límite de tasa excedido",)
-        except openai.APIError as e:
-            return (f"Error de API: {str(e)}",)
+        except BatchPending:
+            raise
         except Exception as e:
-            return (f"Error inesperado: {str(e)}",)
+            # Por nombre de clase: openai puede no estar importado todavía
+            names = {cls.__name__ for cls in type(e).__mro__}
+            if "AuthenticationError" in names:
+                return ("Error: Clave API inválida", " | ".join(debug_info))
+            if "RateLimitError" in names:
+                return ("Error: Límite de tasa excedido", " | ".join(debug_info))
+            if "APIError" in names:
+                return (f"Error de API: {str(e)}", " | ".join(debug_info))
+            return (f"Error inesperado: {str(e)}", " | ".join(debug_info))
 
 
 # Node registration for ComfyUI
@@ -284,6 +598,7 @@ Features:
 - Support for up to 3 images per request
 - Configurable response length
 - Custom system prompts
+- Multiple prompts per execution (batch_mode), dispatched concurrently as a list output
 - Multiple OpenAI models supported (gpt-4o-mini, gpt-4o, gpt-4-turbo, gpt-4)
 
 Developer: chelogarcho
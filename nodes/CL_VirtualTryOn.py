@@ -10,18 +10,25 @@ Installation: Copy this file to ComfyUI/custom_nodes/
 Usage: Search for "CL_VirtualTryOn" or "chelogarcho" in ComfyUI
 """
 
-import requests
-import numpy as np
 import torch
 from PIL import Image
-import io
-import tempfile
 import os
 import json
 import time
-import base64
 from typing import Optional, Tuple, Dict, Any
 
+from .common import imaging
+from .common.concurrency import map_bounded
+from .common.download import download_image
+from .common.encoding import UPLOAD_CODECS, UploadStats, encode_image
+from .common.http import HTTP_TRANSPORTS, get_session, lease_session
+from .common.imaging import downscale_for_upload, frame_count, select_frame, stack_images
+from .common.ledger import execution_cost, format_cost, record_call
+from .common.rate_limit import Pacer, RateLimitStats, get_limiter
+from .common.response_cache import CACHE_MODES, get_response_cache
+from .common.retry import call_with_retry
+from .common.telemetry import span, traced
+
 
 class CL_VirtualTryOn:
     """
@@ -32,12 +39,18 @@ class CL_VirtualTryOn:
     """
     
     def __init__(self):
-        self.api_base_url = "https://apiservice.yourmirror.io"
-        self.max_retries = 3
+        # CL_YOURMIRROR_BASE_URL points the node at a local stand-in server (see benchmarks/)
+        self.api_base_url = os.environ.get("CL_YOURMIRROR_BASE_URL", "https://apiservice.yourmirror.io").rstrip("/")
+        self.queue_api_path = "/gradio_api/call/generate"  # Gradio queue endpoint for the same API
         self.timeout = 60
         self.user_agent = "ComfyUI-CL_VirtualTryOn/1.0"
         self.high_quality_timeout = None  # Optional override for high-quality calls
         self.download_timeout = 60  # Timeout for downloading result images
+        self.queue_timeout = 900  # Max total wait for a queued job
+        self.poll_interval = 1.0  # Initial reconnect delay for queued jobs (doubles up to the max)
+        self.max_poll_interval = 15.0
+        self.http_transport = "requests"  # Session transport and pool size (set per run)
+        self.pool_size = 2
         self.log_messages = []  # Store log messages for output
 
     def log_debug(self, message: str):
@@ -58,6 +71,17 @@ class CL_VirtualTryOn:
         print(log_msg)
         self.log_messages.append(log_msg)
     
+    def get_session(self, api_key: str):
+        """Return the process-wide keep-alive session for the YourMirror API"""
+        return get_session("yourmirror", api_key, base_url=self.api_base_url,
+                           transport=self.http_transport, pool_size=self.pool_size)
+    
+    def log_connection(self, response, label: str) -> None:
+        """Log whether a request reused a pooled connection"""
+        reused = getattr(response, "connection_reused", None)
+        if reused is not None:
+            self.log_debug(f"{label}: {'reused' if reused else 'new'} connection")
+    
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -74,6 +98,16 @@ class CL_VirtualTryOn:
             },
             "optional": {
                 "mask_image": ("IMAGE",),
+                "cache_mode": (CACHE_MODES, {"default": "off"}),
+                "upload_codec": (UPLOAD_CODECS, {"default": "png"}),
+                "max_upload_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "request_mode": (["sync", "queue"], {"default": "sync"}),
+                "max_concurrency": ("INT", {"default": 2, "min": 1, "max": 16}),
+                "rpm_limit": ("INT", {"default": 0, "min": 0, "max": 100000}),
+                "http_transport": (HTTP_TRANSPORTS, {"default": "requests"}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
     
@@ -84,188 +118,122 @@ class CL_VirtualTryOn:
     DESCRIPTION = "Virtual try-on using YourMirror.io API"
     
     def tensor_to_pil(self, tensor: torch.Tensor) -> Image.Image:
-        """Convert ComfyUI tensor to PIL Image"""
-        if tensor.dim() == 4:
-            tensor = tensor.squeeze(0)  # Remove batch dimension if present
-        
-        # Convert from (C, H, W) to (H, W, C) if needed
-        if tensor.shape[0] == 3 or tensor.shape[0] == 4:
-            tensor = tensor.permute(1, 2, 0)
-        
-        # Ensure values are in [0, 255] range
-        if tensor.max() <= 1.0:
-            tensor = tensor * 255.0
-        
-        # Convert to numpy and ensure uint8
-        np_image = tensor.cpu().numpy().astype(np.uint8)
-        
-        # Handle different channel configurations
-        if np_image.shape[-1] == 4:
-            # RGBA
-            return Image.fromarray(np_image, 'RGBA')
-        elif np_image.shape[-1] == 3:
-            # RGB
-            return Image.fromarray(np_image, 'RGB')
-        else:
-            # Grayscale
-            return Image.fromarray(np_image.squeeze(), 'L')
+        """Convert ComfyUI tensor to PIL Image (first frame of a batch)"""
+        return imaging.tensor_to_pil(tensor)
     
     def pil_to_tensor(self, image: Image.Image) -> torch.Tensor:
-        """Convert PIL Image to ComfyUI tensor"""
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Convert to numpy array
-        np_image = np.array(image).astype(np.float32) / 255.0
-        
-        # Convert to tensor and add batch dimension
-        tensor = torch.from_numpy(np_image)
-        tensor = tensor.unsqueeze(0)  # Add batch dimension
-        
-        return tensor
+        """Convert PIL Image to ComfyUI tensor [1, H, W, C]"""
+        return imaging.pil_to_tensor(image)
     
-    def save_temp_image(self, pil_image: Image.Image, format: str = "PNG") -> str:
-        """Save PIL image to temporary file and return file path"""
-        temp_file = tempfile.NamedTemporaryFile(
-            delete=False, 
-            suffix=f".{format.lower()}", 
-            prefix="cl_virtualtry_"
-        )
+    def prepare_file_payload_v4(self, pil_image: Optional[Image.Image], label: str = "image",
+                                upload_codec: str = "png",
+                                upload_stats: Optional[UploadStats] = None) -> Optional[Dict[str, Any]]:
+        """Build the Gradio FileData payload with an in-memory base64 data URL"""
+        if pil_image is None:
+            return None
         
-        # Convert to RGB if saving as JPEG
-        if format.upper() == "JPEG" and pil_image.mode in ("RGBA", "P"):
-            # Create white background for transparency
-            background = Image.new('RGB', pil_image.size, (255, 255, 255))
-            if pil_image.mode == 'P':
-                pil_image = pil_image.convert('RGBA')
-            background.paste(pil_image, mask=pil_image.split()[-1] if pil_image.mode == 'RGBA' else None)
-            pil_image = background
+        # Masks always stay lossless PNG
+        encoded = encode_image(pil_image, "png" if label == "mask image" else upload_codec)
+        if upload_stats is not None:
+            upload_stats.record(encoded)
         
-        pil_image.save(temp_file.name, format=format, quality=95)
-        temp_file.close()
+        start = time.perf_counter()
+        data_url = encoded.data_url()
+        base64_ms = (time.perf_counter() - start) * 1000
         
-        # Debug: Log file path and check if file exists
-        self.log_debug(f"Saved temp image: {temp_file.name}")
-        self.log_debug(f"File exists: {os.path.exists(temp_file.name)}")
-        self.log_debug(f"File size: {os.path.getsize(temp_file.name)} bytes")
+        self.log_debug(
+            f"Encoded {label}: {pil_image.size} -> {len(encoded)} bytes {encoded.format} ({encoded.codec}), "
+            f"{len(data_url)} chars data URL (encode {encoded.encode_ms:.1f} ms, base64 {base64_ms:.1f} ms)"
+        )
         
-        return temp_file.name
-
-    def cleanup_temp_files(self, *file_paths):
-        """Clean up temporary files"""
-        for file_path in file_paths:
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                    self.log_debug(f"Cleaned up temp file: {file_path}")
-                except Exception as e:
-                    self.log_error(f"Could not delete temp file {file_path}: {e}")
-    
-    def file_to_base64(self, file_path: str) -> str:
-        """Convert file to base64 string"""
-        try:
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
-                base64_data = base64.b64encode(file_data).decode('utf-8')
-                self.log_debug(f"Converted file to base64: {len(base64_data)} chars")
-                return base64_data
-        except Exception as e:
-            self.log_error(f"Failed to convert file to base64: {e}")
-            raise
-
-    def prepare_file_payload_v4(self, file_path: str) -> Dict[str, Any]:
-        """Try exact format from API documentation"""
-        if file_path is None:
-            return None
-            
         # Use base64 data URL in path field (matching API docs format)
-        base64_data = self.file_to_base64(file_path)
-        data_url = f"data:image/png;base64,{base64_data}"
         return {
             "path": data_url,
             "meta": {"_type": "gradio.FileData"}
         }
 
-    def make_api_request(self, payload: Dict[str, Any], retry_count: int = 0) -> Dict[str, Any]:
-        """Make API request with retry logic"""
+    def make_api_request(self, payload: Dict[str, Any], pacer: Optional[Pacer] = None) -> Dict[str, Any]:
+        """Make API request with the shared retry policy (`pacer` runs before every attempt)"""
+        import requests  # Deferred so registering the node does not load requests/urllib3
+        
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': self.user_agent,
+        }
+        
+        # Debug: Log the payload structure
+        self.log_debug(f"API Payload structure:")
+        self.log_debug(f"  - Base image: data URI in path")
+        self.log_debug(f"  - Product image: data URI in path")
+        self.log_debug(f"  - Workflow type: {payload['data'][2]}")
+        self.log_debug(f"  - Mask: {payload['data'][3]}")
+        self.log_debug(f"  - Quality: {payload['data'][4]}")
+        self.log_debug(f"  - API key length: {len(payload['data'][5])}")
+        
+        # Determine timeout considering quality (high quality typically needs longer)
+        request_timeout = self.timeout
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': self.user_agent,
-            }
-            
-            # Debug: Log the payload structure
-            self.log_debug(f"API Payload structure:")
-            self.log_debug(f"  - Base image: data URI in path")
-            self.log_debug(f"  - Product image: data URI in path")
-            self.log_debug(f"  - Workflow type: {payload['data'][2]}")
-            self.log_debug(f"  - Mask: {payload['data'][3]}")
-            self.log_debug(f"  - Quality: {payload['data'][4]}")
-            self.log_debug(f"  - API key length: {len(payload['data'][5])}")
-            
-            # Determine timeout considering quality (high quality typically needs longer)
+            if isinstance(payload.get('data'), list) and len(payload['data']) >= 5:
+                quality_value = payload['data'][4]
+                if isinstance(quality_value, str) and quality_value.lower() == 'high':
+                    # Use explicit high-quality timeout if provided, otherwise ensure at least 180s
+                    request_timeout = self.high_quality_timeout or max(self.timeout, 180)
+                    self.log_debug(f"Adjusted timeout for high quality: {request_timeout}s")
+        except Exception:
+            # If anything goes wrong, fall back to default timeout
             request_timeout = self.timeout
-            try:
-                if isinstance(payload.get('data'), list) and len(payload['data']) >= 5:
-                    quality_value = payload['data'][4]
-                    if isinstance(quality_value, str) and quality_value.lower() == 'high':
-                        # Use explicit high-quality timeout if provided, otherwise ensure at least 180s
-                        request_timeout = self.high_quality_timeout or max(self.timeout, 180)
-                        self.log_debug(f"Adjusted timeout for high quality: {request_timeout}s")
-            except Exception:
-                # If anything goes wrong, fall back to default timeout
-                request_timeout = self.timeout
-
+        
+        session = self.get_session(payload['data'][5])
+        
+        def send():
             self.log_info(f"Making API request to: {self.api_base_url}/generate")
-            response = requests.post(
+            response = session.post(
                 f"{self.api_base_url}/generate",
                 json=payload,
                 headers=headers,
                 timeout=request_timeout
             )
-            
             self.log_info(f"API Response Status: {response.status_code}")
-            
-            # Handle different response scenarios
-            if response.status_code == 200:
-                result = response.json()
-                if 'error' in result:
-                    raise Exception(f"API Error: {result['error']}")
-                self.log_info("API request successful!")
-                return result
-            elif response.status_code == 429:  # Rate limit
-                if retry_count < self.max_retries:
-                    wait_time = (2 ** retry_count) * 5  # Exponential backoff
-                    self.log_info(f"Rate limited. Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    return self.make_api_request(payload, retry_count + 1)
-                else:
-                    raise Exception("Rate limit exceeded. Please wait before making more requests.")
-            else:
+            self.log_connection(response, "/generate")
+            if response.status_code != 200:
                 # Debug: Log the full error response
-                self.log_error(f"API Response Status: {response.status_code}")
                 self.log_error(f"API Response Headers: {dict(response.headers)}")
                 self.log_error(f"API Response Text: {response.text}")
-                raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-                
+                # HTTPError carries the response (status, Retry-After) to the retry policy
+                raise requests.exceptions.HTTPError(
+                    f"API request failed with status {response.status_code}: {response.text}", response=response
+                )
+            result = response.json()
+            if 'error' in result:
+                raise Exception(f"API Error: {result['error']}")
+            self.log_info("API request successful!")
+            return result
+        
+        try:
+            # A generation is billed: read timeouts and 5xx are not retried, only rejected requests
+            return call_with_retry(send, idempotent=False, label="YourMirror /generate", log=self.log_info,
+                                   before_attempt=pacer)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 429:
+                raise Exception("Rate limit exceeded. Please wait before making more requests.")
+            raise Exception(str(e))
         except requests.exceptions.Timeout:
-            if retry_count < self.max_retries:
-                self.log_info(f"Request timeout. Retrying... ({retry_count + 1}/{self.max_retries})")
-                return self.make_api_request(payload, retry_count + 1)
-            else:
-                raise Exception("Request timed out after multiple retries")
+            raise Exception(f"Request timed out after {request_timeout}s")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Network error: {str(e)}")
     
-    def download_result_image(self, image_url: str) -> Image.Image:
+    def download_result_image(self, image_url: str, api_key: str = "") -> Image.Image:
         """Download the result image from the provided URL"""
         try:
             self.log_info(f"Downloading result image from: {image_url}")
-            response = requests.get(image_url, timeout=self.download_timeout)
-            response.raise_for_status()
-            image = Image.open(io.BytesIO(response.content))
+            session = self.get_session(api_key)
+            # Streamed into a reusable buffer and decoded as soon as the body completes
+            image, stats = call_with_retry(
+                lambda: download_image(session, image_url, self.download_timeout),
+                idempotent=True, label="YourMirror download", log=self.log_info
+            )
             self.log_info(f"Downloaded image: {image.size} pixels")
+            self.log_debug(stats.summary())
             return image
         except Exception as e:
             raise Exception(f"Failed to download result image: {str(e)}")
@@ -287,10 +255,135 @@ class CL_VirtualTryOn:
         if product_image is None:
             raise ValueError("Product image (garment) is required")
     
-    def generate_tryon(self, api_key, base_image, product_image, workflow_type, quality, mask_image=None):
-        """Main function to generate virtual try-on"""
-        temp_files = []
+    def submit_queued_job(self, payload: Dict[str, Any], pacer: Optional[Pacer] = None) -> str:
+        """POST the payload once to the Gradio-style queue and return its event id"""
+        import requests
         
+        session = self.get_session(payload['data'][5])
+        url = f"{self.api_base_url}{self.queue_api_path}"
+        self.log_info(f"Submitting queued job to: {url}")
+        
+        def submit():
+            response = session.post(
+                url,
+                json=payload,
+                headers={'Content-Type': 'application/json', 'User-Agent': self.user_agent},
+                timeout=self.timeout
+            )
+            self.log_connection(response, "Queue submit")
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(
+                    f"Queue submit failed with status {response.status_code}: {response.text}", response=response
+                )
+            return response
+        
+        response = call_with_retry(submit, idempotent=False, label="YourMirror queue submit", log=self.log_info,
+                                   phase="upload", before_attempt=pacer)
+        event_id = response.json().get('event_id')
+        if not event_id:
+            raise Exception(f"Queue submit returned no event_id: {response.text}")
+        self.log_debug(f"Queued job event_id: {event_id}")
+        return event_id
+    
+    @span("server_wait")
+    def await_queued_job(self, event_id: str, api_key: str) -> Dict[str, Any]:
+        """Stream the job's SSE result, reconnecting with exponential backoff until the deadline"""
+        import requests
+        
+        # Leased: the registry must not close the session during a wait of up to queue_timeout
+        with lease_session("yourmirror", api_key, base_url=self.api_base_url,
+                           transport=self.http_transport, pool_size=self.pool_size) as session:
+            return self.stream_queued_job(session, event_id, requests.exceptions.RequestException)
+    
+    def stream_queued_job(self, session, event_id: str, retryable_errors) -> Dict[str, Any]:
+        """Reconnect loop of await_queued_job on an already leased session"""
+        url = f"{self.api_base_url}{self.queue_api_path}/{event_id}"
+        deadline = time.monotonic() + self.queue_timeout
+        delay = self.poll_interval
+        
+        while time.monotonic() < deadline:
+            event = None
+            try:
+                # Read timeout only bounds the gap between SSE lines (heartbeats keep it alive)
+                with session.get(url, stream=True, timeout=(10, self.timeout)) as response:
+                    self.log_connection(response, "Queue stream")
+                    if response.status_code != 200:
+                        raise Exception(f"Queue poll failed with status {response.status_code}: {response.text}")
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        if line.startswith("event:"):
+                            event = line[len("event:"):].strip()
+                        elif line.startswith("data:"):
+                            data = line[len("data:"):].strip()
+                            if event == "complete":
+                                self.log_info(f"Queued job {event_id} completed")
+                                return {"data": json.loads(data)}
+                            if event == "error":
+                                raise Exception(f"API Error: {data}")
+            except retryable_errors as e:
+                # GET is idempotent: reconnecting never re-submits the job
+                self.log_debug(f"Queue stream interrupted ({type(e).__name__}), reconnecting in {delay:.1f}s")
+            
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, self.max_poll_interval)
+        
+        raise Exception(f"Queued job {event_id} did not complete within {self.queue_timeout}s")
+    
+    def extract_result_url(self, result: Dict[str, Any]) -> str:
+        """Return the result image URL from a sync or queued response"""
+        if 'data' not in result or not result['data']:
+            raise Exception("No image data returned from API")
+        
+        item = result['data'][0]
+        if isinstance(item, dict):
+            # Gradio FileData
+            item = item.get('url') or item.get('path')
+        if not item:
+            raise Exception(f"Unexpected result format: {result['data'][0]}")
+        if not item.startswith(("http://", "https://")):
+            # Queued results may reference a server-relative file path
+            item = f"{self.api_base_url}/{item.lstrip('/')}"
+        return item
+    
+    def build_payload(self, api_key, base_frame, product_frame, mask_frame, workflow_type, quality,
+                      upload_codec, upload_stats, max_upload_side):
+        """Convert one frame set into the API payload"""
+        # Optional on-tensor downscale before encoding (YourMirror has no documented limit)
+        base_upload = downscale_for_upload(base_frame, "yourmirror", max_upload_side)
+        product_upload = downscale_for_upload(product_frame, "yourmirror", max_upload_side)
+        mask_upload = downscale_for_upload(mask_frame, "yourmirror", max_upload_side)
+        
+        # Convert tensors to PIL images
+        base_pil = self.tensor_to_pil(base_upload)
+        product_pil = self.tensor_to_pil(product_upload)
+        mask_pil = self.tensor_to_pil(mask_upload) if mask_upload is not None else None
+        
+        self.log_debug(f"Image conversion completed")
+        self.log_debug(f"  - Base image size: {base_pil.size}")
+        self.log_debug(f"  - Product image size: {product_pil.size}")
+        if mask_pil:
+            self.log_debug(f"  - Mask image size: {mask_pil.size}")
+        
+        # Prepare images for API using in-memory base64 data URLs
+        self.log_info("Preparing images for API...")
+        return {
+            "data": [
+                self.prepare_file_payload_v4(base_pil, "base image", upload_codec, upload_stats),
+                self.prepare_file_payload_v4(product_pil, "product image", upload_codec, upload_stats),
+                workflow_type,
+                self.prepare_file_payload_v4(mask_pil, "mask image", upload_codec, upload_stats),
+                quality,
+                api_key.strip()
+            ]
+        }
+    
+    @traced("CL_VirtualTryOn", debug_output=1, separator="\n")
+    def generate_tryon(self, api_key, base_image, product_image, workflow_type, quality, mask_image=None,
+                       cache_mode="off", upload_codec="png", max_upload_side=0,
+                       request_mode="sync", max_concurrency=2, rpm_limit=0, http_transport="requests",
+                       unique_id=None):
+        """Main function to generate virtual try-on"""
         # Clear previous log messages
         self.log_messages = []
         
@@ -298,57 +391,86 @@ class CL_VirtualTryOn:
             # Validate inputs
             self.validate_inputs(base_image, product_image, workflow_type, quality, api_key, mask_image)
             
+            # One try-on per frame; single-frame inputs are broadcast
+            batch_size = max(frame_count(base_image), frame_count(product_image))
+            
             self.log_info(f"Starting YourMirror.io virtual try-on")
             self.log_debug(f"  - Workflow: {workflow_type}")
             self.log_debug(f"  - Quality: {quality}")
             self.log_debug(f"  - Has mask: {mask_image is not None}")
+            self.log_debug(f"  - Request mode: {request_mode}")
+            self.log_debug(f"  - Batch size: {batch_size} (max in flight: {max_concurrency})")
             
-            # Convert tensors to PIL images
-            base_pil = self.tensor_to_pil(base_image)
-            product_pil = self.tensor_to_pil(product_image)
-            mask_pil = self.tensor_to_pil(mask_image) if mask_image is not None else None
-            
-            self.log_debug(f"Image conversion completed")
-            self.log_debug(f"  - Base image size: {base_pil.size}")
-            self.log_debug(f"  - Product image size: {product_pil.size}")
-            if mask_pil:
-                self.log_debug(f"  - Mask image size: {mask_pil.size}")
-            
-            # Prepare images for API using base64 format
-            self.log_info("Preparing images for API...")
-            base_temp_file = self.save_temp_image(base_pil, "PNG")
-            product_temp_file = self.save_temp_image(product_pil, "PNG")
-            mask_temp_file = self.save_temp_image(mask_pil, "PNG") if mask_pil else None
-            temp_files.extend([base_temp_file, product_temp_file])
-            if mask_temp_file:
-                temp_files.append(mask_temp_file)
-            
-            # Use base64 format for API
-            payload = {
-                "data": [
-                    self.prepare_file_payload_v4(base_temp_file),
-                    self.prepare_file_payload_v4(product_temp_file),
-                    workflow_type,
-                    self.prepare_file_payload_v4(mask_temp_file) if mask_temp_file else None,
-                    quality,
-                    api_key.strip()
-                ]
-            }
-            
-            # Make API request
-            self.log_debug("Sending request to YourMirror.io API...")
-            result = self.make_api_request(payload)
+            cache = get_response_cache() if cache_mode != "off" else None
+            upload_stats = UploadStats()
+            # One pooled keep-alive connection per request in flight
+            self.http_transport = http_transport
+            self.pool_size = max_concurrency
+            session = self.get_session(api_key.strip())
+            http_before = session.connection_stats.snapshot()
+            # Requests/min pacing shared by every branch using the same API key
+            limiter = get_limiter("yourmirror", "tryon", api_key, rpm_limit)
+            rate_stats = RateLimitStats()
             
-            # Extract result image URL
-            if 'data' not in result or not result['data']:
-                raise Exception("No image data returned from API")
+            def run_frame(index):
+                frames = [select_frame(img, index) for img in (base_image, product_image, mask_image)]
+                
+                # Check the content-addressed cache before calling the API
+                cache_key = None
+                if cache is not None:
+                    cache_key = cache.make_key(
+                        "CL_VirtualTryOn", "yourmirror", "",
+                        # Lossy upload codecs change the image the provider actually receives
+                        {"workflow_type": workflow_type, "quality": quality, "max_upload_side": max_upload_side,
+                         "upload_codec": upload_codec},
+                        frames
+                    )
+                    cached = cache.get(cache_key)
+                    if cached is not None and cached.images is not None:
+                        self.log_info(f"Cache hit ({cache_mode}) for frame {index}: skipping API request")
+                        return cached.images
+                    self.log_debug(f"Cache miss ({cache_mode}) for frame {index}")
+                
+                payload = self.build_payload(api_key, frames[0], frames[1], frames[2], workflow_type, quality,
+                                             upload_codec, upload_stats, max_upload_side)
+                
+                # Paced before every attempt, so retries after a 429 also wait for a slot
+                pacer = Pacer(limiter, stats=rate_stats)
+                
+                # Make API request
+                self.log_debug("Sending request to YourMirror.io API...")
+                start = time.perf_counter()
+                if request_mode == "queue":
+                    result = self.await_queued_job(self.submit_queued_job(payload, pacer), api_key.strip())
+                else:
+                    result = self.make_api_request(payload, pacer)
+                # Per-image price comes from CL_PRICES_FILE ("yourmirror" entry); unpriced otherwise
+                record_call("yourmirror", f"yourmirror-{workflow_type}-{quality}",
+                            images_in=sum(f is not None for f in frames), images_out=1,
+                            latency=time.perf_counter() - start - pacer.wait_seconds, mode=request_mode)
+                
+                # Extract result image URL
+                image_url = self.extract_result_url(result)
+                self.log_debug(f"Downloading result from: {image_url}")
+                
+                # Download result image
+                result_pil = self.download_result_image(image_url, api_key.strip())
+                
+                if cache_key is not None and cache_mode == "read_write":
+                    cache.put(cache_key, result_pil, {})
+                return result_pil
             
-            image_url = result['data'][0]
-            self.log_debug(f"Downloading result from: {image_url}")
+            results = map_bounded(run_frame, range(batch_size), max_concurrency)
+            self.log_info(upload_stats.summary())
+            self.log_info(f"{session.connection_stats.summary(http_before)} [{session.transport}]")
+            if limiter is not None:
+                self.log_info(rate_stats.summary())
+            cost = execution_cost()
+            if cost:
+                self.log_info(f"Cost: {format_cost(cost)}")
             
-            # Download and convert result image
-            result_pil = self.download_result_image(image_url)
-            result_tensor = self.pil_to_tensor(result_pil)
+            # Decode into one preallocated output batch
+            result_tensor = stack_images(results)
             
             self.log_info("Virtual try-on completed successfully!")
             
@@ -361,19 +483,8 @@ class CL_VirtualTryOn:
             error_msg = str(e)
             self.log_error(f"YourMirror.io Error: {error_msg}")
             
-            # Create error image with text
-            error_image = Image.new('RGB', (512, 512), color=(220, 53, 69))  # Bootstrap danger red
-            result_tensor = self.pil_to_tensor(error_image)
-            
-            # Create debug logs string
-            debug_logs = "\n".join(self.log_messages)
-            
             # Re-raise the exception so ComfyUI shows the error
             raise Exception(f"CL_VirtualTryOn Error: {error_msg}")
-            
-        finally:
-            # Clean up temporary files
-            self.cleanup_temp_files(*temp_files)
 
 
 # Node registration for ComfyUI
@@ -0,0 +1,4 @@
+"""
+Utilidades compartidas por los nodos de chelogarcho.
+Cada submódulo es independiente y no importa SDKs de proveedores al cargarse.
+"""
@@ -0,0 +1,381 @@
+"""
+Modo de ejecución por lotes con la Batch API de OpenAI (~50% más barata, ventana de 24 h).
+
+Flujo por ejecución del nodo:
+1. `poll`: consulta los trabajos enviados con esa api_key y, al completarse, descarga el
+   archivo de resultados y guarda cada cuerpo en `results/<custom_id>.json`.
+2. `lookup` / `enqueue`: cada solicitud se identifica por su clave de contenido (la misma
+   de la caché de respuestas). Si no tiene resultado ni está en curso, se añade al spool
+   JSONL de (api_key, endpoint).
+3. `flush`: el spool se sube (files.create) y se envía (batches.create) al alcanzar
+   `max_requests` solicitudes o `max_age` segundos de antigüedad.
+
+Cada ejecución registra con `track` las claves de su nodo (UNIQUE_ID): IS_CHANGED sólo ve
+las entradas constantes, no las imágenes enlazadas, así que no puede recalcularlas. Mientras
+alguna de esas claves siga sin entregar, `has_pending` hace que IS_CHANGED devuelva NaN y
+ComfyUI vuelva a ejecutar el nodo en la siguiente cola, sin hilos esperando. Las entradas
+que nadie recoge caducan con `result_ttl`.
+
+Configuración opcional:
+- CL_BATCH_DIR: carpeta de spools, estado y resultados (por defecto `.cache/batches` dentro del paquete)
+- CL_BATCH_RESULT_TTL_HOURS: vida de los resultados descargados (por defecto 168)
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+from .clients import hash_api_key
+from .retry import call_with_retry
+
+EXECUTION_MODES = ["sync", "batch"]
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_BATCH_DIR = os.path.join(_PACKAGE_ROOT, ".cache", "batches")
+
+# Límites de la Batch API (50.000 solicitudes / 200 MB por archivo) con margen
+MAX_SPOOL_REQUESTS = 50000
+MAX_SPOOL_BYTES = 150 * 1024 * 1024
+
+_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchPending(Exception):
+    """La solicitud está en el spool o en un trabajo aún no completado"""
+
+
+class BatchResult:
+    def __init__(self, custom_id: str, status: str, body: Optional[Dict[str, Any]] = None,
+                 error: Optional[str] = None, batch_id: Optional[str] = None):
+        self.custom_id = custom_id
+        self.status = status  # spooled | submitted | completed | failed
+        self.body = body
+        self.error = error
+        self.batch_id = batch_id
+
+
+def as_response(body: Any) -> Any:
+    """Convierte el cuerpo JSON de un resultado en objetos con atributos, como los del SDK"""
+    if isinstance(body, dict):
+        return SimpleNamespace(**{k: as_response(v) for k, v in body.items()})
+    if isinstance(body, list):
+        return [as_response(v) for v in body]
+    return body
+
+
+def _slug(endpoint: str) -> str:
+    return endpoint.strip("/").replace("/", "_")
+
+
+class BatchManager:
+    def __init__(self, root: str, result_ttl: float = 168 * 3600):
+        self.root = root
+        self.result_ttl = result_ttl
+        self._lock = threading.RLock()
+        self._state_path = os.path.join(root, "state.json")
+        self._state = self._load()
+
+    # --- estado persistente ----------------------------------------------------
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except Exception as e:
+            print(f"⚠️ Estado de lotes inválido, se reinicia: {e}")
+            state = {}
+        state.setdefault("entries", {})
+        state.setdefault("spools", {})
+        state.setdefault("jobs", {})
+        state.setdefault("nodes", {})
+        # Entradas de versiones anteriores sin marca de tiempo: caducan a partir de ahora
+        for entry in state["entries"].values():
+            entry.setdefault("updated", time.time())
+        return state
+
+    def _save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._state_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _spool_path(self, spool_key: str) -> str:
+        return os.path.join(self.root, f"spool-{spool_key}.jsonl")
+
+    def _result_path(self, custom_id: str) -> str:
+        return os.path.join(self.root, "results", f"{custom_id}.json")
+
+    # --- API -------------------------------------------------------------------
+
+    def lookup(self, custom_id: str) -> Optional[BatchResult]:
+        with self._lock:
+            entry = self._state["entries"].get(custom_id)
+            if entry is None:
+                # Resultado ya entregado antes: sigue disponible en results/ hasta caducar
+                entry = {"status": "completed"} if os.path.exists(self._result_path(custom_id)) else None
+            if entry is None:
+                return None
+            status = entry["status"]
+            body = None
+            if status == "completed":
+                try:
+                    with open(self._result_path(custom_id), "r", encoding="utf-8") as f:
+                        body = json.load(f)
+                except Exception as e:
+                    # Resultado perdido: se olvida la entrada para volver a encolarla
+                    print(f"⚠️ Resultado de lote ilegible {custom_id[:12]}: {e}")
+                    self._state["entries"].pop(custom_id, None)
+                    self._save()
+                    return None
+            return BatchResult(custom_id, status, body, entry.get("error"), entry.get("batch_id"))
+
+    def enqueue(self, node_type: str, api_key: str, endpoint: str, custom_id: str, body: Dict[str, Any]) -> None:
+        """Añade una solicitud al spool de (api_key, endpoint) si no se conoce ya"""
+        line = json.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body},
+                          ensure_ascii=False) + "\n"
+        with self._lock:
+            if custom_id in self._state["entries"]:
+                return
+            spool_key = f"{hash_api_key(api_key)}-{_slug(endpoint)}"
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._spool_path(spool_key), "a", encoding="utf-8") as f:
+                f.write(line)
+            spool = self._state["spools"].setdefault(
+                spool_key, {"endpoint": endpoint, "created": time.time(), "count": 0, "bytes": 0}
+            )
+            spool["count"] += 1
+            spool["bytes"] += len(line.encode("utf-8"))
+            self._state["entries"][custom_id] = {"node": node_type, "status": "spooled", "spool": spool_key,
+                                                 "updated": time.time()}
+            self._save()
+
+    def flush(self, client, api_key: str, endpoint: str, max_requests: int, max_age: float,
+              force: bool = False) -> Optional[str]:
+        """Envía el spool si alcanzó el tamaño o la antigüedad; devuelve el id del lote creado"""
+        spool_key = f"{hash_api_key(api_key)}-{_slug(endpoint)}"
+        with self._lock:
+            spool = self._state["spools"].get(spool_key)
+            if not spool or not spool["count"]:
+                return None
+            due = (force or spool["count"] >= min(max_requests, MAX_SPOOL_REQUESTS)
+                   or spool["bytes"] >= MAX_SPOOL_BYTES or time.time() - spool["created"] >= max_age)
+            if not due:
+                return None
+
+            # Se aparta el spool: lo que se encole durante la subida va a un spool nuevo
+            spool_path = self._spool_path(spool_key)
+            upload_path = f"{spool_path}.{uuid.uuid4().hex}.upload"
+            os.replace(spool_path, upload_path)
+            del self._state["spools"][spool_key]
+            with open(upload_path, "rb") as f:
+                data = f.read()
+            custom_ids = [json.loads(line)["custom_id"] for line in data.splitlines() if line.strip()]
+            self._save()
+
+        try:
+            uploaded = call_with_retry(
+                lambda: client.files.create(file=(f"{spool_key}.jsonl", data), purpose="batch"),
+                idempotent=False, label="OpenAI files.create"
+            )
+            batch = call_with_retry(
+                lambda: client.batches.create(
+                    input_file_id=uploaded.id, endpoint=endpoint, completion_window="24h",
+                    metadata={"source": "chelogarcho"}
+                ),
+                idempotent=False, label="OpenAI batches.create"
+            )
+        except Exception:
+            self._restore_spool(spool_key, endpoint, spool["created"], upload_path, data, len(custom_ids))
+            raise
+
+        with self._lock:
+            now = time.time()
+            self._state["jobs"][batch.id] = {
+                "endpoint": endpoint, "key": hash_api_key(api_key), "status": batch.status,
+                "created": now, "custom_ids": custom_ids,
+            }
+            for custom_id in custom_ids:
+                entry = self._state["entries"].get(custom_id)
+                if entry is not None:
+                    entry.update(status="submitted", batch_id=batch.id, updated=now)
+                    entry.pop("spool", None)
+            self._save()
+        os.remove(upload_path)
+        print(f"📦 Lote {batch.id} enviado: {len(custom_ids)} solicitudes a {endpoint}")
+        return batch.id
+
+    def _restore_spool(self, spool_key: str, endpoint: str, created: float, upload_path: str,
+                       data: bytes, count: int) -> None:
+        """La subida falló: las solicitudes apartadas vuelven al spool para el próximo flush"""
+        with self._lock:
+            with open(self._spool_path(spool_key), "ab") as f:
+                f.write(data)
+            spool = self._state["spools"].setdefault(
+                spool_key, {"endpoint": endpoint, "created": created, "count": 0, "bytes": 0}
+            )
+            spool["created"] = min(spool["created"], created)
+            spool["count"] += count
+            spool["bytes"] += len(data)
+            self._save()
+        os.remove(upload_path)
+
+    def poll(self, client, api_key: str) -> int:
+        """Actualiza los trabajos de esta api_key; devuelve cuántos se completaron ahora"""
+        key = hash_api_key(api_key)
+        with self._lock:
+            pending = [(batch_id, job) for batch_id, job in self._state["jobs"].items()
+                       if job["key"] == key and job["status"] not in _FINAL_STATUSES]
+        finished = 0
+        for batch_id, job in pending:
+            # Consultas y descargas por red sin el lock: sólo se toma para escribir el estado
+            batch = call_with_retry(lambda: client.batches.retrieve(batch_id), label="OpenAI batches.retrieve")
+            outcomes = self._download(client, batch_id, batch) if batch.status in _FINAL_STATUSES else None
+            with self._lock:
+                if job["status"] in _FINAL_STATUSES:
+                    continue  # Otra ejecución lo recogió mientras tanto
+                job["status"] = batch.status
+                if outcomes is not None:
+                    self._collect(batch_id, job, batch, outcomes)
+                    finished += 1
+                self._save()
+        self.prune()
+        return finished
+
+    def _download(self, client, batch_id: str, batch) -> Dict[str, BatchResult]:
+        """Descarga los archivos de resultados y errores de un lote terminado"""
+        outcomes: Dict[str, BatchResult] = {}
+        for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+            if not file_id:
+                continue
+            content = call_with_retry(lambda: client.files.content(file_id).content,
+                                      label="OpenAI files.content")
+            for line in content.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    outcomes[record["custom_id"]] = BatchResult(record["custom_id"], "completed",
+                                                                response.get("body"), batch_id=batch_id)
+                else:
+                    error = record.get("error") or response.get("body", {}).get("error") or response
+                    outcomes[record["custom_id"]] = BatchResult(record["custom_id"], "failed",
+                                                                error=json.dumps(error)[:500], batch_id=batch_id)
+        return outcomes
+
+    def _collect(self, batch_id: str, job: Dict[str, Any], batch, outcomes: Dict[str, BatchResult]) -> None:
+        """Guarda los resultados de un lote terminado y actualiza sus entradas (con el lock tomado)"""
+        os.makedirs(os.path.join(self.root, "results"), exist_ok=True)
+        for custom_id in job["custom_ids"]:
+            entry = self._state["entries"].get(custom_id)
+            if entry is None:
+                continue
+            outcome = outcomes.get(custom_id)
+            if outcome is not None and outcome.status == "completed":
+                with open(self._result_path(custom_id), "w", encoding="utf-8") as f:
+                    json.dump(outcome.body, f)
+                entry.update(status="completed", updated=time.time())
+            else:
+                entry.update(status="failed", updated=time.time(),
+                             error=outcome.error if outcome is not None else f"Lote {batch.status} sin resultado")
+        print(f"📦 Lote {batch_id} {batch.status}: {sum(o.status == 'completed' for o in outcomes.values())}"
+              f"/{len(job['custom_ids'])} resultados")
+
+    def mark_delivered(self, custom_id: str) -> bool:
+        """
+        El nodo ya devolvió el resultado: se olvida la entrada (el cuerpo queda en results/).
+        Devuelve True sólo en la primera entrega, para registrar el coste una única vez.
+        """
+        with self._lock:
+            if self._state["entries"].pop(custom_id, None) is None:
+                return False
+            self._save()
+            return True
+
+    def prune(self) -> None:
+        """
+        Elimina resultados caducados, entradas sin recoger más antiguas que `result_ttl`
+        (completadas, fallidas o huérfanas de un spool o trabajo que ya no existe) y
+        trabajos terminados sin entradas pendientes
+        """
+        results_dir = os.path.join(self.root, "results")
+        now = time.time()
+        try:
+            names = os.listdir(results_dir)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(results_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.result_ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+        with self._lock:
+            entries = self._state["entries"]
+            stale = [custom_id for custom_id, entry in entries.items()
+                     if now - entry["updated"] > self.result_ttl]
+            for custom_id in stale:
+                del entries[custom_id]
+            finished = [batch_id for batch_id, job in self._state["jobs"].items()
+                        if job["status"] in _FINAL_STATUSES
+                        and not any(entries.get(c, {}).get("batch_id") == batch_id for c in job["custom_ids"])]
+            for batch_id in finished:
+                del self._state["jobs"][batch_id]
+            idle = [node for node, custom_ids in self._state["nodes"].items()
+                    if not any(custom_id in entries for custom_id in custom_ids)]
+            for node in idle:
+                del self._state["nodes"][node]
+            if stale or finished or idle:
+                self._save()
+
+    def track(self, node_type: str, node_id: Optional[str], custom_ids: Iterable[str]) -> None:
+        """Registra las claves de la ejecución actual de un nodo (sustituyen a las anteriores)"""
+        if node_id is None:
+            return
+        with self._lock:
+            self._state["nodes"][f"{node_type}:{node_id}"] = list(custom_ids)
+            self._save()
+
+    def has_pending(self, node_type: str, node_id: Optional[str]) -> bool:
+        """
+        Alguna solicitud registrada por este nodo sigue sin entregar (en spool, enviada o
+        sin recoger). Sin UNIQUE_ID (fuera de ComfyUI) cuenta cualquiera de su tipo.
+        """
+        with self._lock:
+            entries = self._state["entries"]
+            if node_id is None:
+                return any(entry["node"] == node_type for entry in entries.values())
+            custom_ids = self._state["nodes"].get(f"{node_type}:{node_id}", [])
+            return any(custom_id in entries for custom_id in custom_ids)
+
+    def summary(self, results: List[BatchResult]) -> str:
+        counts: Dict[str, int] = {}
+        for result in results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        jobs = sorted({r.batch_id for r in results if r.batch_id})
+        parts = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+        return f"Batch: {parts or 'no requests'}" + (f" (jobs: {', '.join(jobs)})" if jobs else "")
+
+
+_MANAGER: Optional[BatchManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_batch_manager() -> BatchManager:
+    """Gestor de lotes del proceso"""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = BatchManager(
+                os.environ.get("CL_BATCH_DIR") or DEFAULT_BATCH_DIR,
+                result_ttl=float(os.environ.get("CL_BATCH_RESULT_TTL_HOURS", "168")) * 3600,
+            )
+        return _MANAGER
@@ -0,0 +1,149 @@
+"""
+Registro de clientes de API compartido por todos los nodos de chelogarcho.
+
+Los clientes (OpenAI, Gemini, sesiones HTTP) se reutilizan entre ejecuciones
+para conservar sesiones TLS y pools keep-alive. La clave es
+(proveedor, hash de la api_key, base_url, variante); la api_key nunca se guarda
+en claro. Incluye expulsión LRU y cierre de clientes inactivos; un cliente
+prestado con `lease` (p. ej. una sesión que espera un trabajo en cola) nunca se cierra.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_CLIENTS = 16
+# Segundos sin uso antes de cerrar el cliente; mayor que la espera más larga de un nodo
+# (cola de CL_VirtualTryOn, 900 s)
+DEFAULT_IDLE_TIMEOUT = 1800.0
+
+
+def hash_api_key(api_key: str) -> str:
+    """Devuelve un hash corto y estable de la api_key (nunca la clave en claro)"""
+    return hashlib.sha256((api_key or "").strip().encode("utf-8")).hexdigest()[:16]
+
+
+def _close_client(client: Any) -> None:
+    """Cierra el cliente si expone close(); los errores se ignoran"""
+    close = getattr(client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class _Entry:
+    __slots__ = ("client", "last_used", "leases")
+
+    def __init__(self, client: Any, last_used: float):
+        self.client = client
+        self.last_used = last_used
+        self.leases = 0
+
+
+class ClientRegistry:
+    """
+    Registro LRU de clientes de API seguro para hilos.
+    Los clientes inactivos más de `idle_timeout` segundos se cierran en el
+    siguiente acceso; al superar `max_clients` se descarta el menos usado.
+    """
+
+    def __init__(self, max_clients: int = DEFAULT_MAX_CLIENTS,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, provider: str, api_key: str, factory: Callable[[], Any],
+            base_url: Optional[str] = None, variant: Optional[str] = None) -> Any:
+        """Devuelve el cliente cacheado para la clave o lo construye con `factory`"""
+        key = (provider, hash_api_key(api_key), base_url or "", variant or "")
+        with self._lock:
+            return self._get_entry(key, factory).client
+
+    @contextmanager
+    def lease(self, provider: str, api_key: str, factory: Callable[[], Any],
+              base_url: Optional[str] = None, variant: Optional[str] = None):
+        """Como `get`, pero el cliente no se cierra por inactividad mientras dure el bloque"""
+        key = (provider, hash_api_key(api_key), base_url or "", variant or "")
+        with self._lock:
+            entry = self._get_entry(key, factory)
+            entry.leases += 1
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    def _get_entry(self, key: Tuple, factory: Callable[[], Any]) -> _Entry:
+        now = time.monotonic()
+        self._evict_idle(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.last_used = now
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        # La construcción ocurre bajo el lock: genai.configure es estado global
+        entry = self._entries[key] = _Entry(factory(), now)
+        while len(self._entries) > self.max_clients:
+            # No se cierra: podría estar en uso por otro hilo; el GC lo libera
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def _evict_idle(self, now: float) -> None:
+        if self.idle_timeout is None or self.idle_timeout <= 0:
+            return
+        expired = [k for k, e in self._entries.items()
+                   if not e.leases and now - e.last_used > self.idle_timeout]
+        for k in expired:
+            _close_client(self._entries.pop(k).client)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Cierra y olvida todos los clientes"""
+        with self._lock:
+            for entry in self._entries.values():
+                _close_client(entry.client)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Registro único del proceso, compartido por los cuatro nodos
+_REGISTRY = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    return _REGISTRY
+
+
+def get_client(provider: str, api_key: str, factory: Callable[[], Any],
+               base_url: Optional[str] = None, variant: Optional[str] = None) -> Any:
+    """Atajo sobre el registro del proceso"""
+    return _REGISTRY.get(provider, api_key, factory, base_url=base_url, variant=variant)
+
+
+def lease_client(provider: str, api_key: str, factory: Callable[[], Any],
+                 base_url: Optional[str] = None, variant: Optional[str] = None):
+    """Atajo sobre `ClientRegistry.lease` del registro del proceso"""
+    return _REGISTRY.lease(provider, api_key, factory, base_url=base_url, variant=variant)
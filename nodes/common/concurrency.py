@@ -0,0 +1,26 @@
+"""
+Ejecución concurrente acotada para repartir un batch en llamadas de API.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_bounded(fn: Callable[[T], R], items: Sequence[T], max_workers: int) -> List[R]:
+    """
+    Aplica `fn` a cada elemento con como máximo `max_workers` llamadas en vuelo.
+    Devuelve los resultados en el orden de entrada; las excepciones se propagan.
+    """
+    items = list(items)
+    workers = max(1, min(int(max_workers or 1), len(items)))
+    if workers == 1:
+        return [fn(item) for item in items]
+
+    # Cada hilo hereda el contexto de la llamada (traza activa de `telemetry`)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chelogarcho") as pool:
+        return list(pool.map(lambda item: context.copy().run(fn, item), items))
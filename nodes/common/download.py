@@ -0,0 +1,132 @@
+"""
+Descarga en streaming de imágenes resultado.
+
+El cuerpo se lee por bloques directamente en un buffer reutilizable por hilo,
+preasignado con Content-Length, y se decodifica en cuanto termina la descarga sin
+copias intermedias (`response.content` + BytesIO duplicaban el archivo en memoria).
+"""
+
+import io
+import threading
+import time
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from .telemetry import span
+
+CHUNK_SIZE = 1 << 20
+# Buffers mayores no se conservan entre descargas
+MAX_RETAINED_BUFFER = 64 << 20
+
+_LOCAL = threading.local()
+
+
+class DownloadStats:
+    def __init__(self, nbytes: int, download_ms: float, decode_ms: float, preallocated: bool, reused: bool,
+                 connection_reused: Optional[bool] = None):
+        self.nbytes = nbytes
+        self.download_ms = download_ms
+        self.decode_ms = decode_ms
+        self.preallocated = preallocated
+        self.reused = reused
+        self.connection_reused = connection_reused
+
+    def summary(self) -> str:
+        buffer = "reused" if self.reused else ("preallocated" if self.preallocated else "grown")
+        summary = (f"Download: {self.nbytes / 1024:.0f} KB in {self.download_ms:.0f} ms, "
+                   f"decode {self.decode_ms:.0f} ms (buffer {buffer})")
+        if self.connection_reused is not None:
+            summary += f", {'reused' if self.connection_reused else 'new'} connection"
+        return summary
+
+
+class _MemoryReader(io.RawIOBase):
+    """Vista de sólo lectura sobre el buffer, para que PIL lo lea sin copiarlo"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        n = min(len(target), len(self._view) - self._pos)
+        target[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _get_buffer(size: int) -> Tuple[bytearray, bool]:
+    """Buffer del hilo con al menos `size` bytes; indica si se reutilizó"""
+    buffer: Optional[bytearray] = getattr(_LOCAL, "buffer", None)
+    if buffer is not None and len(buffer) >= size:
+        return buffer, True
+    buffer = bytearray(max(size, CHUNK_SIZE))
+    if len(buffer) <= MAX_RETAINED_BUFFER:
+        _LOCAL.buffer = buffer
+    return buffer, False
+
+
+def read_into_buffer(response) -> Tuple[memoryview, bool, bool]:
+    """Lee el cuerpo de una respuesta `requests` con stream=True en el buffer del hilo"""
+    raw = response.raw
+    # Content-Encoding (gzip, ...) se decodifica al leer; Content-Length es entonces sólo una pista
+    raw.decode_content = True
+    try:
+        expected = int(response.headers.get("Content-Length") or 0)
+    except ValueError:
+        expected = 0
+    buffer, reused = _get_buffer(expected + 1)
+    view = memoryview(buffer)
+    pos = 0
+    while True:
+        if pos == len(buffer):
+            # Sin Content-Length (o con compresión): se duplica el buffer
+            view.release()
+            buffer.extend(bytes(len(buffer)))
+            if len(buffer) <= MAX_RETAINED_BUFFER:
+                _LOCAL.buffer = buffer
+            elif getattr(_LOCAL, "buffer", None) is buffer:
+                # El buffer retenido creció en el sitio por encima del tope: se suelta
+                _LOCAL.buffer = None
+            view = memoryview(buffer)
+        n = raw.readinto(view[pos:pos + CHUNK_SIZE])
+        if not n:
+            break
+        pos += n
+    return view[:pos], expected > 0, reused
+
+
+def download_image(session, url: str, timeout: float) -> Tuple[Image.Image, DownloadStats]:
+    """Descarga y decodifica una imagen con la sesión dada; la imagen queda cargada en memoria"""
+    start = time.perf_counter()
+    with span("download"), session.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        connection_reused = getattr(response, "connection_reused", None)
+        data, preallocated, reused = read_into_buffer(response)
+    downloaded = time.perf_counter()
+
+    try:
+        with span("decode"):
+            image = Image.open(_MemoryReader(data))
+            # load() antes de liberar la vista: el buffer se reutiliza en la siguiente descarga
+            image.load()
+    finally:
+        nbytes = len(data)
+        data.release()
+    stats = DownloadStats(nbytes, (downloaded - start) * 1000, (time.perf_counter() - downloaded) * 1000,
+                          preallocated, reused, connection_reused)
+    return image, stats
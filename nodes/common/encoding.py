@@ -0,0 +1,136 @@
+"""
+Codificación en memoria de imágenes salientes (subidas a las APIs).
+
+Códecs disponibles (`upload_codec` en los nodos):
+- png: PNG con compress_level 6 (comportamiento histórico)
+- png_fast: PNG con compress_level 1 (mucho más rápido, algo más grande)
+- webp_lossless: WebP sin pérdida
+- jpeg_q95 / webp_q95: con pérdida, alta calidad
+- auto: el payload más pequeño entre los códecs sin pérdida
+"""
+
+import base64
+import io
+import threading
+import time
+from typing import Optional
+
+from PIL import Image
+
+from .telemetry import span
+
+UPLOAD_CODECS = ["png", "png_fast", "webp_lossless", "jpeg_q95", "webp_q95", "auto"]
+
+# Candidatos del modo auto: sólo códecs sin pérdida
+AUTO_CANDIDATES = ["png_fast", "webp_lossless"]
+
+_MIME_TYPES = {"PNG": "image/png", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+
+class EncodedImage:
+    """Imagen codificada lista para enviar"""
+
+    def __init__(self, data: bytes, format: str, codec: str, size, encode_ms: float):
+        self.data = data
+        self.format = format
+        self.codec = codec
+        self.size = size
+        self.encode_ms = encode_ms
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "JPEG" else self.format.lower()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @span("base64")
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64()}"
+
+
+def _flatten_alpha(pil_image: Image.Image) -> Image.Image:
+    """Compone la transparencia sobre blanco para formatos sin canal alfa"""
+    if pil_image.mode in ("RGBA", "LA", "P"):
+        rgba = pil_image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    if pil_image.mode != "RGB":
+        return pil_image.convert("RGB")
+    return pil_image
+
+
+@span("encode")
+def _encode_once(pil_image: Image.Image, codec: str, compress_level: Optional[int]) -> EncodedImage:
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    if codec == "png":
+        fmt = "PNG"
+        pil_image.save(buffer, format=fmt, compress_level=6 if compress_level is None else compress_level)
+    elif codec == "png_fast":
+        fmt = "PNG"
+        pil_image.save(buffer, format=fmt, compress_level=1 if compress_level is None else compress_level)
+    elif codec == "webp_lossless":
+        fmt = "WEBP"
+        pil_image.save(buffer, format=fmt, lossless=True, quality=50, method=2)
+    elif codec == "webp_q95":
+        fmt = "WEBP"
+        pil_image.save(buffer, format=fmt, quality=95, method=4)
+    elif codec == "jpeg_q95":
+        fmt = "JPEG"
+        _flatten_alpha(pil_image).save(buffer, format=fmt, quality=95, subsampling=0)
+    else:
+        raise ValueError(f"Códec de subida no soportado: {codec}")
+    encode_ms = (time.perf_counter() - start) * 1000
+    return EncodedImage(buffer.getvalue(), fmt, codec, pil_image.size, encode_ms)
+
+
+def encode_image(pil_image: Image.Image, codec: str = "png",
+                 compress_level: Optional[int] = None) -> EncodedImage:
+    """Codifica una imagen PIL en memoria con el códec indicado"""
+    if codec != "auto":
+        return _encode_once(pil_image, codec, compress_level)
+
+    candidates = [_encode_once(pil_image, c, compress_level) for c in AUTO_CANDIDATES]
+    best = min(candidates, key=len)
+    # El coste de probar todos los candidatos se atribuye al elegido
+    best.encode_ms = sum(c.encode_ms for c in candidates)
+    return best
+
+
+class UploadStats:
+    """Acumula bytes enviados y tiempo de codificación de una ejecución"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.encode_ms = 0.0
+        self.codecs = set()
+
+    def record(self, encoded: EncodedImage) -> EncodedImage:
+        width, height = encoded.size
+        with self._lock:
+            self.images += 1
+            self.raw_bytes += width * height * 3
+            # Lo que viaja por la red es base64: 4 bytes por cada 3
+            self.encoded_bytes += (len(encoded) + 2) // 3 * 4
+            self.encode_ms += encoded.encode_ms
+            self.codecs.add(encoded.codec)
+        return encoded
+
+    def summary(self) -> str:
+        if not self.images:
+            return "Upload: 0 images"
+        ratio = self.encoded_bytes / self.raw_bytes if self.raw_bytes else 0.0
+        return (f"Upload: {self.images} img, {self.encoded_bytes / 1024:.0f} KB base64 "
+                f"({ratio:.0%} of raw, {'/'.join(sorted(self.codecs))}), encode {self.encode_ms:.0f} ms")
@@ -0,0 +1,89 @@
+"""
+Huellas digitales de entradas (tensores IMAGE, prompts y parámetros) para cachear resultados.
+
+- tensor_digest: hash criptográfico de todos los píxeles (claves de la caché de respuestas).
+- fingerprint_inputs: huella de los widgets que ComfyUI pasa a IS_CHANGED (nunca recibe
+  las entradas enlazadas, como los IMAGE).
+- tensor_fingerprint / request_fingerprint: huella barata de una solicitud para agrupar
+  llamadas idénticas en vuelo. Las huellas de imagen también recorren el buffer completo (una edición mínima cambia la huella),
+  pero con un checksum rápido: xxh3 si `xxhash` está instalado, si no `zlib.crc32`
+  (~5 veces más rápido que blake2b), sin pasar por PIL.
+"""
+
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+import torch
+
+# xxhash es opcional: acelera las huellas (y las hace de 64 bits) pero no es necesario
+try:
+    import xxhash  # type: ignore
+    _HAS_XXHASH = True
+except Exception:
+    xxhash = None  # type: ignore
+    _HAS_XXHASH = False
+
+def tensor_digest(tensor: Optional[torch.Tensor]) -> str:
+    """Digest exacto de los píxeles de un tensor (incluye forma y dtype)"""
+    if tensor is None:
+        return "none"
+    data = tensor.detach().cpu().contiguous()
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{tuple(data.shape)}|{data.dtype}".encode("utf-8"))
+    hasher.update(memoryview(data.numpy()).cast("B"))
+    return hasher.hexdigest()
+
+
+def hash_payload(payload: Any) -> str:
+    """Hash estable de una estructura JSON-serializable"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def tensor_fingerprint(tensor: Optional[torch.Tensor]) -> str:
+    """
+    Huella rápida de un tensor IMAGE sobre el buffer completo (checksum, no criptográfica).
+    No se muestrea: dos imágenes que difieren en un solo píxel nunca comparten huella
+    salvo colisión del checksum.
+    """
+    if tensor is None:
+        return "none"
+    data = tensor.detach().cpu().contiguous()
+    header = f"{tuple(data.shape)}|{data.dtype}"
+    buffer = memoryview(data.numpy()).cast("B")
+    if _HAS_XXHASH:
+        return f"{header}|xxh3:{xxhash.xxh3_64_hexdigest(buffer)}"
+    return f"{header}|crc32:{zlib.crc32(buffer):08x}"
+
+
+def fingerprint_inputs(**inputs: Any) -> str:
+    """
+    Huella combinada de los widgets de un nodo (textos, números y enums) para IS_CHANGED.
+    ComfyUI sólo pasa ahí las entradas constantes; las imágenes se deduplican en el nodo.
+    """
+    parts = {}
+    for name, value in sorted(inputs.items()):
+        if name == "api_key":
+            parts[name] = hashlib.sha256(str(value).strip().encode("utf-8")).hexdigest()[:16]
+        else:
+            parts[name] = value
+    return hash_payload(parts)
+
+
+def request_fingerprint(node_type: str, model: str, prompt: str, params: Dict[str, Any],
+                        images: Optional[List[Optional[torch.Tensor]]],
+                        fingerprints: Optional[List[str]] = None) -> str:
+    """
+    Huella barata de una solicitud (imágenes por `tensor_fingerprint`) para agrupar las
+    llamadas idénticas en vuelo; la caché y los lotes usan la clave exacta de
+    `ResponseCache.make_key`. Con `fingerprints` las imágenes no se vuelven a recorrer.
+    """
+    return hash_payload({
+        "node": node_type,
+        "model": model,
+        "prompt": prompt,
+        "params": params,
+        "images": fingerprints if fingerprints is not None else [tensor_fingerprint(image) for image in images],
+    })
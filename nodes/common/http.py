@@ -0,0 +1,97 @@
+"""
+Capa de sesiones HTTP compartida (keep-alive, pools dimensionados y transporte intercambiable).
+
+- "requests": `requests.Session` con un `HTTPAdapter` cuyo pool se dimensiona según la
+  concurrencia del nodo, de modo que ningún hilo abre conexiones que luego se descartan.
+- "httpx_http2": el mismo API de `requests.Session` montado sobre un `httpx.Client` con
+  HTTP/2 (requiere `pip install httpx[http2]`); si no está disponible se usa "requests".
+
+Cada respuesta lleva `connection_reused` (True si no hubo handshake TCP/TLS nuevo) y la
+sesión acumula estadísticas en `session.connection_stats`. requests/urllib3/httpx sólo se
+importan al crear la primera sesión (ver `http_adapters`).
+"""
+
+import threading
+from typing import Optional, Tuple
+
+from .clients import get_client, lease_client
+from .sdk import is_available
+
+HTTP_TRANSPORTS = ["requests", "httpx_http2"]
+
+
+class ConnectionStats:
+    """Solicitudes y conexiones nuevas de una sesión"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.http_versions = set()
+
+    def record(self, reused: bool, http_version: str) -> None:
+        with self._lock:
+            self.requests += 1
+            if not reused:
+                self.new_connections += 1
+            self.http_versions.add(http_version)
+
+    def snapshot(self) -> Tuple[int, int]:
+        with self._lock:
+            return self.requests, self.new_connections
+
+    def summary(self, since: Tuple[int, int] = (0, 0)) -> str:
+        with self._lock:
+            requests_made = self.requests - since[0]
+            new_connections = self.new_connections - since[1]
+            versions = "/".join(sorted(self.http_versions)) or "-"
+        if not requests_made:
+            return "HTTP: 0 requests"
+        reused = 1.0 - new_connections / requests_made
+        return (f"HTTP: {requests_made} requests, {new_connections} new connections "
+                f"({reused:.0%} reused, {versions})")
+
+
+def http2_available() -> bool:
+    return is_available("httpx") and is_available("h2")
+
+
+def create_session(transport: str = "requests", pool_size: int = 10):
+    """`requests.Session` con keep-alive y pool de `pool_size` conexiones por host"""
+    import requests
+
+    from .http_adapters import HttpxAdapter, PooledHTTPAdapter
+
+    if transport == "httpx_http2" and not http2_available():
+        print("⚠️ httpx[http2] no está instalado; se usa el transporte requests")
+        transport = "requests"
+
+    stats = ConnectionStats()
+    if transport == "httpx_http2":
+        adapter = HttpxAdapter(pool_size, stats)
+    else:
+        adapter = PooledHTTPAdapter(pool_size, stats)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.connection_stats = stats
+    session.transport = transport
+    return session
+
+
+def get_session(provider: str, api_key: str, base_url: Optional[str] = None,
+                transport: str = "requests", pool_size: int = 10):
+    """Sesión compartida del proceso para (proveedor, api_key, base_url, transporte, tamaño de pool)"""
+    return get_client(
+        provider, api_key, lambda: create_session(transport, pool_size),
+        base_url=base_url, variant=f"{transport}/{pool_size}"
+    )
+
+
+def lease_session(provider: str, api_key: str, base_url: Optional[str] = None,
+                  transport: str = "requests", pool_size: int = 10):
+    """Como `get_session`, como context manager: la sesión no se cierra por inactividad mientras se usa"""
+    return lease_client(
+        provider, api_key, lambda: create_session(transport, pool_size),
+        base_url=base_url, variant=f"{transport}/{pool_size}"
+    )
@@ -0,0 +1,227 @@
+"""
+Adaptadores de transporte para `common.http` (se importan al crear la primera sesión).
+
+- `PooledHTTPAdapter`: requests/urllib3 con pool dimensionado y conteo de conexiones nuevas.
+- `HttpxAdapter`: el API de requests sobre un `httpx.Client` con HTTP/2. verify y cert se
+  aplican con un cliente por configuración TLS; las solicitudes con proxy van por
+  `PooledHTTPAdapter` (el API de proxies de httpx cambia entre versiones).
+"""
+
+import io
+import os
+import ssl
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .http import ConnectionStats
+
+# httpx es opcional: sólo hace falta para el transporte HTTP/2
+try:
+    import httpx  # type: ignore
+except Exception:
+    httpx = None  # type: ignore
+
+_LOCAL = threading.local()
+
+
+# --- requests/urllib3 -------------------------------------------------------
+
+class _CountingPoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)  # type: ignore
+        # Sin socket = conexión nueva o caída: habrá handshake en este hilo
+        if getattr(conn, "sock", None) is None:
+            _LOCAL.new_connections = getattr(_LOCAL, "new_connections", 0) + 1
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter con pool de `pool_size` conexiones por host y estadísticas de reutilización"""
+
+    def __init__(self, pool_size: int, stats: ConnectionStats):
+        self.stats = stats
+        super().__init__(pool_connections=10, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        before = getattr(_LOCAL, "new_connections", 0)
+        response = super().send(request, **kwargs)
+        response.connection_reused = getattr(_LOCAL, "new_connections", 0) == before
+        self.stats.record(response.connection_reused, "HTTP/1.1")
+        return response
+
+
+# --- httpx (HTTP/2) ---------------------------------------------------------
+
+def _to_requests_error(exc: Exception, request) -> Exception:
+    """Traduce errores de httpx a los de requests para que el resto del código no cambie"""
+    if isinstance(exc, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(exc), request=request)
+    if isinstance(exc, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(exc), request=request)
+    if isinstance(exc, httpx.TransportError):
+        return requests.exceptions.ConnectionError(str(exc), request=request)
+    return exc
+
+
+def _to_ssl_context(verify, cert):
+    """`verify`/`cert` de requests como el `verify` de httpx (True = CA del sistema)"""
+    if verify is True and cert is None:
+        return True
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif verify is True:
+        context = ssl.create_default_context()
+    elif os.path.isdir(verify):
+        context = ssl.create_default_context(capath=verify)
+    else:
+        context = ssl.create_default_context(cafile=verify)
+    if cert is not None:
+        certfile, keyfile = cert if isinstance(cert, tuple) else (cert, None)
+        context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def _to_httpx_timeout(timeout):
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class _HttpxRaw(io.RawIOBase):
+    """Cuerpo de una respuesta httpx expuesto como el `raw` que espera requests"""
+
+    def __init__(self, response, request):
+        self._response = response
+        self._request = request
+        self._chunks = response.iter_bytes()
+        self._pending = memoryview(b"")
+        # Compatibilidad con urllib3: httpx ya decodifica Content-Encoding
+        self.decode_content = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+            except Exception as e:
+                raise _to_requests_error(e, self._request)
+        n = min(len(target), len(self._pending))
+        target[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        self._response.close()
+        super().close()
+
+
+class HttpxAdapter(BaseAdapter):
+    """Adaptador de requests que envía las solicitudes con un `httpx.Client` (HTTP/2)"""
+
+    def __init__(self, pool_size: int, stats: ConnectionStats, http2: bool = True):
+        super().__init__()
+        self.stats = stats
+        self.pool_size = pool_size
+        self.http2 = http2
+        # Un cliente por (verify, cert): httpx fija la configuración TLS al crear el cliente
+        self._clients: Dict[Tuple[Any, Any], Any] = {}
+        self._fallback: Optional[PooledHTTPAdapter] = None
+        self._streams = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _client(self, verify, cert):
+        key = (verify, cert)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                # requests ya resuelve el entorno (proxies, REQUESTS_CA_BUNDLE) y lo pasa a send()
+                client = self._clients[key] = httpx.Client(
+                    http2=self.http2, limits=limits, verify=_to_ssl_context(verify, cert), trust_env=False
+                )
+            return client
+
+    def _requests_adapter(self) -> PooledHTTPAdapter:
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = PooledHTTPAdapter(self.pool_size, self.stats)
+            return self._fallback
+
+    def _is_reused(self, extensions) -> bool:
+        stream_id = extensions.get("stream_id")
+        if stream_id is not None:
+            # HTTP/2: el primer stream de cada conexión es el 1
+            return stream_id > 1
+        network_stream = extensions.get("network_stream")
+        if network_stream is None:
+            return False
+        with self._lock:
+            if network_stream in self._streams:
+                return True
+            self._streams.add(network_stream)
+            return False
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if select_proxy(request.url, proxies or {}):
+            # Con proxy se envía por requests/urllib3 (HTTP/1.1), que lo aplica por solicitud
+            return self._requests_adapter().send(request, stream=stream, timeout=timeout, verify=verify,
+                                                 cert=cert, proxies=proxies)
+        try:
+            client = self._client(verify, cert)
+            hx_request = client.build_request(
+                request.method, request.url, headers=dict(request.headers), content=request.body,
+                timeout=_to_httpx_timeout(timeout)
+            )
+            hx_response = client.send(hx_request, stream=True)
+        except Exception as e:
+            raise _to_requests_error(e, request)
+
+        response = requests.Response()
+        response.status_code = hx_response.status_code
+        response.headers = CaseInsensitiveDict(hx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = hx_response.reason_phrase
+        response.url = str(hx_response.url)
+        response.request = request
+        response.connection = self
+        response.raw = _HttpxRaw(hx_response, request)
+        response.connection_reused = self._is_reused(hx_response.extensions)
+        self.stats.record(response.connection_reused, hx_response.http_version)
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+        if self._fallback is not None:
+            self._fallback.close()
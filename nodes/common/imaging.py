@@ -0,0 +1,207 @@
+"""
+Utilidades de imagen compartidas para tensores IMAGE de ComfyUI ([B, H, W, C], float32 en [0, 1]).
+
+Las conversiones confían en el contrato de ComfyUI (valores en [0, 1], canales al final):
+no hay escaneo `max()` ni copias intermedias float64; escalado, redondeo y recorte se
+aplican a todo el batch de una vez.
+"""
+
+import warnings
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .telemetry import span
+
+MIXED_SIZE_POLICIES = ["resize", "pad"]
+
+# Resolución efectiva de cada proveedor: (lado máximo, lado corto máximo); 0 = sin límite.
+# Subir imágenes más grandes sólo añade bytes, CPU de codificación y tokens.
+PROVIDER_MAX_SIDE = {
+    "openai_vision_high": (2048, 768),  # encaje en 2048x2048 y lado corto a 768
+    "openai_vision_low": (512, 512),
+    "openai_image": (1536, 0),  # tamaño máximo de salida de gpt-image-1
+    "gemini": (3072, 0),
+    "yourmirror": (0, 0),  # sin límite documentado: no se reduce por defecto
+}
+
+
+def frame_count(tensor: Optional[torch.Tensor]) -> int:
+    """Número de frames de un tensor IMAGE (0 si no hay tensor)"""
+    if tensor is None:
+        return 0
+    return tensor.shape[0] if tensor.dim() == 4 else 1
+
+
+def select_frame(tensor: Optional[torch.Tensor], index: int) -> Optional[torch.Tensor]:
+    """Devuelve el frame `index` como [H, W, C]; un batch de un solo frame se difunde a todos"""
+    if tensor is None:
+        return None
+    if tensor.dim() == 4:
+        return tensor[index] if tensor.shape[0] > index else tensor[0]
+    return tensor
+
+
+def _item_size(item) -> Tuple[int, int]:
+    """(alto, ancho) de una imagen PIL o de un tensor [1, H, W, C] / [H, W, C]"""
+    if isinstance(item, Image.Image):
+        return item.size[1], item.size[0]
+    return item.shape[-3], item.shape[-2]
+
+
+def _pil_to_uint8_tensor(pil_image: Image.Image) -> torch.Tensor:
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    with warnings.catch_warnings():
+        # Sólo se lee del array (copy_ al buffer de salida): no hace falta una copia escribible
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.from_numpy(np.asarray(pil_image))
+
+
+@span("convert")
+def stack_images(items: List[Any], policy: str = "resize") -> torch.Tensor:
+    """
+    Decodifica resultados (PIL o tensores IMAGE) directamente en un batch [B, H, W, 3]
+    float32 preasignado; el escalado a [0, 1] se hace in-place sobre cada frame.
+
+    Política para tamaños distintos:
+    - "resize": cada frame se redimensiona (bilineal) al tamaño del primero.
+    - "pad": el lienzo es el máximo alto/ancho del batch; cada frame se centra sin
+      reescalar y el resto queda en negro.
+    """
+    sizes = [_item_size(item) for item in items]
+    if policy == "pad":
+        height, width = max(h for h, _ in sizes), max(w for _, w in sizes)
+    else:
+        height, width = sizes[0]
+
+    mixed = any(size != (height, width) for size in sizes)
+    output = torch.zeros if (mixed and policy == "pad") else torch.empty
+    out = output((len(items), height, width, 3), dtype=torch.float32)
+
+    for index, (item, (h, w)) in enumerate(zip(items, sizes)):
+        if policy != "pad" and (h, w) != (height, width):
+            if isinstance(item, Image.Image):
+                item = item.convert("RGB").resize((width, height), Image.BILINEAR)
+            else:
+                item = torch.nn.functional.interpolate(
+                    item.reshape(1, h, w, -1).permute(0, 3, 1, 2).float(), size=(height, width),
+                    mode="bilinear", align_corners=False
+                ).permute(0, 2, 3, 1)
+            h, w = height, width
+
+        top, left = (height - h) // 2, (width - w) // 2
+        target = out[index, top:top + h, left:left + w]
+        if isinstance(item, Image.Image):
+            target.copy_(_pil_to_uint8_tensor(item))
+            target.mul_(1.0 / 255.0)
+        else:
+            frame = item.reshape(h, w, -1)
+            if frame.shape[-1] == 1:
+                frame = frame.expand(h, w, 3)
+            target.copy_(frame[..., :3])
+            if frame.dtype == torch.uint8:
+                target.mul_(1.0 / 255.0)
+    return out
+
+
+# Elementos por bloque en tensor_to_uint8: el buffer float32 (512 KB) se queda en caché
+CONVERT_CHUNK = 1 << 17
+
+
+def tensor_to_uint8(tensor: torch.Tensor) -> np.ndarray:
+    """
+    Convierte un tensor IMAGE (cualquier batch) a uint8 con recorte y redondeo.
+    Se recorre por bloques con un único buffer float32 que cabe en caché: la imagen se lee
+    una vez y se escribe una vez en uint8, sin temporales del tamaño de la imagen.
+    """
+    data = tensor.detach().cpu().numpy()
+    flat = data.reshape(-1)
+    out = np.empty(flat.shape, dtype=np.uint8)
+    buffer = np.empty(min(CONVERT_CHUNK, flat.size), dtype=np.float32)
+    for start in range(0, flat.size, CONVERT_CHUNK):
+        src = flat[start:start + CONVERT_CHUNK]
+        chunk = buffer[:src.size]
+        # Recorte a [0, 1]; después x*255 + 0.5 truncado == redondeo
+        np.clip(src, 0.0, 1.0, out=chunk)
+        chunk *= np.float32(255.0)
+        chunk += np.float32(0.5)
+        np.copyto(out[start:start + src.size], chunk, casting="unsafe")
+    return out.reshape(data.shape)
+
+
+def _array_to_pil(array: np.ndarray) -> Image.Image:
+    channels = array.shape[-1]
+    if channels == 3:
+        return Image.fromarray(array, "RGB")
+    if channels == 4:
+        return Image.fromarray(array, "RGBA")
+    return Image.fromarray(array[..., 0], "L")
+
+
+@span("convert")
+def tensor_to_pil(tensor: torch.Tensor) -> Image.Image:
+    """Convierte el primer frame de un tensor IMAGE ([B, H, W, C] o [H, W, C]) a PIL"""
+    if tensor.dim() == 4:
+        tensor = tensor[0]
+    return _array_to_pil(tensor_to_uint8(tensor))
+
+
+@span("convert")
+def tensor_to_pils(tensor: torch.Tensor) -> List[Image.Image]:
+    """Convierte un batch completo a imágenes PIL con una única conversión vectorizada"""
+    array = tensor_to_uint8(tensor if tensor.dim() == 4 else tensor.unsqueeze(0))
+    return [_array_to_pil(frame) for frame in array]
+
+
+@span("convert")
+def pil_to_tensor(pil_image: Image.Image) -> torch.Tensor:
+    """Convierte una imagen PIL a tensor IMAGE [1, H, W, 3] float32"""
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    # uint8 -> float32 en una sola reserva; el escalado es in-place
+    array = np.asarray(pil_image, dtype=np.float32)
+    array *= np.float32(1.0 / 255.0)
+    return torch.from_numpy(array).unsqueeze(0)
+
+
+def fit_size(height: int, width: int, max_side: int, max_short_side: int = 0) -> Tuple[int, int]:
+    """Tamaño destino que respeta los límites conservando la relación de aspecto (nunca amplía)"""
+    scale = 1.0
+    if max_side > 0:
+        scale = min(scale, max_side / max(height, width))
+    if max_short_side > 0:
+        scale = min(scale, max_short_side / min(height, width))
+    if scale >= 1.0:
+        return height, width
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def resolve_max_side(provider: str, max_upload_side: int = 0) -> Tuple[int, int]:
+    """Límites a aplicar: el valor del nodo si es > 0; si no, el del proveedor"""
+    if max_upload_side and max_upload_side > 0:
+        return max_upload_side, 0
+    return PROVIDER_MAX_SIDE.get(provider, (0, 0))
+
+
+def downscale_for_upload(tensor: Optional[torch.Tensor], provider: str,
+                         max_upload_side: int = 0) -> Optional[torch.Tensor]:
+    """
+    Reduce un tensor IMAGE ([B, H, W, C] o [H, W, C]) a la resolución efectiva del proveedor
+    con interpolación bilineal antialias sobre el tensor, antes de codificar.
+    """
+    if tensor is None:
+        return None
+    max_side, max_short_side = resolve_max_side(provider, max_upload_side)
+    height, width = tensor.shape[-3], tensor.shape[-2]
+    target = fit_size(height, width, max_side, max_short_side)
+    if target == (height, width):
+        return tensor
+
+    batched = tensor if tensor.dim() == 4 else tensor.unsqueeze(0)
+    resized = torch.nn.functional.interpolate(
+        batched.permute(0, 3, 1, 2).float(), size=target, mode="bilinear", align_corners=False, antialias=True
+    ).permute(0, 2, 3, 1).clamp_(0.0, 1.0)
+    return resized if tensor.dim() == 4 else resized[0]
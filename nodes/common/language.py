@@ -0,0 +1,80 @@
+"""
+Detección de idioma memoizada, determinista y perezosa.
+
+- langdetect se importa y carga sus perfiles en la primera detección real (no al arrancar ComfyUI).
+- Semilla fija: el mismo texto da siempre el mismo idioma (langdetect es aleatorio por defecto).
+- Caché LRU por texto: el mismo prompt no vuelve a pasar por el modelo n-grama.
+- Atajo para inglés evidente (ASCII + palabras vacías frecuentes) sin tocar el modelo.
+"""
+
+import re
+import threading
+from functools import lru_cache
+from typing import Optional
+
+DETECT_SEED = 0
+DEFAULT_LANGUAGE = "en"
+# Textos más cortos no tienen suficientes n-gramas para una detección fiable
+MIN_DETECT_LENGTH = 3
+
+_ENGLISH_STOPWORDS = frozenset(
+    "a an the and or but of to in on at for with from by as is are was were be been this that these those "
+    "it its i you he she we they my your our their me him her us them do does did not no so if then than "
+    "into over under about can will would should could have has had what which who how when where why "
+    "all any some more most very just also only up out".split()
+)
+_WORD = re.compile(r"[a-z']+")
+
+_FACTORY = None
+_FACTORY_LOCK = threading.Lock()
+
+
+def _get_factory():
+    """Fábrica propia de langdetect con los perfiles cargados (None si no está instalado)"""
+    global _FACTORY
+    if _FACTORY is None:
+        with _FACTORY_LOCK:
+            if _FACTORY is None:
+                try:
+                    from langdetect.detector_factory import PROFILES_DIRECTORY, DetectorFactory  # type: ignore
+                except Exception:
+                    _FACTORY = False
+                    return None
+                factory = DetectorFactory()
+                factory.load_profile(PROFILES_DIRECTORY)
+                factory.set_seed(DETECT_SEED)
+                _FACTORY = factory
+    return _FACTORY or None
+
+
+def looks_english(text: str) -> bool:
+    """Heurística barata: sólo ASCII y al menos un 20% de palabras vacías inglesas"""
+    if not text.isascii():
+        return False
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return False
+    hits = sum(1 for word in words if word in _ENGLISH_STOPWORDS)
+    return hits >= 2 and hits / len(words) >= 0.2
+
+
+@lru_cache(maxsize=1024)
+def _detect_cached(text: str) -> str:
+    factory = _get_factory()
+    if factory is None:
+        return DEFAULT_LANGUAGE
+    try:
+        detector = factory.create()
+        detector.append(text)
+        return detector.detect()
+    except Exception:
+        return DEFAULT_LANGUAGE  # Sin rasgos detectables
+
+
+def detect_language(text: Optional[str]) -> str:
+    """Código ISO 639-1 del idioma del texto; "en" si es corto, indetectable o falta langdetect"""
+    if not text or len(text.strip()) < MIN_DETECT_LENGTH:
+        return DEFAULT_LANGUAGE
+    if looks_english(text):
+        return "en"
+    return _detect_cached(text.strip())
@@ -0,0 +1,288 @@
+"""
+Registro local de costes y tokens de cada llamada facturable (solo inserciones).
+
+Cada llamada a un proveedor añade una fila con el nodo, la rama del workflow
+(`node_id`, el UNIQUE_ID de ComfyUI), el prompt_id, el modelo, tokens, imágenes,
+latencia y el coste calculado con la tabla de precios. Los aciertos de caché no se
+registran (no se facturan). La API de consulta agrega por prompt_id, día, rama, nodo
+o modelo para encontrar las ramas caras de un workflow:
+
+    from nodes.common.ledger import get_ledger
+    for row in get_ledger().totals("node_id", prompt_id="..."):
+        print(row)
+
+Configuración opcional por variables de entorno:
+- CL_LEDGER_PATH: base SQLite (por defecto `.cache/ledger.sqlite3` dentro del paquete;
+  `off` desactiva el registro, los costes se siguen calculando para el debug)
+- CL_PRICES_FILE: JSON {modelo: {input, output, image_input, per_image}} que sobrescribe
+  o amplía la tabla de precios (USD por millón de tokens; per_image en USD por imagen)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .telemetry import current_trace
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_LEDGER_PATH = os.path.join(_PACKAGE_ROOT, ".cache", "ledger.sqlite3")
+
+# USD por millón de tokens (precios públicos de cada proveedor). `per_image` se usa
+# cuando la respuesta no informa de los tokens.
+PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4-turbo": {"input": 10.00, "output": 30.00},
+    "gpt-4": {"input": 30.00, "output": 60.00},
+    "gpt-4.1": {"input": 2.00, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "output": 1.60},
+    "gpt-image-1": {"input": 5.00, "image_input": 10.00, "output": 40.00},
+    "gemini-2.5-flash-image-preview": {"input": 0.30, "output": 30.00, "per_image": 0.039},
+}
+# La Batch API de OpenAI factura a mitad de precio
+BATCH_DISCOUNT = 0.5
+GROUP_BY = ["prompt_id", "day", "node_id", "node", "model", "provider"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    prompt_id TEXT,
+    node TEXT,
+    node_id TEXT,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    images_in INTEGER NOT NULL DEFAULT 0,
+    images_out INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    cost_usd REAL,
+    estimated INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS calls_prompt ON calls (prompt_id);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+"""
+
+
+def _load_prices() -> Dict[str, Dict[str, float]]:
+    prices = {model: dict(p) for model, p in PRICES.items()}
+    path = os.environ.get("CL_PRICES_FILE")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for model, p in json.load(f).items():
+                    prices.setdefault(model, {}).update(p)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ledger: no se pudo leer CL_PRICES_FILE ({e})")
+    return prices
+
+
+def price_for(model: str, prices: Dict[str, Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """Precio exacto o, si no, el del prefijo más largo (gpt-4o-mini-2024-07-18 -> gpt-4o-mini)"""
+    if model in prices:
+        return prices[model]
+    matches = [name for name in prices if model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def usage_tokens(usage: Any) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """(entrada, salida, de ellos imagen de entrada) de un objeto usage de OpenAI o Gemini"""
+    if usage is None:
+        return None, None, None
+
+    def first(*names):
+        for name in names:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            if value is not None:
+                return int(value)
+        return None
+
+    details = usage.get("input_tokens_details") if isinstance(usage, dict) else getattr(usage, "input_tokens_details", None)
+    image_tokens = None
+    if details is not None:
+        image_tokens = details.get("image_tokens") if isinstance(details, dict) else getattr(details, "image_tokens", None)
+    return (first("prompt_tokens", "input_tokens", "prompt_token_count"),
+            first("completion_tokens", "output_tokens", "candidates_token_count"),
+            image_tokens)
+
+
+def compute_cost(model: str, input_tokens: Optional[int], output_tokens: Optional[int],
+                 image_input_tokens: Optional[int] = None, images_out: int = 0, batch: bool = False,
+                 prices: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[float]:
+    """Coste en USD; None si el modelo no tiene precio o no hay con qué calcularlo"""
+    price = price_for(model, prices if prices is not None else _load_prices())
+    if price is None:
+        return None
+    if input_tokens is None and output_tokens is None:
+        if "per_image" not in price or not images_out:
+            return None
+        cost = price["per_image"] * images_out
+    else:
+        image_input_tokens = image_input_tokens or 0
+        text_input = max((input_tokens or 0) - image_input_tokens, 0)
+        cost = (text_input * price.get("input", 0.0)
+                + image_input_tokens * price.get("image_input", price.get("input", 0.0))
+                + (output_tokens or 0) * price.get("output", 0.0)) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+class Ledger:
+    """Registro SQLite; con `path` None sólo calcula costes (CL_LEDGER_PATH=off)"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.prices = _load_prices()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.path is None:
+            raise RuntimeError("Ledger desactivado (CL_LEDGER_PATH=off)")
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.row_factory = sqlite3.Row
+            # WAL: varios procesos de ComfyUI pueden escribir mientras se consulta
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, provider: str, model: str, usage: Any = None, images_in: int = 0, images_out: int = 0,
+               latency: Optional[float] = None, mode: str = "sync", estimated_tokens: Optional[Tuple[int, int]] = None,
+               extra_cost: float = 0.0) -> Optional[float]:
+        """
+        Añade una llamada y devuelve su coste en USD (None si no se puede calcular).
+        `estimated_tokens` (entrada, salida) suple el usage cuando el proveedor no lo informa
+        (stream cortado); `extra_cost` suma un coste estimado aparte (p. ej. la herramienta de
+        imagen de Responses). El prompt_id, el nodo y la rama se toman de la traza activa.
+        """
+        input_tokens, output_tokens, image_input_tokens = usage_tokens(usage)
+        estimated = bool(extra_cost)
+        if usage is None and estimated_tokens is not None:
+            (input_tokens, output_tokens), estimated = estimated_tokens, True
+        cost = compute_cost(model, input_tokens, output_tokens, image_input_tokens, images_out,
+                            mode == "batch", self.prices)
+        if extra_cost:
+            cost = (cost or 0.0) + extra_cost * (BATCH_DISCOUNT if mode == "batch" else 1.0)
+        trace = current_trace()
+        if trace is not None and cost is not None:
+            trace.accumulate("cost_usd", cost)
+        if self.path is None:
+            return cost
+        now = time.time()
+        row = (now, time.strftime("%Y-%m-%d", time.localtime(now)),
+               trace.prompt_id if trace else None, trace.node if trace else None,
+               str(trace.attrs.get("node_id")) if trace and trace.attrs.get("node_id") is not None else None,
+               provider, model, mode, input_tokens, output_tokens, images_in, images_out,
+               round(latency * 1000, 1) if latency is not None else None, cost, int(estimated))
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO calls (ts, day, prompt_id, node, node_id, provider, model, mode, input_tokens,"
+                    " output_tokens, images_in, images_out, latency_ms, cost_usd, estimated)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Ledger: no se pudo registrar la llamada ({e})")
+        return cost
+
+    # --- consultas ---------------------------------------------------------------
+
+    def _where(self, prompt_id: Optional[str], day: Optional[str], since: Optional[float]):
+        clauses, args = [], []
+        for column, value in (("prompt_id", prompt_id), ("day", day)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            args.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def totals(self, group_by: str = "prompt_id", prompt_id: Optional[str] = None, day: Optional[str] = None,
+               since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Agregados por `group_by` (ver GROUP_BY), del más caro al más barato"""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by debe ser uno de {GROUP_BY}")
+        where, args = self._where(prompt_id, day, since)
+        query = (
+            f"SELECT {group_by} AS key, COUNT(*) AS calls, SUM(input_tokens) AS input_tokens,"
+            " SUM(output_tokens) AS output_tokens, SUM(images_in) AS images_in, SUM(images_out) AS images_out,"
+            " SUM(cost_usd) AS cost_usd, SUM(cost_usd IS NULL) AS unpriced_calls, SUM(estimated) AS estimated_calls,"
+            " AVG(latency_ms) AS avg_latency_ms, MAX(latency_ms) AS max_latency_ms,"
+            " MIN(ts) AS first_ts, MAX(ts) AS last_ts"
+            f" FROM calls{where} GROUP BY {group_by} ORDER BY cost_usd DESC, calls DESC"
+        )
+        with self._lock:
+            rows = self._connect().execute(query, args).fetchall()
+        return [dict(row) for row in rows]
+
+    def calls(self, prompt_id: Optional[str] = None, day: Optional[str] = None, since: Optional[float] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Últimas llamadas registradas, de la más reciente a la más antigua"""
+        where, args = self._where(prompt_id, day, since)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT * FROM calls{where} ORDER BY id DESC LIMIT ?", args + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def report(self, group_by: str = "node_id", prompt_id: Optional[str] = None, day: Optional[str] = None) -> str:
+        """Tabla de texto con los agregados (por defecto: ramas del último workflow)"""
+        if prompt_id is None and day is None:
+            latest = self.calls(limit=1)
+            prompt_id = latest[0]["prompt_id"] if latest else None
+        rows = self.totals(group_by, prompt_id=prompt_id, day=day)
+        lines = [f"{group_by:<24}{'calls':>7}{'in tok':>10}{'out tok':>10}{'img':>6}{'USD':>12}{'avg ms':>9}"]
+        for row in rows:
+            cost = f"{row['cost_usd']:.6f}" if row["cost_usd"] is not None else "n/a"
+            latency = f"{row['avg_latency_ms']:.0f}" if row["avg_latency_ms"] is not None else "n/a"
+            lines.append(f"{str(row['key']):<24}{row['calls']:>7}{row['input_tokens'] or 0:>10}"
+                         f"{row['output_tokens'] or 0:>10}{row['images_out'] or 0:>6}{cost:>12}{latency:>9}")
+        total = sum(row["cost_usd"] or 0.0 for row in rows)
+        scope = f"prompt_id {prompt_id}" if prompt_id else (f"día {day}" if day else "sin registros")
+        lines.append(f"Total {scope}: {format_cost(total)}")
+        return "\n".join(lines)
+
+
+_LEDGER: Optional[Ledger] = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def get_ledger() -> Ledger:
+    """Ledger compartido del proceso, configurado desde el entorno"""
+    global _LEDGER
+    path = os.environ.get("CL_LEDGER_PATH") or DEFAULT_LEDGER_PATH
+    if path.lower() == "off":
+        path = None
+    with _LEDGER_LOCK:
+        if _LEDGER is None or _LEDGER.path != path:
+            _LEDGER = Ledger(path)
+        return _LEDGER
+
+
+def record_call(provider: str, model: str, **kwargs) -> Optional[float]:
+    """Registra una llamada en el ledger del proceso; devuelve su coste (None si no tiene precio)"""
+    return get_ledger().record(provider, model, **kwargs)
+
+
+def execution_cost() -> Optional[float]:
+    """Coste acumulado de las llamadas de la ejecución de nodo actual (0 si no hubo ninguna)"""
+    trace = current_trace()
+    return trace.attrs.get("cost_usd", 0.0) if trace is not None else None
+
+
+def format_cost(cost: Optional[float]) -> str:
+    if cost is None:
+        return "n/a"
+    return f"${cost:.4f}" if cost >= 0.01 else f"${cost:.6f}"
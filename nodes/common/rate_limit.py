@@ -0,0 +1,190 @@
+"""
+Limitador de tasa del lado cliente (token bucket) compartido por el proceso.
+
+Un limitador por (proveedor, modelo, hash de api_key) con dos cubetas: solicitudes por
+minuto (RPM) y tokens estimados por minuto (TPM). En lugar de dejar que la API responda
+429, cada llamada reserva su cupo y espera el tiempo necesario; las reservas se atienden
+en orden de llegada aunque haya muchas ramas en paralelo con la misma clave.
+Los límites se configuran desde el nodo (`rpm_limit` / `tpm_limit`, 0 = sin límite).
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .clients import hash_api_key
+from .telemetry import span
+
+# Tokens aproximados por carácter de prompt (heurística de OpenAI: ~4 caracteres por token)
+CHARS_PER_TOKEN = 4
+
+# Tokens facturados por imagen de entrada (tras la reducción de `imaging.PROVIDER_MAX_SIDE`)
+TOKENS_PER_IMAGE = {
+    "openai_vision_low": 85,
+    "openai_vision_high": 765,  # 85 + 4 teselas de 512 px x 170
+    "openai_image": 765,
+    "gemini": 258,
+}
+
+# Tokens de salida de una imagen generada
+IMAGE_OUTPUT_TOKENS = {
+    "gemini": 1290,
+    "openai_image_low": 272,
+    "openai_image_medium": 1056,
+    "openai_image_high": 4160,
+}
+
+
+def estimate_tokens(text: str = "", images: int = 0, tokens_per_image: int = 0, output_tokens: int = 0) -> int:
+    """Estimación barata de tokens de una llamada (entrada + salida máxima)"""
+    return len(text or "") // CHARS_PER_TOKEN + images * tokens_per_image + output_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Reserva `amount` (el nivel puede quedar negativo) y devuelve la espera necesaria"""
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # Una llamada mayor que la capacidad esperaría para siempre: se limita a una cubeta llena
+        self.level -= min(amount, self.per_minute)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.per_minute, self.level + amount)
+
+
+class Reservation:
+    """Resultado de `RateLimiter.acquire`: espera aplicada y profundidad de la cola"""
+
+    def __init__(self, limiter: "RateLimiter", tokens: int, wait: float, queue_depth: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.wait = wait
+        self.queue_depth = queue_depth
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """Corrige la cubeta TPM con el consumo real informado por la API"""
+        if actual_tokens is not None:
+            self.limiter.adjust(self.tokens - actual_tokens)
+
+
+class Pacer:
+    """
+    Reserva de cupo por intento para `call_with_retry(before_attempt=...)`: cada reintento
+    tras un 429 o un 5xx vuelve a pasar por las cubetas. `settle` corrige la última reserva;
+    `wait_seconds` acumula las esperas para descontarlas de la latencia medida.
+    """
+
+    def __init__(self, limiter: Optional["RateLimiter"], tokens: int = 0,
+                 stats: Optional["RateLimitStats"] = None):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.stats = stats
+        self.reservation: Optional[Reservation] = None
+        self.wait_seconds = 0.0
+
+    def __call__(self) -> None:
+        if self.limiter is None:
+            return
+        reservation = self.limiter.acquire(self.tokens)
+        self.wait_seconds += reservation.wait
+        self.reservation = self.stats.record(reservation) if self.stats is not None else reservation
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        if self.reservation is not None:
+            self.reservation.settle(actual_tokens)
+
+
+class RateLimiter:
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self._lock = threading.Lock()
+        self.rpm = self.tpm = 0
+        self._requests: Optional[TokenBucket] = None
+        self._tokens: Optional[TokenBucket] = None
+        self.waiting = 0
+        self.configure(rpm, tpm)
+
+    def configure(self, rpm: int, tpm: int) -> None:
+        """Actualiza los límites; las cubetas sólo se recrean si cambian"""
+        with self._lock:
+            if rpm != self.rpm:
+                self.rpm = rpm
+                self._requests = TokenBucket(rpm) if rpm > 0 else None
+            if tpm != self.tpm:
+                self.tpm = tpm
+                self._tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def acquire(self, tokens: int = 0) -> Reservation:
+        """Reserva una solicitud y `tokens` tokens; bloquea hasta que haya cupo"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None and tokens > 0:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            if wait > 0:
+                self.waiting += 1
+            depth = self.waiting
+
+        if wait > 0:
+            try:
+                with span("rate_limit_wait"):
+                    time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        return Reservation(self, tokens, wait, depth)
+
+    def adjust(self, tokens: float) -> None:
+        """Devuelve (positivo) o consume (negativo) tokens de la cubeta TPM"""
+        with self._lock:
+            if self._tokens is not None:
+                self._tokens.refund(tokens)
+
+
+class RateLimitStats:
+    """Esperas acumuladas de una ejecución (para la salida de debug)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def record(self, reservation: Reservation) -> Reservation:
+        with self._lock:
+            self.calls += 1
+            if reservation.wait > 0:
+                self.waited += 1
+                self.wait_seconds += reservation.wait
+            self.max_queue_depth = max(self.max_queue_depth, reservation.queue_depth)
+        return reservation
+
+    def summary(self) -> str:
+        return (f"Rate limit: {self.waited}/{self.calls} paced, wait {self.wait_seconds:.1f}s, "
+                f"max queue {self.max_queue_depth}")
+
+
+_LIMITERS: Dict[Tuple[str, str, str], RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider: str, model: str, api_key: str, rpm: int = 0, tpm: int = 0) -> Optional[RateLimiter]:
+    """Limitador compartido de (proveedor, modelo, api_key); None si no hay límites configurados"""
+    if rpm <= 0 and tpm <= 0:
+        return None
+    key = (provider, model, hash_api_key(api_key))
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            limiter = _LIMITERS[key] = RateLimiter(rpm, tpm)
+    limiter.configure(rpm, tpm)
+    return limiter
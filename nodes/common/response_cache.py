@@ -0,0 +1,211 @@
+"""
+Caché en disco de respuestas de API direccionada por contenido.
+
+La clave es un hash de (tipo de nodo, modelo, prompt final, parámetros y digest de
+cada imagen de entrada). Se guardan imágenes ya decodificadas (uint8 .npy) y textos,
+de modo que un acierto cuesta una lectura de archivo y no una llamada de red.
+Expulsión LRU por tamaño total y caducidad por TTL desde la creación de cada entrada.
+El barrido completo del directorio no se hace en cada escritura: sólo cuando el contador
+de tamaño supera el límite o cada `EVICT_EVERY` escrituras (para las caducadas).
+
+Configuración opcional por variables de entorno:
+- CL_CACHE_DIR: carpeta de la caché (por defecto `.cache/responses` dentro del paquete)
+- CL_CACHE_MAX_MB: tamaño máximo en MB (por defecto 2048)
+- CL_CACHE_TTL_HOURS: vida de cada entrada en horas (por defecto 168)
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .fingerprint import hash_payload, tensor_digest
+
+CACHE_MODES = ["off", "read_write", "read_only"]
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_DIR = os.path.join(_PACKAGE_ROOT, ".cache", "responses")
+
+# Escrituras entre barridos completos cuando el tamaño estimado no supera el límite
+EVICT_EVERY = 64
+
+
+class CachedResult:
+    """Resultado recuperado de la caché: batch de imágenes opcional y textos"""
+
+    def __init__(self, images: Optional[torch.Tensor], texts: Dict[str, Any]):
+        self.images = images
+        self.texts = texts
+
+
+class ResponseCache:
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # Tamaño total estimado (None hasta el primer barrido) y escrituras desde el último
+        self._total_bytes: Optional[int] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def image_digests(images: List[Optional[torch.Tensor]]) -> List[str]:
+        """Huellas exactas de las imágenes de una llamada, reutilizables en varias claves"""
+        return [tensor_digest(image) for image in images]
+
+    @staticmethod
+    def make_key(node_type: str, model: str, prompt: str, params: Dict[str, Any],
+                 images: Optional[List[Optional[torch.Tensor]]], digests: Optional[List[str]] = None) -> str:
+        """
+        Clave de contenido para una llamada; las api_key nunca forman parte de ella.
+        Con `digests` (de `image_digests`) las imágenes no se vuelven a hashear.
+        """
+        return hash_payload({
+            "node": node_type,
+            "model": model,
+            "prompt": prompt,
+            "params": params,
+            "images": digests if digests is not None else ResponseCache.image_digests(images),
+        })
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if self.ttl_seconds > 0 and time.time() - meta["created"] > self.ttl_seconds:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                self.misses += 1
+                return None
+
+            images = None
+            if meta.get("has_images"):
+                array = np.load(os.path.join(entry_dir, "images.npy"))
+                images = torch.from_numpy(array).float().div_(255.0)
+
+            # Marca de uso para la expulsión LRU
+            os.utime(meta_path, None)
+            self.hits += 1
+            return CachedResult(images, meta.get("texts", {}))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # Entrada corrupta: se descarta y se trata como fallo
+            print(f"⚠️ Entrada de caché inválida {key[:12]}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, images: Union[torch.Tensor, Image.Image, None], texts: Dict[str, Any]) -> None:
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            size = 0
+            if images is not None:
+                if isinstance(images, Image.Image):
+                    array = np.asarray(images.convert("RGB"))[None]
+                else:
+                    array = images.detach().cpu().clamp(0, 1).mul(255.0).round().to(torch.uint8).numpy()
+                np.save(os.path.join(tmp_dir, "images.npy"), array)
+                size += array.nbytes
+            meta = {"created": time.time(), "has_images": images is not None, "texts": texts, "size": size}
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            written = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+            # El mtime del directorio queda como fecha de creación para la caducidad en evict
+            os.utime(tmp_dir, (meta["created"], meta["created"]))
+
+            # Publicación atómica: las lecturas concurrentes ven la entrada completa o nada
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception as e:
+            print(f"⚠️ No se pudo escribir en la caché: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with self._lock:
+            self._writes += 1
+            if self._total_bytes is not None:
+                self._total_bytes += written
+            due = (self._total_bytes is None or self._total_bytes > self.max_bytes
+                   or self._writes >= EVICT_EVERY)
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Elimina entradas caducadas y las menos usadas hasta respetar max_bytes.
+        La caducidad se mide desde la creación (mtime del directorio de la entrada, que no
+        cambia con los aciertos), como en `get`; el orden LRU usa el mtime de meta.json.
+        """
+        with self._lock:
+            entries = []
+            now = time.time()
+            for shard in _listdir(self.root):
+                shard_dir = os.path.join(self.root, shard)
+                for name in _listdir(shard_dir):
+                    entry_dir = os.path.join(shard_dir, name)
+                    meta_path = os.path.join(entry_dir, "meta.json")
+                    try:
+                        created = os.path.getmtime(entry_dir)
+                        last_used = os.path.getmtime(meta_path)
+                        size = sum(e.stat().st_size for e in os.scandir(entry_dir) if e.is_file())
+                    except OSError:
+                        continue
+                    if self.ttl_seconds > 0 and now - created > self.ttl_seconds:
+                        shutil.rmtree(entry_dir, ignore_errors=True)
+                        continue
+                    entries.append((last_used, size, entry_dir))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+            self._total_bytes = total
+            self._writes = 0
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        with self._lock:
+            self._total_bytes = 0
+            self._writes = 0
+
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Caché compartida del proceso, configurada desde el entorno en el primer uso"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(
+                root=os.environ.get("CL_CACHE_DIR") or DEFAULT_CACHE_DIR,
+                max_bytes=int(float(os.environ.get("CL_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+                ttl_seconds=float(os.environ.get("CL_CACHE_TTL_HOURS", "168")) * 3600,
+            )
+        return _CACHE
@@ -0,0 +1,190 @@
+"""
+Política de reintentos compartida por todos los nodos.
+
+- Backoff exponencial con "full jitter" (espera aleatoria en [0, base * 2^n]) para que
+  las ejecuciones concurrentes no reintenten sincronizadas tras un 429.
+- Respeta `Retry-After` y `x-ratelimit-reset-*` cuando el servidor los envía.
+- Presupuesto de reintentos por workflow (prompt_id de ComfyUI) compartido entre nodos.
+- Clasificación según idempotencia: en llamadas no idempotentes (generaciones que se
+  facturan) sólo se reintenta cuando el servidor rechazó la petición sin procesarla.
+
+Configuración opcional por variables de entorno:
+- CL_RETRY_MAX_ATTEMPTS: intentos por llamada, incluido el primero (por defecto 4)
+- CL_RETRY_BUDGET: reintentos totales por workflow (por defecto 16)
+"""
+
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from .telemetry import current_prompt_id, span
+
+# El servidor rechazó la petición antes de procesarla: siempre seguro reintentar
+_REJECTED_STATUSES = {429, 503}
+# El servidor pudo haber hecho el trabajo: sólo para llamadas idempotentes
+_AMBIGUOUS_STATUSES = {408, 500, 502, 504}
+
+_TIMEOUT_ERRORS = {"ReadTimeout", "Timeout", "APITimeoutError", "TimeoutError", "DeadlineExceeded"}
+_CONNECTION_ERRORS = {
+    "ConnectionError", "APIConnectionError", "ConnectionResetError", "ChunkedEncodingError", "ProtocolError",
+}
+
+_RESET_HEADERS = ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 max_retry_after: float = 120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Un Retry-After mayor que esto no se espera: se devuelve el error
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int) -> float:
+        """Espera con full jitter para el reintento número `attempt` (desde 0)"""
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class RetryBudget:
+    """Reintentos disponibles por workflow; evita tormentas de reintentos en ejecuciones largas"""
+
+    def __init__(self, max_retries: int = 16, max_workflows: int = 64):
+        self.max_retries = max_retries
+        self.max_workflows = max_workflows
+        self._used: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, workflow_id: str) -> bool:
+        with self._lock:
+            used = self._used.pop(workflow_id, 0)
+            self._used[workflow_id] = used
+            while len(self._used) > self.max_workflows:
+                self._used.popitem(last=False)
+            if used >= self.max_retries:
+                return False
+            self._used[workflow_id] = used + 1
+            return True
+
+    def used(self, workflow_id: str) -> int:
+        with self._lock:
+            return self._used.get(workflow_id, 0)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for candidate in (getattr(exc, "status_code", None),
+                      getattr(getattr(exc, "response", None), "status_code", None),
+                      getattr(exc, "code", None)):
+        try:
+            if candidate is not None:
+                return int(candidate)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _parse_delay(value: str) -> Optional[float]:
+    """Segundos de un Retry-After (número o fecha HTTP) o de un reset de OpenAI ("1m30s", "20ms")"""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts:
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Espera pedida por el servidor en las cabeceras de la respuesta, si la hay"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    delays = []
+    for name in _RESET_HEADERS:
+        value = headers.get(name)
+        if value:
+            delay = _parse_delay(str(value))
+            if delay is not None:
+                delays.append(delay)
+    return max(delays) if delays else None
+
+
+def classify(exc: BaseException, idempotent: bool) -> Tuple[bool, str]:
+    """(reintentable, motivo) para una excepción, por duck typing sobre requests/openai/google"""
+    status = _status_code(exc)
+    if status is not None and status >= 400:
+        if status in _REJECTED_STATUSES:
+            return True, f"HTTP {status}"
+        return idempotent and status in _AMBIGUOUS_STATUSES, f"HTTP {status}"
+
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if "ConnectTimeout" in names:
+        # No llegó a conectar: la petición nunca se envió
+        return True, "ConnectTimeout"
+    if names & _TIMEOUT_ERRORS:
+        return idempotent, type(exc).__name__
+    if names & _CONNECTION_ERRORS:
+        return idempotent, type(exc).__name__
+    return False, type(exc).__name__
+
+
+_POLICY = RetryPolicy(max_attempts=int(os.environ.get("CL_RETRY_MAX_ATTEMPTS", "4")))
+_BUDGET = RetryBudget(max_retries=int(os.environ.get("CL_RETRY_BUDGET", "16")))
+
+
+def get_budget() -> RetryBudget:
+    return _BUDGET
+
+
+def call_with_retry(fn: Callable[[], Any], idempotent: bool = True, label: str = "request",
+                    log: Optional[Callable[[str], None]] = None,
+                    policy: Optional[RetryPolicy] = None, phase: str = "request",
+                    before_attempt: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Ejecuta `fn` reintentando los errores transitorios según la política.
+    Agotados los intentos (o el presupuesto del workflow) se relanza la última excepción.
+    Cada intento se mide como la fase `phase` de la traza activa (ver `telemetry`).
+    `before_attempt` se llama antes de cada intento, reintentos incluidos (ver `rate_limit.Pacer`).
+    """
+    policy = policy or _POLICY
+    log = log or print
+    workflow_id = current_prompt_id()
+    attempt = 0
+    while True:
+        try:
+            if before_attempt is not None:
+                before_attempt()
+            with span(phase):
+                return fn()
+        except Exception as exc:
+            retryable, reason = classify(exc, idempotent)
+            if not retryable or attempt + 1 >= policy.max_attempts:
+                raise
+            server_delay = retry_after(exc)
+            if server_delay is not None and server_delay > policy.max_retry_after:
+                log(f"{label}: el servidor pide esperar {server_delay:.0f}s ({reason}), no se reintenta")
+                raise
+            if not _BUDGET.try_acquire(workflow_id):
+                log(f"{label}: presupuesto de reintentos agotado para el workflow ({_BUDGET.max_retries})")
+                raise
+
+            delay = policy.backoff(attempt)
+            if server_delay is not None:
+                # Se respeta la espera del servidor; el jitter reparte los reintentos concurrentes
+                delay = server_delay + random.uniform(0.0, policy.base_delay)
+            attempt += 1
+            log(f"{label}: reintento {attempt}/{policy.max_attempts - 1} en {delay:.1f}s ({reason})")
+            with span("retry_wait"):
+                time.sleep(delay)
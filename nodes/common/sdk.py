@@ -0,0 +1,33 @@
+"""
+Importación perezosa de los SDKs de proveedores.
+
+Registrar los nodos no importa openai, google-generativeai, langdetect, requests ni httpx
+(openai y google-generativeai suman segundos al arranque en frío de ComfyUI): cada SDK
+se importa en la primera ejecución del nodo que lo usa. `is_available` sólo busca el
+módulo, sin importarlo.
+"""
+
+import importlib
+import importlib.util
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def is_available(module: str) -> bool:
+    """True si el módulo está instalado (no lo importa)"""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except Exception:
+        return False
+
+
+def require(module: str, requirement: Optional[str] = None) -> ModuleType:
+    """Importa el módulo en el primer uso; ImportError con la instrucción de instalación si falta"""
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"{module} no está instalado. Instala con: pip install {requirement or module}"
+        ) from e
@@ -0,0 +1,96 @@
+"""
+Agrupación de llamadas idénticas en vuelo (single-flight).
+
+Cuando varias ramas del workflow (o varios frames de un batch) lanzan a la vez la misma
+solicitud (misma huella de `fingerprint.request_fingerprint` y misma api_key), sólo
+la primera llega al proveedor; las demás esperan y reciben su resultado, o su excepción.
+Una vez terminada la llamada la clave se libera: las solicitudes posteriores vuelven a
+llamar al proveedor (para reutilizar resultados ya terminados está la caché de respuestas).
+
+Configuración opcional por variables de entorno:
+- CL_COALESCE: `off` desactiva la agrupación
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .telemetry import current_trace, span
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Optional[Hashable], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecuta `fn` una sola vez entre las llamadas concurrentes con la misma clave.
+        Devuelve (resultado, compartido); con `key` None o la agrupación desactivada
+        siempre ejecuta `fn`.
+        """
+        if key is None or os.environ.get("CL_COALESCE", "").lower() == "off":
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            with span("coalesced_wait"):
+                call.done.wait()
+            trace = current_trace()
+            if trace is not None:
+                trace.accumulate("coalesced", 1)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+_REGISTRY = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """Registro de llamadas en vuelo compartido por todos los nodos del proceso"""
+    return _REGISTRY
+
+
+def coalesce(key: Optional[Hashable], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """`SingleFlight.do` sobre el registro del proceso"""
+    return _REGISTRY.do(key, fn)
@@ -0,0 +1,251 @@
+"""
+Instrumentación de tiempos por ejecución de nodo.
+
+Cada ejecución abre una traza (`traced` sobre la función del nodo) y las fases se miden con
+`span(fase)` desde cualquier punto, incluidas las utilidades compartidas y los hilos de
+`map_bounded` (heredan el contexto). Un span anidado descuenta su tiempo del span padre:
+cada fase suma sólo su tiempo propio. Con frames en paralelo las fases suman el tiempo de
+todos los hilos y pueden superar el total de pared.
+
+Fases:
+- convert: tensor <-> PIL
+- encode / base64: codificación de subida y su base64
+- request: llamada a un SDK o HTTP (subida + espera del servidor + respuesta)
+- upload / server_wait: envío a la cola y espera del resultado (modo cola de YourMirror)
+- download / decode: descarga y decodificación del resultado
+- rate_limit_wait / retry_wait: esperas del limitador y del backoff de reintentos
+- coalesced_wait: espera del resultado de una llamada idéntica en vuelo (`singleflight`)
+
+Salidas opcionales (variables de entorno):
+- CL_TELEMETRY_JSONL: ruta de un archivo JSON lines, una línea por ejecución
+- CL_TELEMETRY_PROM: ruta de un archivo de texto Prometheus con los acumulados del proceso
+  (formato del textfile collector de node_exporter; se reescribe tras cada ejecución)
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+PHASES = ["convert", "encode", "base64", "request", "upload", "server_wait", "download", "decode",
+          "rate_limit_wait", "retry_wait", "coalesced_wait"]
+
+_CURRENT_TRACE: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("cl_trace", default=None)
+_CURRENT_SPAN: "contextvars.ContextVar[Optional[_SpanFrame]]" = contextvars.ContextVar("cl_span", default=None)
+
+
+def current_prompt_id() -> str:
+    """prompt_id de la ejecución actual de ComfyUI ("local" fuera de ComfyUI)"""
+    server = sys.modules.get("server")
+    try:
+        prompt_id = getattr(server.PromptServer.instance, "last_prompt_id", None)  # type: ignore
+    except Exception:
+        prompt_id = None
+    return prompt_id or "local"
+
+
+class _SpanFrame:
+    __slots__ = ("children",)
+
+    def __init__(self):
+        self.children = 0.0
+
+
+class Trace:
+    """Tiempos de una ejecución de nodo, acumulados por fase"""
+
+    def __init__(self, node: str):
+        self.node = node
+        self.prompt_id = current_prompt_id()
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases: Dict[str, List[float]] = {}
+        self.attrs: Dict[str, object] = {}
+        self.wall: Optional[float] = None
+        self._token = None
+
+    def add(self, phase: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+
+    def set(self, **attrs) -> None:
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def accumulate(self, name: str, value: float) -> None:
+        """Suma `value` al atributo numérico `name` (p. ej. el coste de la ejecución)"""
+        with self._lock:
+            self.attrs[name] = self.attrs.get(name, 0) + value
+
+    def breakdown(self) -> Dict[str, float]:
+        """ms por fase, de mayor a menor"""
+        with self._lock:
+            items = sorted(self.phases.items(), key=lambda item: item[1][0], reverse=True)
+        return {phase: round(seconds * 1000, 1) for phase, (seconds, _) in items}
+
+    def summary(self) -> str:
+        wall = self.wall if self.wall is not None else time.perf_counter() - self._start
+        breakdown = self.breakdown()
+        parts = [f"{phase} {ms:.0f}" for phase, ms in breakdown.items() if ms >= 1]
+        # Tiempo fuera de cualquier fase (sólo tiene sentido si no hubo frames en paralelo)
+        other = wall * 1000 - sum(breakdown.values())
+        if other >= 1:
+            parts.append(f"other {other:.0f}")
+        return f"Timing {wall * 1000:.0f} ms" + (f": {', '.join(parts)}" if parts else "")
+
+    def to_record(self) -> Dict[str, object]:
+        with self._lock:
+            phases = {phase: {"ms": round(seconds * 1000, 2), "count": count}
+                      for phase, (seconds, count) in self.phases.items()}
+            attrs = dict(self.attrs)
+        return {"ts": round(self.started_at, 3), "node": self.node, "prompt_id": self.prompt_id,
+                "wall_ms": round((self.wall or 0.0) * 1000, 2), "phases": phases, **attrs}
+
+    def finish(self) -> str:
+        """Cierra la traza, la envía a las salidas configuradas y devuelve el resumen"""
+        self.wall = time.perf_counter() - self._start
+        if self._token is not None:
+            _CURRENT_TRACE.reset(self._token)
+            self._token = None
+        _record(self)
+        return self.summary()
+
+
+def start_trace(node: str) -> Trace:
+    trace = Trace(node)
+    trace._token = _CURRENT_TRACE.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT_TRACE.get()
+
+
+@contextmanager
+def span(phase: str):
+    """Mide el bloque como `phase` en la traza activa (no hace nada sin traza)"""
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        yield
+        return
+    frame = _SpanFrame()
+    parent = _CURRENT_SPAN.get()
+    token = _CURRENT_SPAN.set(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _CURRENT_SPAN.reset(token)
+        if parent is not None:
+            parent.children += elapsed
+        trace.add(phase, max(0.0, elapsed - frame.children))
+
+
+def traced(node: str, debug_output: int, separator: str = " | "):
+    """
+    Decorador para la función principal de un nodo: abre la traza y añade el resumen de
+    tiempos a la salida de debug (índice `debug_output` de la tupla devuelta).
+    Si el nodo recibe `unique_id` (entrada oculta UNIQUE_ID) se guarda como `node_id`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = start_trace(node)
+            if kwargs.get("unique_id") is not None:
+                # UNIQUE_ID de ComfyUI: identifica la rama del workflow
+                trace.set(node_id=kwargs["unique_id"])
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                trace.set(status="exception")
+                trace.finish()
+                raise
+            summary = trace.finish()
+            if isinstance(result, tuple) and len(result) > debug_output and isinstance(result[debug_output], str):
+                debug = result[debug_output]
+                debug = f"{debug}{separator}{summary}" if debug else summary
+                result = result[:debug_output] + (debug,) + result[debug_output + 1:]
+            return result
+        return wrapper
+    return decorator
+
+
+# --- Salidas ----------------------------------------------------------------
+
+_TOTALS: Dict[Tuple[str, str], List[float]] = {}
+_EXECUTIONS: Dict[str, List[float]] = {}
+_COALESCED: Dict[str, int] = {}
+_SINK_LOCK = threading.Lock()
+
+
+def _record(trace: Trace) -> None:
+    jsonl_path = os.environ.get("CL_TELEMETRY_JSONL")
+    prom_path = os.environ.get("CL_TELEMETRY_PROM")
+    with _SINK_LOCK:
+        executions = _EXECUTIONS.setdefault(trace.node, [0, 0.0])
+        executions[0] += 1
+        executions[1] += trace.wall or 0.0
+        # Llamadas resueltas con el resultado de otra idéntica en vuelo (ver `singleflight`)
+        _COALESCED[trace.node] = _COALESCED.get(trace.node, 0) + int(trace.attrs.get("coalesced", 0))
+        for phase, (seconds, count) in list(trace.phases.items()):
+            totals = _TOTALS.setdefault((trace.node, phase), [0.0, 0])
+            totals[0] += seconds
+            totals[1] += count
+        try:
+            if jsonl_path:
+                with open(jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_record()) + "\n")
+            if prom_path:
+                tmp_path = f"{prom_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(_prometheus_text())
+                os.replace(tmp_path, prom_path)
+        except OSError as e:
+            print(f"⚠️ Telemetría: no se pudo escribir la salida ({e})")
+
+
+def _prometheus_text() -> str:
+    lines = [
+        "# HELP cl_node_executions_total Ejecuciones de nodos chelogarcho",
+        "# TYPE cl_node_executions_total counter",
+    ]
+    lines += [f'cl_node_executions_total{{node="{node}"}} {count}' for node, (count, _) in sorted(_EXECUTIONS.items())]
+    lines += [
+        "# HELP cl_node_wall_seconds_total Tiempo de pared de las ejecuciones",
+        "# TYPE cl_node_wall_seconds_total counter",
+    ]
+    lines += [f'cl_node_wall_seconds_total{{node="{node}"}} {seconds:.6f}'
+              for node, (_, seconds) in sorted(_EXECUTIONS.items())]
+    lines += [
+        "# HELP cl_node_coalesced_total Solicitudes que compartieron una llamada idéntica en vuelo",
+        "# TYPE cl_node_coalesced_total counter",
+    ]
+    lines += [f'cl_node_coalesced_total{{node="{node}"}} {count}' for node, count in sorted(_COALESCED.items())]
+    lines += [
+        "# HELP cl_node_phase_seconds_total Tiempo propio por fase",
+        "# TYPE cl_node_phase_seconds_total counter",
+    ]
+    lines += [f'cl_node_phase_seconds_total{{node="{node}",phase="{phase}"}} {seconds:.6f}'
+              for (node, phase), (seconds, _) in sorted(_TOTALS.items())]
+    lines += [
+        "# HELP cl_node_phase_spans_total Spans medidos por fase",
+        "# TYPE cl_node_phase_spans_total counter",
+    ]
+    lines += [f'cl_node_phase_spans_total{{node="{node}",phase="{phase}"}} {count}'
+              for (node, phase), (_, count) in sorted(_TOTALS.items())]
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus() -> str:
+    """Acumulados del proceso en formato de texto Prometheus"""
+    with _SINK_LOCK:
+        return _prometheus_text()